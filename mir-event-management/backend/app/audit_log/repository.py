@@ -1,28 +1,53 @@
+"""
+רישום שינויים בלוג (audit_log).
+
+log_change / log_changes לא כותבים למסד - הרשומות נאספות ב-session (unit of work) ונכתבות
+ב-INSERT אחד כשהטרנזקציה עושה commit, כחלק מאותה טרנזקציה (rollback מבטל גם אותן).
+עם AUDIT_LOG_ASYNC הרשומות עוברות אחרי ה-commit ל-writer ברקע (app/audit_log/writer.py)
+ונכתבות מחוץ לבקשה - התגובה לא מחכה לכתיבה, אבל רשומות שבתור אובדות אם התהליך נופל.
+
+שם המשתמש נלקח מה-snapshot של מטמון ההזדהות (app/auth/cache.py) ונשמר ב-session, כך
+שפעולה שמתעדת מאות שורות לא שולפת את המשתמש שוב לכל שורה.
+"""
+from sqlalchemy import event, insert
 from sqlalchemy.orm import Session
 from . import models, schemas
 from datetime import datetime
+from typing import Any, Dict, List
 import pytz
 
+ISRAEL_TZ = pytz.timezone('Asia/Jerusalem')
+
+_PENDING_KEY = "audit_log_pending"
+_COMMITTING_KEY = "audit_log_committing"
+_USER_NAMES_KEY = "audit_log_user_names"
+
+
 def get_user_name(db: Session, user_id: int) -> str:
     """קבלת שם המשתמש לפי ID"""
     if user_id is None:
         return "לא ידוע"
 
+    names = db.info.setdefault(_USER_NAMES_KEY, {})
+    if user_id in names:
+        return names[user_id]
+
+    name = f"משתמש {user_id}"
     try:
-        # נסה למצוא משתמש בטבלת users
-        from app.users.models import User # Local import to avoid circular dependency
-        user = db.query(User).filter(User.id == user_id).first()
+        from app.auth import cache as auth_cache  # Local import to avoid circular dependency
+        user = auth_cache.get_user(db, user_id)
         if user:
-            return user.full_name or user.username or f"משתמש {user_id}"
+            name = user.full_name or user.username or name
     except Exception as e:
         print(f"Error getting user name: {e}")
+        return name
 
-    return f"משתמש {user_id}"
+    names[user_id] = name
+    return name
 
 def create_audit_log(db: Session, log: schemas.AuditLogCreate):
     # הוסף שעת ישראל
-    israel_tz = pytz.timezone('Asia/Jerusalem')
-    israel_time = datetime.now(israel_tz)
+    israel_time = datetime.now(ISRAEL_TZ)
 
     db_log = models.AuditLog(**log.dict())
     db_log.timestamp = israel_time
@@ -41,16 +66,61 @@ def get_audit_logs(db: Session, entity_type: str, entity_id: int, event_id: int
     return query.order_by(models.AuditLog.timestamp.desc()).all()
 
 def log_change(db: Session, user_id: int, action: str, entity_type: str, entity_id: int, field: str, old_value: str, new_value: str, event_id: int = None):
+    """רישום שינוי אחד - נכתב למסד ב-commit הבא של ה-session"""
+    log_changes(db, user_id, [{
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "field": field,
+        "old_value": old_value,
+        "new_value": new_value,
+        "event_id": event_id,
+    }])
+
+def log_changes(db: Session, user_id: int, entries: List[Dict[str, Any]]):
+    """רישום כמה שינויים של אותה פעולה - נכתבים יחד עם שאר הרשומות של הטרנזקציה ב-INSERT אחד.
+    כל entry מכיל action, entity_type, entity_id, field, old_value, new_value, event_id"""
+    if not entries:
+        return
     user_name = get_user_name(db, user_id)
-    log = schemas.AuditLogCreate(
-        user_id=user_id,
-        action=action,
-        entity_type=entity_type,
-        entity_id=entity_id,
-        event_id=event_id,
-        field=field,
-        old_value=old_value,
-        new_value=new_value,
-        user_name=user_name
+    israel_time = datetime.now(ISRAEL_TZ)
+    # הרשומות שייכות לטרנזקציה הנוכחית - גם אם עוד לא רץ בה SQL, כדי ש-rollback / close יבטלו אותן
+    if not db.in_transaction():
+        db.begin()
+    db.info.setdefault(_PENDING_KEY, []).extend(
+        dict(entry, user_id=user_id, user_name=user_name, timestamp=israel_time) for entry in entries
     )
-    return create_audit_log(db, log)    
\ No newline at end of file
+
+def write_entries(db: Session, entries: List[Dict[str, Any]]) -> None:
+    """INSERT אחד לכל הרשומות (executemany)"""
+    if entries:
+        db.execute(insert(models.AuditLog), entries)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending(session: Session) -> None:
+    entries = session.info.pop(_PENDING_KEY, None)
+    if not entries:
+        return
+    from app.core.config import settings
+    if settings.AUDIT_LOG_ASYNC:
+        session.info[_COMMITTING_KEY] = entries
+    else:
+        write_entries(session, entries)
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_committed(session: Session) -> None:
+    entries = session.info.pop(_COMMITTING_KEY, None)
+    if entries:
+        from app.audit_log import writer
+        writer.submit(entries)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction) -> None:
+    # טרנזקציה שהסתיימה בלי commit (rollback / close) - הרשומות שלה לא נכתבות
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+        session.info.pop(_COMMITTING_KEY, None)
+        session.info.pop(_USER_NAMES_KEY, None)
@@ -0,0 +1,84 @@
+"""
+כתיבת רשומות audit_log ברקע (AUDIT_LOG_ASYNC).
+
+אחרי commit הרשומות של הטרנזקציה נכנסות לתור בזיכרון, ו-thread אחד כותב אותן בבאצ'ים של
+עד AUDIT_LOG_BATCH_SIZE רשומות ב-INSERT אחד לבאץ'. כשה-writer לא רץ (סקריפטים, workers
+חיצוניים) או שהתור מלא - הרשומות נכתבות מיד ב-session נפרד.
+"""
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.audit_log import repository
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+_queue: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue(maxsize=settings.AUDIT_LOG_QUEUE_MAX_BATCHES)
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+
+
+def write(entries: List[Dict[str, Any]]) -> None:
+    db = SessionLocal()
+    try:
+        repository.write_entries(db, entries)
+        db.commit()
+    except Exception as e:
+        print(f"[audit-writer] failed to write {len(entries)} audit log entries: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def submit(entries: List[Dict[str, Any]]) -> None:
+    """הרשומות של טרנזקציה שעשתה commit - לתור של ה-writer, או כתיבה מיידית אם אין writer"""
+    if _thread is not None and not _stop.is_set():
+        try:
+            _queue.put_nowait(entries)
+            return
+        except queue.Full:
+            pass
+    write(entries)
+
+
+def _drain(first: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    batch = list(first)
+    while len(batch) < settings.AUDIT_LOG_BATCH_SIZE:
+        try:
+            batch.extend(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run() -> None:
+    print("[audit-writer] started")
+    while not (_stop.is_set() and _queue.empty()):
+        try:
+            entries = _queue.get(timeout=settings.AUDIT_LOG_FLUSH_SECONDS)
+        except queue.Empty:
+            continue
+        write(_drain(entries))
+
+
+def start_writer() -> None:
+    """מפעיל את thread הכתיבה (פעם אחת לתהליך)"""
+    global _thread
+    with _thread_lock:
+        if _thread is not None:
+            return
+        _stop.clear()
+        _thread = threading.Thread(target=_run, name="audit-writer", daemon=True)
+        _thread.start()
+
+
+def stop_writer(timeout: float = 5.0) -> None:
+    """עוצר את ה-writer אחרי שכל מה שבתור נכתב"""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            return
+        _stop.set()
+        _thread.join(timeout=timeout)
+        _thread = None
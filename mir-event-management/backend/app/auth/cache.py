@@ -0,0 +1,154 @@
+"""
+מטמון הקשר ההזדהות (AUTH_CACHE_*) - snapshot של המשתמש וההרשאות שלו לאירועים.
+
+get_current_user מאמת את ה-JWT בכל בקשה, ואת המשתמש מביא מהמטמון: פעם ב-AUTH_CACHE_TTL_SECONDS
+לכל היותר נטענים המשתמש וכל ה-UserEventPermission שלו (2 שאילתות), ו-check_event_permission
+בודק מול ה-snapshot בלי לגשת למסד.
+
+שינויי ORM ב-User / UserEventPermission מזוהים אוטומטית (after_flush) ומבטלים את ה-snapshot
+של המשתמש אחרי commit; מחיקות ב-bulk קוראות ל-mark_changed במפורש. בתהליכי API אחרים
+ה-snapshot מתעדכן לכל המאוחר אחרי ה-TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.permissions.models import UserEventPermission
+from app.users.models import User
+
+_PENDING_KEY = "auth_cache_pending"
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """המשתמש המחובר (כמו users, בלי password_hash) + התפקיד שלו בכל אירוע"""
+    id: int
+    id_number: Optional[str]
+    username: str
+    full_name: str
+    email: str
+    role: str
+    is_active: Optional[bool]
+    event_roles: Dict[int, str] = field(default_factory=dict)  # event_id -> role_in_event
+
+    def role_in_event(self, event_id: int) -> Optional[str]:
+        return self.event_roles.get(event_id)
+
+
+class AuthCache:
+    def __init__(self, max_users: int, ttl_seconds: float):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[float, AuthUser]]" = OrderedDict()
+        # מונה לכל משתמש - snapshot שנטען לפני ביטול לא נשמר אחריו
+        self._generations: Dict[int, int] = {}
+
+    def get(self, user_id: int) -> Optional[AuthUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user: AuthUser, generation: int) -> None:
+        with self._lock:
+            if self._generations.get(user.id, 0) != generation:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+_cache = AuthCache(settings.AUTH_CACHE_MAX_USERS, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def _load(db: Session, user_id: int) -> Optional[AuthUser]:
+    user = (
+        db.query(User.id, User.id_number, User.username, User.full_name, User.email, User.role, User.is_active)
+        .filter(User.id == user_id)
+        .first()
+    )
+    if user is None:
+        return None
+    event_roles = dict(
+        db.query(UserEventPermission.event_id, UserEventPermission.role_in_event)
+        .filter(UserEventPermission.user_id == user_id)
+        .all()
+    )
+    return AuthUser(*user, event_roles=event_roles)
+
+
+def get_user(db: Session, user_id: int) -> Optional[AuthUser]:
+    """ה-snapshot של המשתמש - מהמטמון, או טעינה מהמסד ושמירה"""
+    if not settings.AUTH_CACHE_ENABLED:
+        return _load(db, user_id)
+    cached = _cache.get(user_id)
+    if cached is not None:
+        return cached
+    generation = _cache.generation(user_id)
+    user = _load(db, user_id)
+    if user is not None:
+        _cache.put(user, generation)
+    return user
+
+
+def mark_changed(db: Session, user_id: Optional[int]) -> None:
+    """מסמן שהטרנזקציה הנוכחית משנה את המשתמש / ההרשאות שלו (ה-snapshot יתבטל ב-commit)"""
+    if user_id is None:
+        return
+    db.info.setdefault(_PENDING_KEY, set()).add(user_id)
+
+
+def clear() -> None:
+    _cache.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context) -> None:
+    for obj in chain(session.new, session.dirty, session.deleted):
+        # בלי לטעון attributes שפג תוקפם (אין SQL בתוך ה-flush)
+        if isinstance(obj, User):
+            mark_changed(session, obj.__dict__.get("id"))
+        elif isinstance(obj, UserEventPermission):
+            mark_changed(session, obj.__dict__.get("user_id"))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _cache.invalidate(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -2,9 +2,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from app.core.config import settings
-from app.auth.schemas import TokenData
-from app.users.models import User
-from app.core.database import SessionLocal
+from app.auth import cache as auth_cache
+from app.core.database import get_db
 from sqlalchemy.orm import Session
 
 
@@ -14,15 +13,12 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
 ):
+    """
+    המשתמש המחובר (AuthUser) - אימות ה-JWT בכל בקשה, והמשתמש וההרשאות שלו ממטמון ההזדהות.
+    ה-session הוא אותו get_db של ה-route (נפתח חיבור רק כשצריך לטעון מהמסד)
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="לא ניתן לאמת את המשתמש",
@@ -36,7 +32,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = auth_cache.get_user(db, int(user_id))
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,233 @@
+"""
+פידים לבוט הוואטסאפ החיצוני: כרטיסים ותזכורות בשאילתה אחת לכל עמוד, עם keyset pagination
+ו-since (רק מה שהשתנה מאז).
+
+guests.updated_at מתעדכן ב-trigger בכל UPDATE של מוזמן ובכל שינוי במקום הישיבה שלו, כך
+שהבוט שומר את next_cursor ובסבב הבא מקבל רק את השינויים. שורות שעודכנו ב-FEED_SETTLE_SECONDS
+האחרונות נדחות לסבב הבא, כדי שטרנזקציה ארוכה (updated_at = זמן תחילתה) שעוד לא עשתה commit
+לא תידלג. מחיקת מוזמנים ושינויים באירוע עצמו (שם / מיקום) לא נכנסים לדלתא.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.events.models import Event
+from app.guests.models import Guest
+from app.seatings.models import Seating
+from app.tables.models import Table
+
+FEED_DEFAULT_LIMIT = 500
+FEED_MAX_LIMIT = 5000
+FEED_SETTLE_SECONDS = 5
+
+
+def _encode_cursor(data: Dict[str, Any]) -> str:
+    raw = json.dumps(
+        {key: value.isoformat() if isinstance(value, datetime) else value for key, value in data.items()}
+    ).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str, datetime_keys) -> Dict[str, Any]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        for key in datetime_keys:
+            if data.get(key) is not None:
+                data[key] = datetime.fromisoformat(data[key])
+        return data
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+def _settled_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=FEED_SETTLE_SECONDS)
+
+
+# ===== כרטיסים =====
+
+def event_tickets(db: Session, event_id: int):
+    """כל הכרטיסים של האירוע (מקום ישיבה + מוזמן + שולחן) בשאילתה אחת"""
+    rows = (
+        db.query(
+            Guest.id, Guest.first_name, Guest.last_name, Guest.mobile_phone, Guest.confirmed_arrival,
+            Table.table_number, Seating.seat_number,
+        )
+        .select_from(Seating)
+        .join(Guest, Guest.id == Seating.guest_id)
+        .outerjoin(Table, Table.id == Seating.table_id)
+        .filter(Seating.event_id == event_id)
+        .order_by(Seating.id)
+        .all()
+    )
+    return [
+        {
+            "guest_id": guest_id,
+            "guest_name": f"{first_name} {last_name}",
+            "guest_phone": mobile_phone or "",
+            "guest_whatsapp": mobile_phone or "",
+            "table_number": table_number,
+            "seat_number": seat_number,
+            "confirmed_arrival": confirmed_arrival,
+        }
+        for guest_id, first_name, last_name, mobile_phone, confirmed_arrival, table_number, seat_number in rows
+    ]
+
+
+def ticket_feed(
+    db: Session,
+    event_id: int,
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = FEED_DEFAULT_LIMIT,
+) -> Dict[str, Any]:
+    """
+    עמוד של כרטיסי האירוע לפי (updated_at, guest_id) - כל מוזמן פעם אחת, עם מקום הישיבה הראשון
+    שלו (has_seating=False אם הוסר). next_cursor מוחזר תמיד ומשמש לסבב הבא.
+    """
+    key = None
+    if cursor:
+        data = _decode_cursor(cursor, ("u",))
+        key = (data["u"], int(data["g"]))
+
+    first_seating = (
+        select(func.min(Seating.id))
+        .where(Seating.guest_id == Guest.id)
+        .correlate(Guest)
+        .scalar_subquery()
+    )
+    query = (
+        db.query(
+            Guest.id, Guest.first_name, Guest.last_name, Guest.mobile_phone, Guest.confirmed_arrival,
+            Guest.updated_at, Seating.id, Seating.seat_number, Table.table_number,
+        )
+        .outerjoin(Seating, Seating.id == first_seating)
+        .outerjoin(Table, Table.id == Seating.table_id)
+        .filter(Guest.event_id == event_id, Guest.updated_at <= _settled_before())
+    )
+    if key is not None:
+        query = query.filter(tuple_(Guest.updated_at, Guest.id) > tuple_(*key))
+    elif since is not None:
+        query = query.filter(Guest.updated_at > since)
+    rows = query.order_by(Guest.updated_at, Guest.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {
+            "guest_id": guest_id,
+            "guest_name": f"{first_name} {last_name}",
+            "guest_phone": mobile_phone or "",
+            "guest_whatsapp": mobile_phone or "",
+            "has_seating": seating_id is not None,
+            "table_number": table_number,
+            "seat_number": seat_number,
+            "confirmed_arrival": confirmed_arrival,
+            "updated_at": updated_at,
+        }
+        for guest_id, first_name, last_name, mobile_phone, confirmed_arrival, updated_at, seating_id, seat_number, table_number in rows
+    ]
+
+    if rows:
+        next_cursor = _encode_cursor({"u": rows[-1][5], "g": rows[-1][0]})
+    elif cursor:
+        next_cursor = cursor
+    else:
+        next_cursor = _encode_cursor({"u": since or datetime.min, "g": 0})
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+# ===== תזכורות =====
+
+def _reminder_query(db: Session):
+    return (
+        db.query(
+            Event.id, Event.name, Event.date, Event.location,
+            Guest.id, Guest.first_name, Guest.last_name, Guest.mobile_phone,
+        )
+        .join(Guest, Guest.event_id == Event.id)
+        .filter(Guest.confirmed_arrival == True)
+    )
+
+
+def _reminder_item(row, reminder_type: str, scheduled_offset: timedelta) -> Dict[str, Any]:
+    event_id, event_name, event_date, event_location, guest_id, first_name, last_name, mobile_phone = row
+    return {
+        "event_id": event_id,
+        "event_name": event_name,
+        "event_date": event_date,
+        "event_location": event_location,
+        "guest_id": guest_id,
+        "guest_name": f"{first_name} {last_name}",
+        "guest_phone": mobile_phone or "",
+        "guest_whatsapp": mobile_phone or "",
+        "reminder_type": reminder_type,
+        "scheduled_for": event_date - scheduled_offset,
+    }
+
+
+def upcoming_reminders(db: Session, window: timedelta, reminder_type: str, scheduled_offset: timedelta):
+    """תזכורת לכל מוזמן מאושר באירועים שמתקיימים ב-window הקרוב - שאילתה אחת"""
+    now = datetime.now()
+    rows = (
+        _reminder_query(db)
+        .filter(Event.date >= now, Event.date <= now + window)
+        .order_by(Event.date, Event.id, Guest.id)
+        .all()
+    )
+    return [_reminder_item(row, reminder_type, scheduled_offset) for row in rows]
+
+
+def reminder_feed(
+    db: Session,
+    window: timedelta,
+    reminder_type: str,
+    scheduled_offset: timedelta,
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = FEED_DEFAULT_LIMIT,
+) -> Dict[str, Any]:
+    """
+    עמוד של תזכורות ב-window לפי (event_id, guest_id). עם since (UTC) / cursor מסבב קודם
+    מוחזרים רק מוזמנים שעודכנו מאז, ומוזמנים של אירועים שנכנסו ל-window מאז.
+
+    זמן הסבב נקבע בעמוד הראשון ונשמר ב-cursor לכל העמודים שלו; בעמוד האחרון next_cursor
+    מתחיל את הסבב הבא מזמן הסבב הזה.
+    """
+    # תאריכי האירועים בשעון המקומי, updated_at ב-UTC
+    utc_offset = datetime.now() - datetime.utcnow()
+    if cursor:
+        data = _decode_cursor(cursor, ("s", "p"))
+        since, polled_at, key = data.get("s"), data.get("p"), data.get("k")
+    else:
+        polled_at, key = None, None
+    if polled_at is None:
+        polled_at = _settled_before()
+    polled_local = polled_at + utc_offset
+
+    query = _reminder_query(db).filter(Event.date >= polled_local, Event.date <= polled_local + window)
+    if since is not None:
+        query = query.filter(
+            or_(
+                and_(Guest.updated_at > since, Guest.updated_at <= polled_at),
+                Event.date > since + utc_offset + window,
+            )
+        )
+    if key:
+        query = query.filter(tuple_(Event.id, Guest.id) > tuple_(int(key[0]), int(key[1])))
+    rows = query.order_by(Event.id, Guest.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        next_cursor = _encode_cursor({"s": since, "p": polled_at, "k": [rows[-1][0], rows[-1][4]]})
+    else:
+        next_cursor = _encode_cursor({"s": polled_at})
+    return {
+        "items": [_reminder_item(row, reminder_type, scheduled_offset) for row in rows],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
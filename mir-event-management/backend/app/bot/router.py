@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
 from app.guests import schemas as guest_schemas, repository as guest_repository, models as guest_models
@@ -6,6 +6,8 @@ from app.events import models as event_models, repository as event_repository
 from app.greetings import schemas as greeting_schemas, service as greeting_service
 from app.seatings import models as seating_models
 from app.tables import models as table_models
+from app.bot import feeds
+from app.reminders import repository as reminder_repository
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
@@ -117,89 +119,89 @@ def get_event_greetings_for_bot(event_id: int, db: Session = Depends(get_db)):
 
 # ===== נקודות קצה להתראות ותזכורות =====
 
+@router.get("/reminders/due")
+def get_due_reminders(
+    limit: int = Query(reminder_repository.DUE_DEFAULT_LIMIT, ge=1, le=reminder_repository.DUE_MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """כל התזכורות שהגיע זמנן ועוד לא סומנו כנשלחו (מתור scheduled_reminders; אישור ב-/reminders/due/ack)"""
+    return reminder_repository.due_reminders(db, limit=limit)
+
+@router.post("/reminders/due/ack")
+def ack_due_reminders(reminder_data: dict, db: Session = Depends(get_db)):
+    """
+    סימון תזכורות מ-/reminders/due כנשלחו - reminder_id אחד, או reminder_ids לכמה יחד.
+    אידמפוטנטי: אישור חוזר מחזיר already_sent ואת זמן השליחה המקורי
+    """
+    if reminder_data.get("reminder_ids") is not None:
+        raw_ids = reminder_data["reminder_ids"]
+    elif reminder_data.get("reminder_id") is not None:
+        raw_ids = [reminder_data["reminder_id"]]
+    else:
+        raise HTTPException(status_code=400, detail="reminder_id is required")
+    try:
+        reminder_ids = [int(reminder_id) for reminder_id in raw_ids]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="reminder_id must be an integer")
+
+    results = reminder_repository.mark_reminders_sent(db, reminder_ids)
+    if "reminder_ids" in reminder_data:
+        return {
+            "status": "success",
+            "results": [{"reminder_id": reminder_id, **results[reminder_id]} for reminder_id in sorted(results)],
+        }
+
+    result = results[reminder_ids[0]]
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    already_sent = result["status"] == "already_sent"
+    return {
+        "status": "success",
+        "message": "Reminder already marked as sent" if already_sent else "Reminder marked as sent",
+        "reminder_id": reminder_ids[0],
+        "already_sent": already_sent,
+        "sent_at": result["sent_at"]
+    }
+
 @router.get("/reminders/upcoming")
 def get_upcoming_reminders(db: Session = Depends(get_db)):
     """קבלת תזכורות קרובות לשירות החיצוני"""
     # תזכורות ל-24 שעות הקרובות
-    tomorrow = datetime.now() + timedelta(days=1)
-    
-    # שליפת אירועים ב-24 השעות הקרובות
-    upcoming_events = db.query(event_models.Event).filter(
-        event_models.Event.date >= datetime.now(),
-        event_models.Event.date <= tomorrow
-    ).all()
-    
-    reminders = []
-    for event in upcoming_events:
-        # שליפת מוזמנים מאושרים לאירוע
-        confirmed_guests = db.query(guest_models.Guest).filter(
-            guest_models.Guest.event_id == event.id,
-            guest_models.Guest.confirmed_arrival == True
-        ).all()
-        
-        for guest in confirmed_guests:
-            reminders.append({
-                "event_id": event.id,
-                "event_name": event.name,
-                "event_date": event.date,
-                "event_location": event.location,
-                "guest_id": guest.id,
-                "guest_name": f"{guest.first_name} {guest.last_name}",
-                "guest_phone": guest.mobile_phone or "",
-                "guest_whatsapp": guest.mobile_phone or "",
-                "reminder_type": "24h_before",
-                "scheduled_for": event.date - timedelta(hours=24)
-            })
-    
-    return reminders
+    return feeds.upcoming_reminders(db, timedelta(days=1), "24h_before", timedelta(hours=24))
 
 @router.get("/reminders/week-before")
 def get_week_before_reminders(db: Session = Depends(get_db)):
     """קבלת תזכורות לשבוע הקרוב לשירות החיצוני"""
-    # תזכורות לשבוע הקרוב
-    week_from_now = datetime.now() + timedelta(days=7)
-    
-    upcoming_events = db.query(event_models.Event).filter(
-        event_models.Event.date >= datetime.now(),
-        event_models.Event.date <= week_from_now
-    ).all()
-    
-    reminders = []
-    for event in upcoming_events:
-        confirmed_guests = db.query(guest_models.Guest).filter(
-            guest_models.Guest.event_id == event.id,
-            guest_models.Guest.confirmed_arrival == True
-        ).all()
-        
-        for guest in confirmed_guests:
-            reminders.append({
-                "event_id": event.id,
-                "event_name": event.name,
-                "event_date": event.date,
-                "event_location": event.location,
-                "guest_id": guest.id,
-                "guest_name": f"{guest.first_name} {guest.last_name}",
-                "guest_phone": guest.mobile_phone or "",
-                "guest_whatsapp": guest.mobile_phone or "",
-                "reminder_type": "week_before",
-                "scheduled_for": event.date - timedelta(days=7)
-            })
-    
-    return reminders
+    return feeds.upcoming_reminders(db, timedelta(days=7), "week_before", timedelta(days=7))
 
 @router.post("/notification/sent")
 def mark_notification_sent(notification_data: dict, db: Session = Depends(get_db)):
-    """סימון התראה כנשלחה על ידי השירות החיצוני"""
+    """סימון התראה כנשלחה על ידי השירות החיצוני (דיווח חוזר על אותו notification_id לא נרשם שוב)"""
+    notification_id = notification_data.get("notification_id")
+    if notification_id is None or str(notification_id).strip() == "":
+        raise HTTPException(status_code=400, detail="notification_id is required")
+    try:
+        notification, already_sent = reminder_repository.record_notification_sent(
+            db,
+            str(notification_id),
+            event_id=notification_data.get("event_id"),
+            guest_id=notification_data.get("guest_id"),
+            notification_type=notification_data.get("type") or notification_data.get("notification_type"),
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid notification data: {e}")
     return {
         "status": "success",
-        "message": "Notification marked as sent",
-        "notification_id": notification_data.get("notification_id"),
-        "sent_at": datetime.now()
+        "message": "Notification already marked as sent" if already_sent else "Notification marked as sent",
+        "notification_id": notification.notification_id,
+        "already_sent": already_sent,
+        "sent_at": notification.sent_at
     }
 
 @router.post("/reminder/sent")
 def mark_reminder_sent(reminder_data: dict, db: Session = Depends(get_db)):
-    """סימון תזכורת כנשלחה על ידי השירות החיצוני"""
+    """סימון תזכורת כנשלחה על ידי השירות החיצוני (תזכורות מתור /reminders/due מאושרות ב-/reminders/due/ack)"""
     return {
         "status": "success",
         "message": "Reminder marked as sent",
@@ -279,28 +281,49 @@ def get_guest_ticket(guest_id: int, db: Session = Depends(get_db)):
 @router.get("/event/{event_id}/tickets")
 def get_event_tickets(event_id: int, db: Session = Depends(get_db)):
     """קבלת כל הכרטיסים לאירוע לבוט"""
-    # שליפת כל המוזמנים עם מקומות ישיבה
-    seatings = db.query(seating_models.Seating).filter(
-        seating_models.Seating.event_id == event_id
-    ).all()
-    
-    tickets = []
-    for seating in seatings:
-        guest = db.query(guest_models.Guest).filter(guest_models.Guest.id == seating.guest_id).first()
-        if guest:
-            table = db.query(table_models.Table).filter(table_models.Table.id == seating.table_id).first()
-            
-            tickets.append({
-                "guest_id": guest.id,
-                "guest_name": f"{guest.first_name} {guest.last_name}",
-                "guest_phone": guest.mobile_phone or "",
-                "guest_whatsapp": guest.mobile_phone or "",
-                "table_number": table.table_number if table else None,
-                "seat_number": seating.seat_number,
-                "confirmed_arrival": guest.confirmed_arrival
-            })
-    
-    return tickets
+    return feeds.event_tickets(db, event_id)
+
+# ===== פידים לבוט: עמודים לפי cursor ורק שינויים מאז הסבב הקודם =====
+
+@router.get("/feed/event/{event_id}/tickets")
+def get_event_tickets_feed(
+    event_id: int,
+    since: Optional[datetime] = Query(None, description="רק מוזמנים שעודכנו אחרי הזמן הזה (UTC)"),
+    cursor: Optional[str] = Query(None, description="next_cursor מהתשובה הקודמת"),
+    limit: int = Query(feeds.FEED_DEFAULT_LIMIT, ge=1, le=feeds.FEED_MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """כרטיסי האירוע שהשתנו (מוזמן / מקום ישיבה) - עמוד אחד בשאילתה אחת"""
+    try:
+        return feeds.ticket_feed(db, event_id, since=since, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/feed/reminders/upcoming")
+def get_upcoming_reminders_feed(
+    since: Optional[datetime] = Query(None, description="רק שינויים אחרי הזמן הזה (UTC)"),
+    cursor: Optional[str] = Query(None, description="next_cursor מהתשובה הקודמת"),
+    limit: int = Query(feeds.FEED_DEFAULT_LIMIT, ge=1, le=feeds.FEED_MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """תזכורות ל-24 השעות הקרובות - רק מה שנוסף או השתנה מאז הסבב הקודם"""
+    try:
+        return feeds.reminder_feed(db, timedelta(days=1), "24h_before", timedelta(hours=24), since=since, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/feed/reminders/week-before")
+def get_week_before_reminders_feed(
+    since: Optional[datetime] = Query(None, description="רק שינויים אחרי הזמן הזה (UTC)"),
+    cursor: Optional[str] = Query(None, description="next_cursor מהתשובה הקודמת"),
+    limit: int = Query(feeds.FEED_DEFAULT_LIMIT, ge=1, le=feeds.FEED_MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """תזכורות לשבוע הקרוב - רק מה שנוסף או השתנה מאז הסבב הקודם"""
+    try:
+        return feeds.reminder_feed(db, timedelta(days=7), "week_before", timedelta(days=7), since=since, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/guest/{guest_id}/confirm-arrival")
 def confirm_guest_arrival(guest_id: int, db: Session = Depends(get_db)):
@@ -364,18 +387,23 @@ def get_event_custom_fields(event_id: int, db: Session = Depends(get_db)):
 @router.get("/guest/{guest_id}/custom-fields")
 def get_guest_custom_fields(guest_id: int, db: Session = Depends(get_db)):
     """קבלת ערכי שדות מותאמים אישית למוזמן לבוט"""
-    from app.guests.models import GuestFieldValue, GuestCustomField
-    field_values = db.query(GuestFieldValue).filter(
-        GuestFieldValue.guest_id == guest_id
-    ).all()
+    from app.guests.models import GuestCustomField
+    # דרך ה-repository - לפי GUEST_FIELDS_STORAGE (guest_field_values או guests.custom_fields)
+    field_values = guest_repository.get_field_values_for_guest(db, guest_id)
+    if not field_values:
+        return []
+
+    # שליפת פרטי השדות בשאילתה אחת
+    custom_fields = {
+        field.id: field
+        for field in db.query(GuestCustomField).filter(
+            GuestCustomField.id.in_({fv.custom_field_id for fv in field_values})
+        )
+    }
     
     result = []
     for field_value in field_values:
-        # שליפת פרטי השדה
-        custom_field = db.query(GuestCustomField).filter(
-            GuestCustomField.id == field_value.custom_field_id
-        ).first()
-        
+        custom_field = custom_fields.get(field_value.custom_field_id)
         if custom_field:
             result.append({
                 "field_id": custom_field.id,
@@ -389,7 +417,7 @@ def get_guest_custom_fields(guest_id: int, db: Session = Depends(get_db)):
 @router.post("/guest/{guest_id}/custom-field")
 def set_guest_custom_field(guest_id: int, field_data: dict, db: Session = Depends(get_db)):
     """הגדרת ערך שדה מותאם אישית למוזמן דרך בוט"""
-    from app.guests.models import GuestCustomField, GuestFieldValue
+    from app.guests.models import GuestCustomField
     
     guest = db.query(guest_models.Guest).filter(guest_models.Guest.id == guest_id).first()
     if not guest:
@@ -411,36 +439,20 @@ def set_guest_custom_field(guest_id: int, field_data: dict, db: Session = Depend
         raise HTTPException(status_code=404, detail="Custom field not found")
     
     # בדיקה אם כבר קיים ערך לשדה זה
-    existing_value = db.query(GuestFieldValue).filter(
-        GuestFieldValue.guest_id == guest_id,
-        GuestFieldValue.custom_field_id == custom_field.id
-    ).first()
+    existed = any(
+        fv.custom_field_id == custom_field.id
+        for fv in guest_repository.get_field_values_for_guest(db, guest_id)
+    )
     
-    if existing_value:
-        # עדכון ערך קיים
-        existing_value.value = field_value
-        db.commit()
-        db.refresh(existing_value)
-        return {
-            "field_id": custom_field.id,
-            "field_name": custom_field.name,
-            "value": existing_value.value,
-            "message": "ערך השדה עודכן בהצלחה"
-        }
-    else:
-        # יצירת ערך חדש
-        new_value = GuestFieldValue(
-            guest_id=guest_id,
-            custom_field_id=custom_field.id,
-            value=field_value
-        )
-        db.add(new_value)
-        db.commit()
-        db.refresh(new_value)
-        
-        return {
-            "field_id": custom_field.id,
-            "field_name": custom_field.name,
-            "value": new_value.value,
-            "message": "ערך השדה נוסף בהצלחה"
-        } 
\ No newline at end of file
+    # השמירה דרך ה-repository - לפי מקום השדה בטבלה ו-GUEST_FIELDS_STORAGE, כמו בטבלה ובייצוא
+    saved_value = guest_repository.create_field_value(
+        db,
+        guest_schemas.FieldValueCreate(guest_id=guest_id, custom_field_id=custom_field.id, value=field_value),
+    )
+    
+    return {
+        "field_id": custom_field.id,
+        "field_name": custom_field.name,
+        "value": saved_value.value,
+        "message": "ערך השדה עודכן בהצלחה" if existed else "ערך השדה נוסף בהצלחה"
+    } 
\ No newline at end of file
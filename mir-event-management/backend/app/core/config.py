@@ -7,6 +7,15 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # מטמון המשתמש וההרשאות של get_current_user (app/auth/cache.py)
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_TTL_SECONDS: float = 60.0  # שינויים מתהליכי API אחרים נראים לכל המאוחר אחרי הזמן הזה
+    AUTH_CACHE_MAX_USERS: int = 1024
+    # כתיבת audit_log (app/audit_log/repository.py, app/audit_log/writer.py)
+    AUDIT_LOG_ASYNC: bool = False  # לכתוב את הרשומות ברקע אחרי ה-commit במקום בתוך הטרנזקציה
+    AUDIT_LOG_BATCH_SIZE: int = 1000
+    AUDIT_LOG_FLUSH_SECONDS: float = 1.0
+    AUDIT_LOG_QUEUE_MAX_BATCHES: int = 10000  # תור מלא - הכתיבה חוזרת להיות מיידית
     SUPERADMINS: list[str] = ["admin@example.com", "sari@example.com"]
     
     # Nedarim Plus Configuration
@@ -21,6 +30,50 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = ""  # App Password של Gmail
     GREETING_NOTIFICATION_EMAIL: str = ""  # המייל שיקבל התראות על ברכות
     SEND_GREETING_EMAILS: bool = False  # האם לשלוח מיילים על ברכות חדשות
+    SMTP_FROM: str = ""  # כתובת השולח (ברירת מחדל: SMTP_USER)
+    SMTP_STARTTLS: bool = True  # false מול שרת SMTP מקומי בלי TLS (למשל aiosmtpd)
+    # תור המיילים היוצאים (app/core/email_outbox.py, app/core/email_service.py)
+    EMAIL_WORKER_EMBEDDED: bool = True  # להריץ workers כ-threads בתוך תהליך ה-API
+    EMAIL_WORKER_THREADS: int = 1  # כל worker מחזיק חיבור SMTP אחד
+    EMAIL_BATCH_SIZE: int = 20
+    EMAIL_POLL_SECONDS: float = 5.0
+    EMAIL_LEASE_SECONDS: int = 600
+    EMAIL_MAX_ATTEMPTS: int = 6
+    EMAIL_RETRY_BASE_SECONDS: float = 30.0
+    EMAIL_RETRY_MAX_SECONDS: float = 3600.0
+    EMAIL_SMTP_TIMEOUT_SECONDS: float = 30.0
+    EMAIL_SMTP_IDLE_SECONDS: float = 60.0  # חיבור SMTP בלי שליחה יותר מזה - נסגר
+    EMAIL_MAX_ATTACHMENT_BYTES: int = 20 * 1024 * 1024
+
+    # Import workers (app/imports/worker.py)
+    IMPORT_WORKER_EMBEDDED: bool = True  # להריץ workers כ-threads בתוך תהליך ה-API
+    IMPORT_WORKER_THREADS: int = 2
+    IMPORT_PARTITION_ROWS: int = 20000  # גודל מחיצה - יחידת העבודה של worker (נקראת מה-offset שלה בקובץ)
+    IMPORT_LEASE_SECONDS: int = 300  # worker שלא מאריך lease בזמן הזה נחשב שנפל
+    IMPORT_MAX_ATTEMPTS: int = 3
+    IMPORT_PROGRESS_FLUSH_SECONDS: float = 2.0  # כל כמה זמן מוני ההתקדמות נכתבים למסד
+
+    # אחסון שדות דינמיים מעבר ל-15: eav (טבלת guest_field_values) | jsonb (העמודה guests.custom_fields)
+    GUEST_FIELDS_STORAGE: str = "eav"
+
+    # מטמון snapshot של מפת הישיבה (app/seatings/snapshot.py)
+    SEATING_CACHE_ENABLED: bool = True
+    SEATING_CACHE_SHARED: bool = False  # גרסה ב-events.seating_version - עקבי בין כמה תהליכי API
+    SEATING_CACHE_MAX_EVENTS: int = 256
+
+    # כרטיסי ישיבה - רינדור QR (app/seatings/qr.py)
+    CARD_QR_PROCESSES: int = 0  # 0 = מספר המעבדים
+    CARD_QR_POOL_MIN_ITEMS: int = 64  # באץ' קטן יותר מרונדר בתהליך הנוכחי
+    CARD_QR_CACHE_SIZE: int = 20000
+
+    # realtime - thread pool ייעודי לעבודת המסד של סריקות QR (app/realtime/db.py)
+    REALTIME_DB_THREADS: int = 8
+    # שליחה לדשבורדים (app/realtime/websocket_manager.py)
+    REALTIME_SEND_QUEUE_SIZE: int = 256  # הודעות שממתינות לכל חיבור
+    REALTIME_SEND_TIMEOUT_SECONDS: float = 5.0  # שליחה שנתקעת יותר מזה - ניתוק הלקוח
+    REALTIME_SLOW_CONSUMER_POLICY: str = "disconnect"  # disconnect | drop (השמטת ההודעות הישנות בתור)
+    REALTIME_PUBSUB_BACKEND: str = "memory"  # memory (worker יחיד) | postgres (LISTEN/NOTIFY - כמה workers)
+    REALTIME_SEATING_CHANGE_DELAY_SECONDS: float = 0.5  # איחוד הודעות seating_changed
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,130 @@
+"""
+תור מיילים יוצאים (email_outbox) - המייל נשמר במסד ונשלח ע"י ה-workers של email_service.
+
+worker תופס באץ' של מיילים שהגיע זמנם (FOR UPDATE SKIP LOCKED) עם lease; מייל שנכשל חוזר
+לתור עם backoff אקספוננציאלי, ואחרי EMAIL_MAX_ATTEMPTS מסומן failed. מייל שה-worker שלו נפל
+באמצע השליחה (lease פג) נתפס מחדש - כך שאתחול של השרת לא מאבד מיילים (אבל מייל בודד עלול
+להישלח פעמיים).
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, and_, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import Base
+
+
+class OutboundEmail(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # למשל greeting_notification
+    to_address = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    attachment_path = Column(String, nullable=True)  # הקובץ נקרא רק בזמן השליחה
+    attachment_name = Column(String, nullable=True)
+
+    status = Column(String, nullable=False, default="pending")  # pending | sending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),)
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    to_address: str,
+    subject: str,
+    body: str,
+    attachment_path: Optional[str] = None,
+    attachment_name: Optional[str] = None,
+) -> OutboundEmail:
+    email = OutboundEmail(
+        kind=kind,
+        to_address=to_address,
+        subject=subject,
+        body=body,
+        attachment_path=attachment_path,
+        attachment_name=attachment_name,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(email)
+    db.commit()
+    db.refresh(email)
+    return email
+
+
+def claim_batch(db: Session, worker_id: str, limit: int, lease_seconds: int) -> List[OutboundEmail]:
+    """תופס עד limit מיילים שהגיע זמנם (וגם מיילים שה-lease שלהם פג)"""
+    now = datetime.utcnow()
+    emails = (
+        db.query(OutboundEmail)
+        .filter(
+            or_(
+                and_(OutboundEmail.status == "pending", OutboundEmail.next_attempt_at <= now),
+                and_(OutboundEmail.status == "sending", OutboundEmail.lease_expires_at < now),
+            )
+        )
+        .order_by(OutboundEmail.next_attempt_at, OutboundEmail.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for email in emails:
+        email.status = "sending"
+        email.lease_owner = worker_id
+        email.lease_expires_at = now + timedelta(seconds=lease_seconds)
+        email.attempts = (email.attempts or 0) + 1
+    db.commit()
+    return emails
+
+
+def mark_sent(db: Session, email: OutboundEmail) -> None:
+    email.status = "sent"
+    email.sent_at = datetime.utcnow()
+    email.lease_owner = None
+    email.lease_expires_at = None
+    email.last_error = None
+    db.commit()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """backoff אקספוננציאלי: EMAIL_RETRY_BASE_SECONDS * 2^(ניסיון-1), עד EMAIL_RETRY_MAX_SECONDS"""
+    seconds = settings.EMAIL_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, settings.EMAIL_RETRY_MAX_SECONDS))
+
+
+def mark_failed(db: Session, email: OutboundEmail, error: str, permanent: bool = False) -> None:
+    """שליחה שנכשלה - חזרה לתור אחרי backoff, או failed אם נגמרו הניסיונות / השגיאה סופית"""
+    email.last_error = error[:2000]
+    email.lease_owner = None
+    email.lease_expires_at = None
+    if permanent or email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        email.status = "failed"
+    else:
+        email.status = "pending"
+        email.next_attempt_at = datetime.utcnow() + retry_delay(email.attempts)
+    db.commit()
+
+
+def release(db: Session, emails: List[OutboundEmail]) -> None:
+    """החזרת מיילים שנתפסו ולא טופלו (למשל כשה-worker נעצר) לתור, בלי לספור ניסיון"""
+    for email in emails:
+        if email.status == "sending":
+            email.status = "pending"
+            email.attempts = max((email.attempts or 1) - 1, 0)
+            email.lease_owner = None
+            email.lease_expires_at = None
+    db.commit()
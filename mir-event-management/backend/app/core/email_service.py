@@ -1,16 +1,41 @@
 """
 שירות שליחת מיילים - Email Service
+
+המיילים נכנסים לתור במסד (app/core/email_outbox.py) ונשלחים ע"י מספר קבוע של workers
+(EMAIL_WORKER_THREADS) - כ-threads בתוך תהליך ה-API (EMAIL_WORKER_EMBEDDED) או כתהליך נפרד:
+    python -m app.core.email_service
+
+לכל worker חיבור SMTP אחד שנשאר פתוח בין מיילים ובין באצ'ים (STARTTLS ו-login פעם אחת),
+נסגר אחרי EMAIL_SMTP_IDLE_SECONDS בלי שליחה ונפתח מחדש כשהשרת מנתק.
+
+בדיקה מול שרת SMTP מקומי (aiosmtpd):
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=false SMTP_FROM=events@localhost ...
 """
+import argparse
+import os
 import smtplib
+import socket
 import threading
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-from typing import Optional
-import os
+import time
+import uuid
+from email.message import EmailMessage
+from typing import List, Optional
 
+from app.core import email_outbox
 from app.core.config import settings
+from app.core.database import SessionLocal
+
+GREETING_NOTIFICATION = "greeting_notification"
+
+_wake = threading.Event()
+_stop = threading.Event()
+_threads: List[threading.Thread] = []
+_threads_lock = threading.Lock()
+
+
+def _sender() -> str:
+    return settings.SMTP_FROM or settings.SMTP_USER
 
 
 def send_greeting_notification_email(
@@ -20,10 +45,10 @@ def send_greeting_notification_email(
     phone: Optional[str] = None,
     file_path: Optional[str] = None,
     file_name: Optional[str] = None
-):
+) -> Optional[int]:
     """
-    שליחת התראה במייל על ברכה חדשה
-    
+    הכנסת התראה במייל על ברכה חדשה לתור. מחזיר את מזהה המייל בתור (או None אם לא נשלח)
+
     Args:
         guest_name: שם המוזמן
         signer_name: שם חותם הברכה
@@ -35,25 +60,18 @@ def send_greeting_notification_email(
     # בדיקה אם שליחת מיילים מופעלת
     if not settings.SEND_GREETING_EMAILS:
         print("[Email] שליחת מיילים מושבתת (SEND_GREETING_EMAILS=False)")
-        return
-    
-    if not settings.SMTP_USER or not settings.SMTP_PASSWORD:
-        print("[Email] חסרים פרטי SMTP (SMTP_USER / SMTP_PASSWORD)")
-        return
-    
+        return None
+
+    if not _sender():
+        print("[Email] חסרה כתובת שולח (SMTP_FROM / SMTP_USER)")
+        return None
+
     if not settings.GREETING_NOTIFICATION_EMAIL:
         print("[Email] לא הוגדר מייל יעד (GREETING_NOTIFICATION_EMAIL)")
-        return
-    
-    try:
-        # יצירת המייל
-        msg = MIMEMultipart()
-        msg['From'] = settings.SMTP_USER
-        msg['To'] = settings.GREETING_NOTIFICATION_EMAIL
-        msg['Subject'] = f"התקבלה ברכה חדשה מ{guest_name}"
-        
-        # תוכן המייל בעברית
-        body = f"""
+        return None
+
+    # תוכן המייל בעברית
+    body = f"""
 📬 התקבלה ברכה חדשה!
 ━━━━━━━━━━━━━━━━━━━━━
 
@@ -68,34 +86,21 @@ def send_greeting_notification_email(
 
 📎 קובץ מצורף: {file_name or 'אין'}
 """
-        
-        msg.attach(MIMEText(body, 'plain', 'utf-8'))
-        
-        # הוספת קובץ מצורף אם קיים
-        if file_path and os.path.exists(file_path):
-            try:
-                with open(file_path, 'rb') as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {file_name or os.path.basename(file_path)}'
-                )
-                msg.attach(part)
-            except Exception as e:
-                print(f"[Email] שגיאה בצירוף קובץ: {e}")
-        
-        # שליחת המייל
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(msg)
-        
-        print(f"[Email] נשלחה התראה על ברכה חדשה מ{guest_name} ל-{settings.GREETING_NOTIFICATION_EMAIL}")
-        
-    except Exception as e:
-        print(f"[Email] שגיאה בשליחת מייל: {e}")
+
+    db = SessionLocal()
+    try:
+        email = email_outbox.enqueue(
+            db,
+            kind=GREETING_NOTIFICATION,
+            to_address=settings.GREETING_NOTIFICATION_EMAIL,
+            subject=f"התקבלה ברכה חדשה מ{guest_name}",
+            body=body,
+            attachment_path=file_path,
+            attachment_name=file_name,
+        )
+        return email.id
+    finally:
+        db.close()
 
 
 def send_greeting_notification_async(
@@ -107,12 +112,205 @@ def send_greeting_notification_async(
     file_name: Optional[str] = None
 ):
     """
-    שליחת התראה במייל ברקע (לא חוסם את התגובה)
+    שליחת התראה במייל ברקע (לא חוסם את התגובה) - המייל נשמר בתור וה-workers מתעוררים
     """
-    thread = threading.Thread(
-        target=send_greeting_notification_email,
-        args=(guest_name, signer_name, content, phone, file_path, file_name)
-    )
-    thread.daemon = True
-    thread.start()
+    email_id = send_greeting_notification_email(guest_name, signer_name, content, phone, file_path, file_name)
+    if email_id is not None:
+        notify()
+    return email_id
+
+
+def build_message(email: email_outbox.OutboundEmail) -> EmailMessage:
+    msg = EmailMessage()
+    msg['From'] = _sender()
+    msg['To'] = email.to_address
+    msg['Subject'] = email.subject
+    body = email.body
+
+    # הקובץ המצורף נקרא רק כאן, ועד EMAIL_MAX_ATTACHMENT_BYTES - כך שכל worker מחזיק לכל היותר קובץ אחד
+    attachment = None
+    if email.attachment_path:
+        try:
+            size = os.path.getsize(email.attachment_path)
+            if size > settings.EMAIL_MAX_ATTACHMENT_BYTES:
+                body += f"\n(הקובץ המצורף גדול מדי למייל: {size // (1024 * 1024)}MB)\n"
+            else:
+                with open(email.attachment_path, 'rb') as f:
+                    attachment = f.read()
+        except OSError as e:
+            print(f"[Email] שגיאה בצירוף קובץ למייל {email.id}: {e}")
+
+    msg.set_content(body, charset='utf-8')
+    if attachment is not None:
+        msg.add_attachment(
+            attachment,
+            maintype='application',
+            subtype='octet-stream',
+            filename=email.attachment_name or os.path.basename(email.attachment_path),
+        )
+    return msg
+
+
+class SMTPConnection:
+    """חיבור SMTP שנפתח פעם אחת ומשמש לכל המיילים של ה-worker; מתחבר מחדש אחרי ניתוק"""
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _open(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.EMAIL_SMTP_TIMEOUT_SECONDS)
+        try:
+            if settings.SMTP_STARTTLS:
+                smtp.starttls()
+            if settings.SMTP_USER and settings.SMTP_PASSWORD:
+                smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+
+    def send(self, msg: EmailMessage) -> None:
+        if self._smtp is not None and self.idle_for() > settings.EMAIL_SMTP_IDLE_SECONDS:
+            self.close()
+        # חיבור שהשרת סגר מתגלה רק בשליחה - ניסיון אחד נוסף על חיבור חדש
+        for attempt in (1, 2):
+            reused = self._smtp is not None
+            if self._smtp is None:
+                self._smtp = self._open()
+            try:
+                self._smtp.send_message(msg)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+                self.close()
+                if attempt == 2 or not reused:
+                    raise
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self._last_used
+
+    def is_open(self) -> bool:
+        return self._smtp is not None
+
+    def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+# שגיאות שנוגעות למייל עצמו; שאר השגיאות של smtplib (OSError) הן ברמת החיבור
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """נמען / הודעה שהשרת דחה סופית (5xx) - אין טעם לנסות שוב"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPDataError, smtplib.SMTPSenderRefused)):
+        return error.smtp_code >= 500
+    return False
+
+
+class EmailWorker:
+    def __init__(self, worker_id: Optional[str] = None, poll_interval: Optional[float] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_interval = settings.EMAIL_POLL_SECONDS if poll_interval is None else poll_interval
+        self.connection = SMTPConnection()
+
+    def run_once(self) -> int:
+        """שולח באץ' אחד מהתור. מחזיר כמה מיילים נתפסו (0 - התור ריק)"""
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            emails = email_outbox.claim_batch(db, self.worker_id, settings.EMAIL_BATCH_SIZE, settings.EMAIL_LEASE_SECONDS)
+            for index, email in enumerate(emails):
+                if _stop.is_set():
+                    email_outbox.release(db, emails[index:])
+                    break
+                try:
+                    self.connection.send(build_message(email))
+                except MESSAGE_ERRORS as e:
+                    print(f"[email-worker] {self.worker_id} email {email.id} rejected (attempt {email.attempts}): {e}")
+                    email_outbox.mark_failed(db, email, f"{type(e).__name__}: {e}", permanent=_is_permanent(e))
+                except OSError as e:
+                    # השרת לא זמין / החיבור נכשל (כולל שגיאות SMTP ברמת החיבור) - כל הבאץ' חוזר לתור עם backoff
+                    print(f"[email-worker] {self.worker_id} SMTP unavailable: {e}")
+                    self.connection.close()
+                    for pending in emails[index:]:
+                        email_outbox.mark_failed(db, pending, f"{type(e).__name__}: {e}")
+                    break
+                except Exception as e:
+                    print(f"[email-worker] {self.worker_id} email {email.id} failed (attempt {email.attempts}): {e}")
+                    email_outbox.mark_failed(db, email, f"{type(e).__name__}: {e}", permanent=_is_permanent(e))
+                else:
+                    email_outbox.mark_sent(db, email)
+            return len(emails)
+        finally:
+            db.close()
+
+    def run_forever(self) -> None:
+        print(f"[email-worker] {self.worker_id} started")
+        try:
+            while not _stop.is_set():
+                try:
+                    busy = self.run_once()
+                except Exception as e:
+                    print(f"[email-worker] {self.worker_id} error: {e}")
+                    busy = 0
+                if busy:
+                    continue
+                if self.connection.is_open() and self.connection.idle_for() > settings.EMAIL_SMTP_IDLE_SECONDS:
+                    self.connection.close()
+                _wake.wait(self.poll_interval)
+                _wake.clear()
+        finally:
+            self.connection.close()
+
+
+def notify() -> None:
+    """מעיר את ה-workers שבתהליך הנוכחי (אחרי הכנסת מייל לתור)"""
+    _wake.set()
+
+
+def start_email_workers(count: Optional[int] = None) -> None:
+    """מפעיל workers כ-threads בתוך תהליך ה-API (פעם אחת בלבד)"""
+    count = settings.EMAIL_WORKER_THREADS if count is None else count
+    with _threads_lock:
+        if _threads:
+            return
+        _stop.clear()
+        for i in range(count):
+            worker = EmailWorker()
+            thread = threading.Thread(target=worker.run_forever, name=f"email-worker-{i}", daemon=True)
+            thread.start()
+            _threads.append(thread)
+
+
+def stop_email_workers(timeout: float = 5.0) -> None:
+    with _threads_lock:
+        _stop.set()
+        _wake.set()
+        for thread in _threads:
+            thread.join(timeout=timeout)
+        _threads.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Outbound email worker")
+    parser.add_argument("--threads", type=int, default=settings.EMAIL_WORKER_THREADS)
+    args = parser.parse_args()
+
+    start_email_workers(args.threads)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop_email_workers()
+
 
+if __name__ == "__main__":
+    main()
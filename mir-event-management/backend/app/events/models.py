@@ -17,6 +17,8 @@ class Event(Base):
     location = Column(String, nullable=False)
 
     admin_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # גרסת מפת הישיבה - עולה בכל שינוי (SEATING_CACHE_SHARED, app/seatings/snapshot.py)
+    seating_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # קשרים
     tables = relationship("Table", back_populates="event")
@@ -1,20 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.events import repository, schemas
-from app.core.database import SessionLocal
+from app.core.database import get_db
 from app.auth.dependencies import get_current_user  # ✅ הוספת current_user
 from app.permissions.utils import check_event_permission
 from app.core.config import settings
 
 router = APIRouter(prefix="/events", tags=["Events"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ✅ יצירת אירוע – עם admin_id לפי המשתמש המחובר
 @router.post("/", response_model=schemas.EventOut)
 def create_event(
@@ -0,0 +1,265 @@
+"""
+ייצוא רשימת מוזמנים (GET /guests/export) בזרימה.
+
+המוזמנים נקראים ב-server-side cursor (yield_per) בקבוצות של EXPORT_CHUNK_ROWS, ערכי
+השדות הדינמיים נטענים לכל קבוצה בשאילתה אחת, והשורות נכתבות ישר לקובץ:
+- GuestExport (כותרות ועמודות דינמיות) והשאילתה נבנים ב-handler, על ה-session של הבקשה.
+- csv: הבייטים נשלחים ללקוח תוך כדי קריאה (זמן עד הבייט הראשון קצר).
+- xlsx: openpyxl במצב write-only - השורות נכתבות לקובץ זמני בדיסק ולא נשמרות בזיכרון.
+  הקובץ נכתב במלואו ב-handler ונשלח עם Content-Length, כך ששגיאה מחזירה 500 ולא קובץ קטוע.
+"""
+import csv
+import io
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.guests import models, repository
+
+EXPORT_CHUNK_ROWS = 1000
+FILE_CHUNK_BYTES = 64 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+
+def _text(attr: str) -> Callable[[models.Guest], Any]:
+    return lambda g: getattr(g, attr) or ""
+
+
+def _stamp(attr: str) -> Callable[[models.Guest], Any]:
+    return lambda g: str(getattr(g, attr)) if getattr(g, attr) else ""
+
+
+def _yes_no(attr: str) -> Callable[[models.Guest], Any]:
+    return lambda g: "כן" if getattr(g, attr) else "לא"
+
+
+# עמודות הקובץ לפי הסדר: (כותרת, ערך מהמוזמן)
+BASE_COLUMNS: List[Tuple[str, Callable[[models.Guest], Any]]] = [
+    # פרטים בסיסיים
+    ("מזהה", _text("id")),
+    ("אירוע", _text("event_id")),
+    ("שם פרטי", _text("first_name")),
+    ("שם אמצעי", _text("middle_name")),
+    ("שם משפחה", _text("last_name")),
+    ("תואר לפני", _text("title_before")),
+    ("תואר אחרי", _text("title_after")),
+    ("תואר בן זוג", _text("spouse_name")),
+    ("שם אישה", _text("wife_name")),
+    ("תעודת זהות", _text("id_number")),
+    ("מין", _text("gender")),
+    ("גיל", _text("age")),
+    ("תאריך לידה", _stamp("birth_date")),
+    ("שפה", _text("language")),
+    # פרטי קשר
+    ("טלפון נייד", _text("mobile_phone")),
+    ("טלפון בית", _text("home_phone")),
+    ("טלפון נוסף 1", _text("alt_phone_1")),
+    ("טלפון נוסף 2", _text("alt_phone_2")),
+    ("טלפון אשה", _text("wife_phone")),
+    ("מייל", _text("email")),
+    ("מייל 2", _text("email_2")),
+    # כתובת
+    ("רחוב", _text("street")),
+    ("מספר בניין", _text("building_number")),
+    ("מספר דירה", _text("apartment_number")),
+    ("עיר", _text("city")),
+    ("שכונה", _text("neighborhood")),
+    ("מיקוד", _text("postal_code")),
+    ("מדינה", _text("country")),
+    ("ארץ", _text("state")),
+    ("כתובת למשלוח", _text("mailing_address")),
+    ("שם לקבלה", _text("recipient_name")),
+    # מזהים
+    ("מספר חשבון", _text("account_number")),
+    ("מספר אישי מניג'ר", _text("manager_personal_number")),
+    ("Card ID", _text("card_id")),
+    # שיוך וניהול
+    ("קבוצה", _text("groups")),
+    ("קבוצה מייל", _text("email_group")),
+    ("קישור למשתמש", _text("user_link")),
+    ("מזהה שגריר", _text("ambassador_id")),
+    ("שגריר", _text("ambassador")),
+    ("שיוך לטלפנית", _text("telephonist_assignment")),
+    ("בית כנסת", _text("synagogue")),
+    # טלפניות ושיחות
+    ("סטטוס זכאות ללידים", _text("eligibility_status_for_leads")),
+    ("ביקש לחזור בתאריך", _stamp("requested_return_date")),
+    ("שיחה אחרונה עם טלפנית", _stamp("last_telephonist_call")),
+    ("סטטוס שיחה אחרונה", _text("last_call_status")),
+    ("הערות", _text("notes")),
+    ("הערות טלפניות", _text("telephonist_notes")),
+    ("תאור סטטוס", _text("status_description")),
+    # בנקים ותשלומים
+    ("שם בנק", _text("bank")),
+    ("סניף", _text("branch")),
+    ("מספר כרטיס אשראי", _text("credit_card_number")),
+    # תרומות
+    ("הוק פעיל", _yes_no("is_hok_active")),
+    ("סכום הוק חודשי", _text("monthly_hok_amount_nis")),
+    ("סכום תשלום אחרון", _text("last_payment_amount")),
+    ("תרומות בשנה האחרונה", _text("donations_payments_last_year")),
+    ("סהכ תרומות", _text("total_donations_payments")),
+    ("התחייבות לתרומה", _text("donation_commitment")),
+    ("יכולת תרומה", _text("donation_ability")),
+    # אירועים ודינרים
+    ("דינרים משתתפים", _text("dinners_participated")),
+    ("סטטוס חסות/ברכה", _text("sponsorship_blessing_status")),
+    ("תוכן הברכה דינר קודם", _text("blessing_content_dinner_2024")),
+    # הושבות גברים
+    ("הושבה גברים קודמת", _text("men_seating_feb")),
+    ("הושבה זמני גברים", _text("men_temporary_seating_feb")),
+    ("מספר שולחן גברים", _text("men_table_number")),
+    ("ליד מי תרצו לשבת", _text("seat_near_main")),
+    # הושבות נשים
+    ("הושבה נשים קודמת", _text("women_seating_feb")),
+    ("הושבה זמני נשים", _text("women_temporary_seating_feb")),
+    ("מספר שולחן נשים", _text("women_table_number")),
+    ("השתתפות נשים", _text("women_participation_dinner_feb")),
+    # סטטוס
+    ("אישור הגעה", _yes_no("confirmed_arrival")),
+    ("קוד QR", _text("qr_code")),
+    ("זמן צ'ק-אין", _stamp("check_in_time")),
+    ("זמן צ'ק-אאוט", _stamp("check_out_time")),
+    ("Overbooked", _yes_no("is_overbooked")),
+    ("זמן סריקה אחרון", _stamp("last_scan_time")),
+    # שדות דינמיים
+] + [(f"שדה מותאם {i}", _text(f"custom_field_{i}")) for i in range(1, repository.MAX_INLINE_FIELDS + 1)]
+
+
+def _filtered_query(
+    db: Session,
+    event_id: Optional[int] = None,
+    name: Optional[str] = None,
+    gender: Optional[str] = None,
+    confirmed_only: Optional[bool] = None,
+):
+    query = db.query(models.Guest)
+    if event_id:
+        query = query.filter(models.Guest.event_id == event_id)
+    if name:
+        query = query.filter(models.Guest.first_name.ilike(f"%{name}%"))
+    if gender:
+        query = query.filter(models.Guest.gender == gender)
+    if confirmed_only is not None:
+        query = query.filter(models.Guest.confirmed_arrival == confirmed_only)
+    return query
+
+
+def _dynamic_columns(db: Session, query) -> Dict[int, str]:
+    """custom_field_id -> כותרת, לשדות (מעבר ל-15) שיש להם ערך אצל אחד המוזמנים שבייצוא"""
+    guest_ids = select(query.with_entities(models.Guest.id).subquery().c.id)
+    if repository.uses_jsonb_field_storage():
+        keys = (
+            db.query(func.jsonb_object_keys(models.Guest.custom_fields))
+            .filter(models.Guest.id.in_(guest_ids))
+            .distinct()
+        )
+        field_ids = [int(k) for (k,) in keys]
+        fields = db.query(models.GuestCustomField.id, models.GuestCustomField.name).filter(
+            models.GuestCustomField.id.in_(field_ids)
+        )
+    else:
+        fields = (
+            db.query(models.GuestCustomField.id, models.GuestCustomField.name)
+            .join(models.GuestFieldValue, models.GuestFieldValue.custom_field_id == models.GuestCustomField.id)
+            .filter(models.GuestFieldValue.guest_id.in_(guest_ids))
+            .distinct()
+        )
+    return {field_id: name for field_id, name in sorted(fields) if name}
+
+
+def _chunk_field_values(db: Session, guests: List[models.Guest]) -> Dict[int, Dict[int, Any]]:
+    """guest_id -> {custom_field_id: value} לקבוצת מוזמנים"""
+    if repository.uses_jsonb_field_storage():
+        return {g.id: {int(k): v for k, v in (g.custom_fields or {}).items()} for g in guests}
+    values: Dict[int, Dict[int, Any]] = {}
+    rows = (
+        db.query(models.GuestFieldValue.guest_id, models.GuestFieldValue.custom_field_id, models.GuestFieldValue.value)
+        .filter(models.GuestFieldValue.guest_id.in_([g.id for g in guests]))
+        .order_by(models.GuestFieldValue.id)
+    )
+    for guest_id, field_id, value in rows:
+        values.setdefault(guest_id, {})[field_id] = value
+    return values
+
+
+class GuestExport:
+    """
+    מתכנן ייצוא: הכותרות נקבעות מראש (עמודות קבועות + שדות דינמיים שיש להם ערך),
+    ו-rows() מחזיר את השורות בקבוצות תוך קריאה מה-cursor.
+    שדה דינמי ששמו זהה לעמודה קבועה דורס את הערך שלה (כמו בייצוא הקודם דרך DataFrame).
+    """
+
+    def __init__(self, db: Session, **filters):
+        self.db = db
+        self.query = _filtered_query(db, **filters)
+        self.headers = [header for header, _ in BASE_COLUMNS]
+        positions = {header: i for i, header in enumerate(self.headers)}
+        self.field_positions: Dict[int, int] = {}
+        for field_id, name in _dynamic_columns(db, self.query).items():
+            if name not in positions:
+                positions[name] = len(self.headers)
+                self.headers.append(name)
+            self.field_positions[field_id] = positions[name]
+
+    def _row(self, guest: models.Guest, field_values: Dict[int, Any]) -> List[Any]:
+        row = [getter(guest) for _, getter in BASE_COLUMNS]
+        row.extend([None] * (len(self.headers) - len(row)))
+        for field_id, value in field_values.items():
+            position = self.field_positions.get(field_id)
+            if position is not None:
+                row[position] = value or ""
+        return row
+
+    def chunks(self, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[List[Any]]]:
+        statement = self.query.order_by(models.Guest.id).statement.execution_options(yield_per=chunk_rows)
+        for partition in self.db.execute(statement).scalars().partitions():
+            field_values = _chunk_field_values(self.db, partition) if self.field_positions else {}
+            yield [self._row(g, field_values.get(g.id, {})) for g in partition]
+
+
+def iter_csv(export: GuestExport) -> Iterator[bytes]:
+    """CSV בזרימה - הבייטים נשלחים ללקוח תוך כדי קריאה מה-cursor (על ה-session של הבקשה)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")  # BOM - כדי ש-Excel יזהה UTF-8 (עברית)
+    writer.writerow(export.headers)
+    for rows in export.chunks():
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def render_xlsx_file(export: GuestExport):
+    """כתיבת ה-xlsx לקובץ זמני - נקרא ב-handler לפני יצירת התגובה, כדי ששגיאה תחזיר 500.
+    מחזיר את הקובץ כשהמיקום בסופו (= גודל הקובץ); הקובץ נסגר ע"י מי ששולח אותו"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    bold = Font(bold=True)
+    header_cells = []
+    for header in export.headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = bold
+        header_cells.append(cell)
+    sheet.append(header_cells)
+    for rows in export.chunks():
+        for row in rows:
+            sheet.append(row)
+    tmp = tempfile.TemporaryFile()
+    try:
+        workbook.save(tmp)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0, io.SEEK_END)
+    return tmp
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, Boolean, DateTime, FetchedValue, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -20,6 +21,9 @@ class Guest(Base):
     check_out_time = Column(DateTime, nullable=True)  # NEW: Time of check-out
     is_overbooked = Column(Boolean, default=False)  # NEW: If assigned to an overbooked spot
     last_scan_time = Column(DateTime, nullable=True)  # NEW: Last scan time
+    scan_token = Column(String, nullable=True)  # טוקן סריקה חתום לכניסה (app/realtime/scan_tokens.py)
+    # UTC; מתעדכן ב-trigger במסד בכל UPDATE של המוזמן ובכל שינוי במקום הישיבה שלו (פידים של הבוט)
+    updated_at = Column(DateTime, nullable=False, server_default=text("timezone('utc', now())"), server_onupdate=FetchedValue())
     
     # 15 שדות דינמיים - השדות הראשונים נשמרים כאן, מעבר לזה ב-guest_field_values
     custom_field_1 = Column(String, nullable=True)
@@ -37,6 +41,8 @@ class Guest(Base):
     custom_field_13 = Column(String, nullable=True)
     custom_field_14 = Column(String, nullable=True)
     custom_field_15 = Column(String, nullable=True)
+    # שדות מעבר ל-15 במצב GUEST_FIELDS_STORAGE=jsonb: {"<custom_field_id>": value}
+    custom_fields = Column(JSONB, nullable=False, default=dict, server_default=text("'{}'::jsonb"))
     
     # פרטים אישיים
     middle_name = Column(String, nullable=True)  # שם אמצעי
@@ -136,7 +142,21 @@ class Guest(Base):
     realtime_notifications = relationship("RealTimeNotification", back_populates="guest")
     payments = relationship("Payment", back_populates="guest")
 
-    __table_args__ = (UniqueConstraint('event_id', 'id_number', name='uq_event_guest'),)
+    __table_args__ = (
+        UniqueConstraint('event_id', 'id_number', name='uq_event_guest'),
+        # keyset pagination של טבלת המוזמנים (guests grid) - לפי id ולפי שם
+        Index('ix_guests_event_id_id', 'event_id', 'id'),
+        Index('ix_guests_event_last_name_id', 'event_id', 'last_name', 'id'),
+        Index('ix_guests_event_first_name_id', 'event_id', 'first_name', 'id'),
+        # סינון לפי שדה דינמי (custom_fields @> {...})
+        Index('ix_guests_custom_fields', 'custom_fields', postgresql_using='gin', postgresql_ops={'custom_fields': 'jsonb_path_ops'}),
+        # סריקת QR בכניסה - טוקן הסריקה, ו-QR ישנים לפי טלפון / qr_code
+        Index('uq_guests_event_scan_token', 'event_id', 'scan_token', unique=True),
+        Index('ix_guests_event_mobile_phone', 'event_id', 'mobile_phone'),
+        Index('ix_guests_event_qr_code', 'event_id', 'qr_code'),
+        # פידים של הבוט - שינויים מאז (updated_at, id)
+        Index('ix_guests_event_updated_at_id', 'event_id', 'updated_at', 'id'),
+    )
 
 
 class GuestCustomField(Base):
@@ -165,6 +185,8 @@ class GuestFieldValue(Base):
     guest = relationship("Guest", back_populates="field_values")
     custom_field = relationship("GuestCustomField", back_populates="values")
 
+    __table_args__ = (Index('ix_guest_field_values_guest_field', 'guest_id', 'custom_field_id'),)
+
 class GuestFormShare(Base):
     __tablename__ = "guest_form_shares"
 
@@ -1,6 +1,9 @@
+import base64
+import json
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, func, literal, or_, select, text, tuple_
+from app.core.config import settings
 from app.guests import models, schemas
 from app.guests.utils import decode_prefixed_name, encode_prefixed_name
 from app.tableStructure import models as table_structure_models
@@ -8,11 +11,45 @@ from app.seatings import models as seating_models
 from sqlalchemy.exc import IntegrityError
 from app.audit_log.repository import log_change
 from secrets import token_urlsafe
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 # מספר השדות הדינמיים שנשמרים בטבלה הראשית
 MAX_INLINE_FIELDS = 15
 
+
+def uses_jsonb_field_storage() -> bool:
+    """True אם שדות מעבר ל-15 נשמרים ב-guests.custom_fields (JSONB) ולא ב-guest_field_values"""
+    return settings.GUEST_FIELDS_STORAGE == "jsonb"
+
+
+class InlineFieldValue:
+    """ערך שדה שלא שמור כשורה ב-guest_field_values (עמודת custom_field_N או JSONB)"""
+    def __init__(self, guest_id, custom_field_id, value):
+        self.guest_id = guest_id
+        self.custom_field_id = custom_field_id
+        self.value = value
+        self.id = None
+
+
+def merge_custom_field_values(db: Session, values_by_guest: Dict[int, Dict[int, Optional[str]]]) -> None:
+    """
+    ממזג ערכי שדות דינמיים לעמודת guests.custom_fields - UPDATE אחד לכל מוזמן, בלי commit.
+    values_by_guest: guest_id -> {custom_field_id: value}
+    """
+    params = [
+        {
+            "guest_id": guest_id,
+            "patch": json.dumps({str(field_id): value for field_id, value in fields.items()}, ensure_ascii=False),
+        }
+        for guest_id, fields in values_by_guest.items()
+        if fields
+    ]
+    if params:
+        db.execute(
+            text("UPDATE guests SET custom_fields = custom_fields || CAST(:patch AS jsonb) WHERE id = :guest_id"),
+            params,
+        )
+
 def get_field_position_in_table(db: Session, event_id: int, custom_field_id: int) -> Optional[int]:
     """
     מחזיר את המיקום של השדה בטבלה הראשית (1-15) או None אם הוא מעבר ל-15.
@@ -291,13 +328,8 @@ def create_custom_field(db: Session, field: schemas.CustomFieldCreate):
     return db_field
 
 def get_guests_with_fields(db: Session, event_id: int, limit: int = None, offset: int = 0):
-    # אופטימיזציה: טען את כל הנתונים בבת אחת עם joinedload
-    from sqlalchemy.orm import joinedload
-    
-    # שליפת כל האורחים לאירוע עם field_values
-    query = db.query(models.Guest).filter(models.Guest.event_id == event_id).options(
-        joinedload(models.Guest.field_values).joinedload(models.GuestFieldValue.custom_field)
-    )
+    # שליפת כל האורחים לאירוע - ערכי השדות הדינמיים נטענים בנפרד למטה (או מה-JSONB של השורה)
+    query = db.query(models.Guest).filter(models.Guest.event_id == event_id)
     
     # הוסף limit ו-offset אם צוינו
     if limit is not None:
@@ -330,7 +362,8 @@ def get_guests_with_fields(db: Session, event_id: int, limit: int = None, offset
     
     # טען את כל ה-field values בבת אחת (רק לשדות מעבר ל-15)
     all_field_values = {}
-    if guest_ids and custom_field_ids_over_15:
+    jsonb_storage = uses_jsonb_field_storage()
+    if guest_ids and custom_field_ids_over_15 and not jsonb_storage:
         field_values = db.query(models.GuestFieldValue).filter(
             models.GuestFieldValue.guest_id.in_(guest_ids),
             models.GuestFieldValue.custom_field_id.in_(custom_field_ids_over_15)
@@ -650,6 +683,9 @@ def get_guests_with_fields(db: Session, event_id: int, limit: int = None, offset
                 # קרא מהטבלה הראשית
                 field_name = f"custom_field_{field_position}"
                 value = getattr(guest, field_name) or ""
+            elif jsonb_storage:
+                # קרא מ-guests.custom_fields (כבר נטען עם השורה)
+                value = (guest.custom_fields or {}).get(str(field.id), "")
             else:
                 # קרא מ-guest_field_values
                 key = (guest.id, field.id)
@@ -669,6 +705,196 @@ def get_guests_with_fields(db: Session, event_id: int, limit: int = None, offset
         result.append(guest_data)
     return result
 
+# ---------------------------------------------------------------------------
+# טבלת מוזמנים (grid): keyset pagination, בחירת עמודות, מיון וסינון ב-SQL
+# ---------------------------------------------------------------------------
+
+GRID_DEFAULT_LIMIT = 100
+GRID_MAX_LIMIT = 1000
+GRID_FIELD_PREFIX = "field:"  # עמודה דינמית: field:<custom_field_id>
+GRID_SEARCH_COLUMNS = ("first_name", "last_name", "mobile_phone", "email", "id_number")
+
+
+def _encode_grid_cursor(sort_value, guest_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, guest_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_grid_cursor(cursor: str):
+    try:
+        sort_value, guest_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return sort_value, int(guest_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _grid_python_type(column) -> type:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return str
+
+
+def _coerce_grid_value(value, python_type: type):
+    """ממיר ערך מה-cursor / מהסינון לסוג העמודה"""
+    if value is None:
+        return None
+    if python_type is bool:
+        return str(value).strip().lower() in ("true", "1", "yes", "כן")
+    if python_type is int:
+        return int(value)
+    if python_type is datetime:
+        return datetime.fromisoformat(str(value))
+    return str(value)
+
+
+def _grid_inline_positions(db: Session, event_id: int) -> dict:
+    """custom_field_id -> מיקום בעמודות custom_field_1..15 (כמו get_field_position_in_table)"""
+    fields = db.query(models.GuestCustomField.id, models.GuestCustomField.name).filter(
+        models.GuestCustomField.event_id == event_id
+    ).all()
+
+    def get_order_index(field):
+        _, order_index, _, _ = decode_prefixed_name(field.name)
+        return (order_index if order_index is not None else 0, field.id)
+
+    ordered = sorted(fields, key=get_order_index)
+    return {f.id: index for index, f in enumerate(ordered[:MAX_INLINE_FIELDS], start=1)}
+
+
+def _grid_column(db: Session, event_id: int, key: str, inline_positions: dict):
+    """
+    מחזיר (ביטוי SQL, סוג, nullable) לעמודת grid: עמודה בטבלת guests,
+    או שדה דינמי - מהעמודה custom_field_N, מ-guests.custom_fields (מצב jsonb)
+    או כשאילתת-משנה על guest_field_values.
+    """
+    if key.startswith(GRID_FIELD_PREFIX):
+        try:
+            field_id = int(key[len(GRID_FIELD_PREFIX):])
+        except ValueError:
+            raise ValueError(f"Unknown column: {key}")
+        position = inline_positions.get(field_id)
+        if position is not None:
+            return getattr(models.Guest, f"custom_field_{position}"), str, True
+        if uses_jsonb_field_storage():
+            return models.Guest.custom_fields[str(field_id)].astext, str, True
+        field_value = (
+            select(models.GuestFieldValue.value)
+            .where(
+                models.GuestFieldValue.guest_id == models.Guest.id,
+                models.GuestFieldValue.custom_field_id == field_id,
+            )
+            .order_by(models.GuestFieldValue.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        return field_value, str, True
+
+    column = models.Guest.__table__.columns.get(key)
+    if column is None or key == "event_id":
+        raise ValueError(f"Unknown column: {key}")
+    return getattr(models.Guest, key), _grid_python_type(column), bool(column.nullable) and key != "id"
+
+
+def _grid_jsonb_field_id(key: str, inline_positions: dict) -> Optional[int]:
+    """custom_field_id אם העמודה היא שדה דינמי שנשמר ב-guests.custom_fields, אחרת None"""
+    if not key.startswith(GRID_FIELD_PREFIX) or not uses_jsonb_field_storage():
+        return None
+    field_id = int(key[len(GRID_FIELD_PREFIX):])
+    return None if field_id in inline_positions else field_id
+
+
+def get_guests_grid(
+    db: Session,
+    event_id: int,
+    columns: List[str],
+    *,
+    sort: str = "id",
+    descending: bool = False,
+    limit: int = GRID_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    filters: Optional[List[tuple]] = None,
+    search: Optional[str] = None,
+) -> dict:
+    """
+    עמוד אחד של טבלת המוזמנים. נשלפות רק העמודות שהתבקשו, המיון והסינון נעשים ב-SQL,
+    והדפדוף לפי cursor (ערך המיון + id של השורה האחרונה) - כך שזמן עמוד לא תלוי במיקומו.
+    ValueError על עמודה / cursor לא תקינים.
+    """
+    limit = max(1, min(limit or GRID_DEFAULT_LIMIT, GRID_MAX_LIMIT))
+    inline_positions = _grid_inline_positions(db, event_id)
+
+    keys = ["id"] + [k for k in dict.fromkeys(columns) if k != "id"]
+    projected = [_grid_column(db, event_id, key, inline_positions)[0].label(f"c{i}") for i, key in enumerate(keys)]
+
+    sort_expr, sort_type, sort_nullable = _grid_column(db, event_id, sort, inline_positions)
+    sort_expr = sort_expr.label("sort_value")
+    query = db.query(*projected, sort_expr).filter(models.Guest.event_id == event_id)
+
+    for key, value in filters or []:
+        expr, python_type, _ = _grid_column(db, event_id, key, inline_positions)
+        # "=ערך" - התאמה מדויקת; בשדה שנשמר ב-JSONB זה custom_fields @> {...} דרך אינדקס ה-GIN
+        exact = value.startswith("=")
+        if exact:
+            value = value[1:]
+        jsonb_field_id = _grid_jsonb_field_id(key, inline_positions)
+        if python_type is str and not exact:
+            query = query.filter(expr.ilike(f"%{value}%"))
+        elif jsonb_field_id is not None:
+            query = query.filter(models.Guest.custom_fields.contains({str(jsonb_field_id): value}))
+        else:
+            query = query.filter(expr == _coerce_grid_value(value, python_type))
+
+    if search:
+        pattern = f"%{search.strip()}%"
+        query = query.filter(or_(*[getattr(models.Guest, c).ilike(pattern) for c in GRID_SEARCH_COLUMNS]))
+
+    sort_col = sort_expr.element
+    if cursor:
+        after_value, after_id = _decode_grid_cursor(cursor)
+        after_value = _coerce_grid_value(after_value, sort_type)
+        # bind מפורש - SQLAlchemy לא מאפשר < / > מול True/False ישירות
+        after_bound = literal(after_value, type_=sort_col.type) if after_value is not None else None
+        newer = (lambda a, b: a < b) if descending else (lambda a, b: a > b)
+        if sort == "id":
+            query = query.filter(newer(models.Guest.id, after_id))
+        elif not sort_nullable:
+            query = query.filter(newer(tuple_(sort_col, models.Guest.id), tuple_(after_bound, after_id)))
+        elif after_value is None:
+            # ערכים ריקים ממוינים בסוף
+            query = query.filter(sort_col.is_(None), newer(models.Guest.id, after_id))
+        else:
+            query = query.filter(
+                or_(
+                    sort_col.is_(None),
+                    and_(
+                        sort_col.isnot(None),
+                        or_(newer(sort_col, after_bound), and_(sort_col == after_bound, newer(models.Guest.id, after_id))),
+                    ),
+                )
+            )
+
+    direction = (lambda e: e.desc()) if descending else (lambda e: e.asc())
+    order_by = []
+    if sort != "id":
+        if sort_nullable:
+            order_by.append(sort_col.is_(None).asc())
+        order_by.append(direction(sort_col))
+    order_by.append(direction(models.Guest.id))
+    rows = query.order_by(*order_by).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{key: row[i] for i, key in enumerate(keys)} for row in rows]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = _encode_grid_cursor(last[-1], last[0])
+    return {"columns": keys, "items": items, "next_cursor": next_cursor}
+
+
 def get_custom_fields(db: Session, event_id: int, form_key: str | None = None):
     query = db.query(models.GuestCustomField).filter(models.GuestCustomField.event_id == event_id)
     fields = query.all()
@@ -784,7 +1010,7 @@ def deactivate_form_share(db: Session, share_id: int, event_id: int):
 def create_field_value(db: Session, value: schemas.FieldValueCreate):
     """
     יוצר ערך שדה. אם השדה הוא אחד מ-15 הראשונים, שומר בטבלה הראשית.
-    אחרת, שומר ב-guest_field_values.
+    אחרת, שומר ב-guest_field_values (או ב-guests.custom_fields במצב jsonb).
     """
     # בדוק אם השדה הוא אחד מ-15 הראשונים
     guest = db.query(models.Guest).filter(models.Guest.id == value.guest_id).first()
@@ -805,15 +1031,17 @@ def create_field_value(db: Session, value: schemas.FieldValueCreate):
         
         field_name = f"custom_field_{field_position}"
         setattr(guest, field_name, value.value)
+        if str(value.custom_field_id) in (guest.custom_fields or {}):
+            guest.custom_fields = {k: v for k, v in guest.custom_fields.items() if k != str(value.custom_field_id)}
         db.commit()
         db.refresh(guest)
         # מחזיר אובייקט מדומה כדי לשמור על תאימות
-        class InlineFieldValue:
-            def __init__(self, guest_id, custom_field_id, value):
-                self.guest_id = guest_id
-                self.custom_field_id = custom_field_id
-                self.value = value
-                self.id = None
+        return InlineFieldValue(value.guest_id, value.custom_field_id, value.value)
+    elif uses_jsonb_field_storage():
+        # שמור ב-guests.custom_fields (השמה של dict חדש - כדי שהשינוי יזוהה ויישמר)
+        guest.custom_fields = {**(guest.custom_fields or {}), str(value.custom_field_id): value.value}
+        db.commit()
+        db.refresh(guest)
         return InlineFieldValue(value.guest_id, value.custom_field_id, value.value)
     else:
         # שמור ב-guest_field_values
@@ -836,7 +1064,34 @@ def create_field_value(db: Session, value: schemas.FieldValueCreate):
             return db_value
 
 def get_field_values_for_guest(db: Session, guest_id: int):
-    return db.query(models.GuestFieldValue).filter(models.GuestFieldValue.guest_id == guest_id).all()
+    """
+    מחזיר את כל ערכי השדות של המוזמן - מאותם מקומות ש-create_field_value שומר בהם:
+    15 הראשונים מעמודות custom_field_N, והשאר מ-guest_field_values (או guests.custom_fields במצב jsonb).
+    """
+    guest = get_guest_by_id(db, guest_id)
+    if not guest:
+        return []
+
+    all_fields = db.query(models.GuestCustomField).filter(models.GuestCustomField.event_id == guest.event_id).all()
+
+    def get_order_index(field):
+        _, order_index, _, _ = decode_prefixed_name(field.name)
+        return (order_index if order_index is not None else 0, field.id)
+
+    result = []
+    for index, field in enumerate(sorted(all_fields, key=get_order_index)[:MAX_INLINE_FIELDS], start=1):
+        value = getattr(guest, f"custom_field_{index}")
+        if value is not None:
+            result.append(InlineFieldValue(guest_id, field.id, value))
+
+    if uses_jsonb_field_storage():
+        result.extend(
+            InlineFieldValue(guest_id, int(field_id), value)
+            for field_id, value in (guest.custom_fields or {}).items()
+        )
+    else:
+        result.extend(db.query(models.GuestFieldValue).filter(models.GuestFieldValue.guest_id == guest_id).all())
+    return result
 
 def update_guest(db: Session, guest_id: int, guest: schemas.GuestUpdate, user_id: int):
     db_guest = db.query(models.Guest).filter(models.Guest.id == guest_id).first()
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.core.database import SessionLocal
+from app.core.database import get_db
 from app.guests import schemas, repository, models
+from app.guests import export as guest_export
+from app.guests import seating_image
 from app.guests.utils import decode_prefixed_name, encode_prefixed_name
-from app.seatings import models as seating_models
+from app.seatings import seating_map as seating_map_service
 from app.tables import models as table_models
-from typing import Optional
+from typing import List, Optional
 from fastapi.responses import StreamingResponse
-import pandas as pd
 import io
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
@@ -21,13 +22,6 @@ from app.permissions.utils import check_event_permission
 
 router = APIRouter(prefix="/guests", tags=["Guests"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Create guest
 @router.post("/", response_model=schemas.GuestOut)
 def create_guest(guest: schemas.GuestCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
@@ -127,11 +121,13 @@ def add_field_value(event_id: int, guest_id: int, value: schemas.FieldValueInput
         if not field:
             raise HTTPException(status_code=404, detail="Custom field not found")
     
-    # בדיקה אם יש ערך קיים
-    existing_value = db.query(models.GuestFieldValue).filter(
-        models.GuestFieldValue.guest_id == guest_id,
-        models.GuestFieldValue.custom_field_id == field.id
-    ).first()
+    # בדיקה אם יש ערך קיים (במצב jsonb הערכים לא נשמרים ב-guest_field_values)
+    existing_value = None
+    if not repository.uses_jsonb_field_storage():
+        existing_value = db.query(models.GuestFieldValue).filter(
+            models.GuestFieldValue.guest_id == guest_id,
+            models.GuestFieldValue.custom_field_id == field.id
+        ).first()
     
     if existing_value:
         # עדכון ערך קיים
@@ -166,7 +162,6 @@ def get_guest_by_id_number(event_id: int, id_number: str, db: Session = Depends(
 
     guest = (
         db.query(models.Guest)
-        .options(joinedload(models.Guest.field_values).joinedload(models.GuestFieldValue.custom_field))
         .filter(models.Guest.event_id == event_id)
         .all()
     )
@@ -181,9 +176,17 @@ def get_guest_by_id_number(event_id: int, id_number: str, db: Session = Depends(
     if not guest:
         raise HTTPException(status_code=404, detail="תקלה בשליפת נתוני הלקוח. אנא הירשם למערכת.")
 
+    # ערכי השדות דרך ה-repository - לפי GUEST_FIELDS_STORAGE
+    custom_fields = {
+        f.id: f for f in db.query(models.GuestCustomField).filter(models.GuestCustomField.event_id == event_id)
+    }
+    field_values = [
+        (custom_fields.get(fv.custom_field_id), fv.value)
+        for fv in repository.get_field_values_for_guest(db, guest.id)
+    ]
+
     fields: dict[str, Optional[str]] = {}
-    for field_value in guest.field_values:
-        custom_field = field_value.custom_field
+    for custom_field, field_value in field_values:
         if custom_field and custom_field.name:
             label = custom_field.name
             try:
@@ -192,7 +195,7 @@ def get_guest_by_id_number(event_id: int, id_number: str, db: Session = Depends(
                     label = f"{decoded_label} *" if required_flag and not decoded_label.endswith(" *") else decoded_label
             except Exception:
                 pass
-            fields[label] = field_value.value
+            fields[label] = field_value
 
     return schemas.GuestWithFields(
         guest=schemas.GuestOut.model_validate(guest),
@@ -228,161 +231,28 @@ def export_guests_to_excel(
     name: Optional[str] = None,
     gender: Optional[str] = None,
     confirmed_only: Optional[bool] = None,
+    format: str = Query("xlsx", pattern="^(xlsx|csv)$", description="xlsx או csv (csv נשלח תוך כדי קריאה)"),
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Guest).options(
-        joinedload(models.Guest.field_values).joinedload(models.GuestFieldValue.custom_field)
+    """ייצוא המוזמנים - הזיכרון לא תלוי במספר המוזמנים (ראו app/guests/export.py)"""
+    # הכותרות והשאילתה נבנים כאן - שגיאה בהם מחזירה 500 לפני שנשלח בייט
+    export = guest_export.GuestExport(
+        db, event_id=event_id, name=name, gender=gender, confirmed_only=confirmed_only
     )
-    
-    # פילטרים
-    if event_id:
-        query = query.filter(models.Guest.event_id == event_id)
-    if name:
-        query = query.filter(models.Guest.first_name.ilike(f"%{name}%"))
-    if gender:
-        query = query.filter(models.Guest.gender == gender)
-    if confirmed_only is not None:
-        query = query.filter(models.Guest.confirmed_arrival == confirmed_only)
-
-    guests = query.all()
-
-    data = []
-    for g in guests:
-        row = {
-            # פרטים בסיסיים
-            "מזהה": g.id,
-            "אירוע": g.event_id,
-            "שם פרטי": g.first_name or "",
-            "שם אמצעי": g.middle_name or "",
-            "שם משפחה": g.last_name or "",
-            "תואר לפני": g.title_before or "",
-            "תואר אחרי": g.title_after or "",
-            "תואר בן זוג": g.spouse_name or "",
-            "שם אישה": g.wife_name or "",
-            "תעודת זהות": g.id_number or "",
-            "מין": g.gender or "",
-            "גיל": g.age or "",
-            "תאריך לידה": str(g.birth_date) if g.birth_date else "",
-            "שפה": g.language or "",
-            
-            # פרטי קשר
-            "טלפון נייד": g.mobile_phone or "",
-            "טלפון בית": g.home_phone or "",
-            "טלפון נוסף 1": g.alt_phone_1 or "",
-            "טלפון נוסף 2": g.alt_phone_2 or "",
-            "טלפון אשה": g.wife_phone or "",
-            "מייל": g.email or "",
-            "מייל 2": g.email_2 or "",
-            
-            # כתובת
-            "רחוב": g.street or "",
-            "מספר בניין": g.building_number or "",
-            "מספר דירה": g.apartment_number or "",
-            "עיר": g.city or "",
-            "שכונה": g.neighborhood or "",
-            "מיקוד": g.postal_code or "",
-            "מדינה": g.country or "",
-            "ארץ": g.state or "",
-            "כתובת למשלוח": g.mailing_address or "",
-            "שם לקבלה": g.recipient_name or "",
-            
-            # מזהים
-            "מספר חשבון": g.account_number or "",
-            "מספר אישי מניג'ר": g.manager_personal_number or "",
-            "Card ID": g.card_id or "",
-            
-            # שיוך וניהול
-            "קבוצה": g.groups or "",
-            "קבוצה מייל": g.email_group or "",
-            "קישור למשתמש": g.user_link or "",
-            "מזהה שגריר": g.ambassador_id or "",
-            "שגריר": g.ambassador or "",
-            "שיוך לטלפנית": g.telephonist_assignment or "",
-            "בית כנסת": g.synagogue or "",
-            
-            # טלפניות ושיחות
-            "סטטוס זכאות ללידים": g.eligibility_status_for_leads or "",
-            "ביקש לחזור בתאריך": str(g.requested_return_date) if g.requested_return_date else "",
-            "שיחה אחרונה עם טלפנית": str(g.last_telephonist_call) if g.last_telephonist_call else "",
-            "סטטוס שיחה אחרונה": g.last_call_status or "",
-            "הערות": g.notes or "",
-            "הערות טלפניות": g.telephonist_notes or "",
-            "תאור סטטוס": g.status_description or "",
-            
-            # בנקים ותשלומים
-            "שם בנק": g.bank or "",
-            "סניף": g.branch or "",
-            "מספר כרטיס אשראי": g.credit_card_number or "",
-            
-            # תרומות
-            "הוק פעיל": "כן" if g.is_hok_active else "לא",
-            "סכום הוק חודשי": g.monthly_hok_amount_nis or "",
-            "סכום תשלום אחרון": g.last_payment_amount or "",
-            "תרומות בשנה האחרונה": g.donations_payments_last_year or "",
-            "סהכ תרומות": g.total_donations_payments or "",
-            "התחייבות לתרומה": g.donation_commitment or "",
-            "יכולת תרומה": g.donation_ability or "",
-            
-            # אירועים ודינרים
-            "דינרים משתתפים": g.dinners_participated or "",
-            "סטטוס חסות/ברכה": g.sponsorship_blessing_status or "",
-            "תוכן הברכה דינר קודם": g.blessing_content_dinner_2024 or "",
-            
-            # הושבות גברים
-            "הושבה גברים קודמת": g.men_seating_feb or "",
-            "הושבה זמני גברים": g.men_temporary_seating_feb or "",
-            "מספר שולחן גברים": g.men_table_number or "",
-            "ליד מי תרצו לשבת": g.seat_near_main or "",
-            
-            # הושבות נשים
-            "הושבה נשים קודמת": g.women_seating_feb or "",
-            "הושבה זמני נשים": g.women_temporary_seating_feb or "",
-            "מספר שולחן נשים": g.women_table_number or "",
-            "השתתפות נשים": g.women_participation_dinner_feb or "",
-            
-            # סטטוס
-            "אישור הגעה": "כן" if g.confirmed_arrival else "לא",
-            "קוד QR": g.qr_code or "",
-            "זמן צ'ק-אין": str(g.check_in_time) if g.check_in_time else "",
-            "זמן צ'ק-אאוט": str(g.check_out_time) if g.check_out_time else "",
-            "Overbooked": "כן" if g.is_overbooked else "לא",
-            "זמן סריקה אחרון": str(g.last_scan_time) if g.last_scan_time else "",
-            
-            # שדות דינמיים
-            "שדה מותאם 1": g.custom_field_1 or "",
-            "שדה מותאם 2": g.custom_field_2 or "",
-            "שדה מותאם 3": g.custom_field_3 or "",
-            "שדה מותאם 4": g.custom_field_4 or "",
-            "שדה מותאם 5": g.custom_field_5 or "",
-            "שדה מותאם 6": g.custom_field_6 or "",
-            "שדה מותאם 7": g.custom_field_7 or "",
-            "שדה מותאם 8": g.custom_field_8 or "",
-            "שדה מותאם 9": g.custom_field_9 or "",
-            "שדה מותאם 10": g.custom_field_10 or "",
-            "שדה מותאם 11": g.custom_field_11 or "",
-            "שדה מותאם 12": g.custom_field_12 or "",
-            "שדה מותאם 13": g.custom_field_13 or "",
-            "שדה מותאם 14": g.custom_field_14 or "",
-            "שדה מותאם 15": g.custom_field_15 or "",
-        }
-        
-        # הוספת שדות מותאמים אישית מהטבלה הנפרדת
-        if g.field_values:
-            for fv in g.field_values:
-                if fv.custom_field and fv.custom_field.name:
-                    row[fv.custom_field.name] = fv.value or ""
-        
-        data.append(row)
-
-    df = pd.DataFrame(data)
-    stream = io.BytesIO()
-    df.to_excel(stream, index=False, engine="openpyxl")
-    stream.seek(0)
-
+    if format == "csv":
+        return StreamingResponse(
+            guest_export.iter_csv(export),
+            media_type=guest_export.CSV_MEDIA_TYPE,
+            headers={"Content-Disposition": "attachment; filename=guests_full.csv"}
+        )
+    xlsx_file = guest_export.render_xlsx_file(export)
     return StreamingResponse(
-        stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=guests_full.xlsx"}
+        seating_map_service.iter_file_chunks(xlsx_file, guest_export.FILE_CHUNK_BYTES),
+        media_type=guest_export.XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": "attachment; filename=guests_full.xlsx",
+            "Content-Length": str(xlsx_file.tell()),
+        }
     )
 
 @router.get("/export-pdf")
@@ -475,171 +345,37 @@ def export_seating_image(
     show_occupied_seats: Optional[bool] = True,
     only_empty_tables: Optional[bool] = False,
     only_available_tables: Optional[bool] = False,
+    format: str = Query("png", pattern="^(png|svg)$", description="png או svg (וקטורי - לאולמות עם מאות שולחנות)"),
     db: Session = Depends(get_db)
 ):
     """
     ייצוא תמונה של מפת הישיבה עם פילטרים
     """
-    # קביעת סוג אולם לפי מגדר (אם נשלח): גברים -> 'm', נשים -> 'w'
-    hall_type_filter = None
+    media_type = "image/svg+xml" if format == "svg" else "image/png"
+    headers = {"Content-Disposition": f"attachment; filename=seating-map-{event_id}.{format}"}
+
+    # בדיקה אם יש מוזמנים
+    guests_query = db.query(models.Guest.id).filter(models.Guest.event_id == event_id)
     if gender:
-        try:
-            g = gender.lower()
-            if g == 'male':
-                hall_type_filter = 'm'
-            elif g == 'female':
-                hall_type_filter = 'w'
-        except Exception:
-            hall_type_filter = None
-
-    # שליפת שולחנות לאירוע (ולפי סוג אולם אם צוין)
+        guests_query = guests_query.filter(models.Guest.gender == gender)
+    if guests_query.first() is None:
+        image = seating_image.render_message(f"No guests found for event {event_id}", format)
+        return StreamingResponse(io.BytesIO(image), media_type=media_type, headers=headers)
+
+    # שליפת שולחנות לאירוע (ולפי סוג אולם אם צוין) ותפוסה לכל שולחן בשאילתה אחת
     tables_query = db.query(table_models.Table).filter(table_models.Table.event_id == event_id)
+    hall_type_filter = seating_image.hall_type_for_gender(gender)
     if hall_type_filter:
         tables_query = tables_query.filter(table_models.Table.hall_type == hall_type_filter)
     tables = tables_query.all()
-    
-    # שליפת מוזמנים לאירוע
-    guests_query = db.query(models.Guest).filter(models.Guest.event_id == event_id)
-    if gender:
-        guests_query = guests_query.filter(models.Guest.gender == gender)
-    guests = guests_query.all()
-    
-    # שליפת מקומות ישיבה - מוגבלים לשולחנות שנבחרו
-    table_ids = [t.id for t in tables]
-    seatings = []
-    if table_ids:
-        seatings = db.query(seating_models.Seating).filter(
-            seating_models.Seating.event_id == event_id,
-            seating_models.Seating.table_id.in_(table_ids)
-        ).all()
-    
-    # Debug info
-    print(f"Found {len(tables)} tables for event {event_id}")
-    print(f"Found {len(guests)} guests for event {event_id}")
-    print(f"Found {len(seatings)} seatings for event {event_id}")
-    
-    # בדיקה אם יש מוזמנים
-    if len(guests) == 0:
-        # אם אין מוזמנים, נציג הודעה
-        img_width = 800
-        img_height = 400
-        img = Image.new('RGB', (img_width, img_height), color='white')
-        draw = ImageDraw.Draw(img)
-        
-        draw.text((img_width//2, img_height//2), f"No guests found for event {event_id}", 
-                 fill='red', anchor='mm')
-        
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        return StreamingResponse(
-            buffer,
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename=seating-map-{event_id}.png"}
-        )
-    
-    # יצירת תמונה
-    from PIL import Image, ImageDraw, ImageFont
-    import os
-    
-    # גודל התמונה
-    img_width = 1800
-    img_height = 1200
-    img = Image.new('RGB', (img_width, img_height), color='white')
-    draw = ImageDraw.Draw(img)
-    
-    # ניסיון לטעון פונט גדול יותר
-    try:
-        # ניסיון לטעון פונט מערכת
-        font = ImageFont.truetype("arial.ttf", 16)
-        title_font = ImageFont.truetype("arial.ttf", 20)
-    except:
-        # אם לא מצליח, נשתמש בפונט ברירת מחדל
-        font = ImageFont.load_default()
-        title_font = ImageFont.load_default()
-    
-    # כותרת
-    title = f"Seating Map - Event {event_id}"
-    if gender:
-        title += f" ({gender})"
-    draw.text((img_width//2, 50), title, fill='black', anchor='mm', font=title_font)
-    
-    # קנה מידה לפי x,y אם קיימים
-    margin_x = 120
-    margin_y = 160
-    default_table_size = 110
-    has_positions = any(t.x is not None and t.y is not None for t in tables)
-
-    if has_positions:
-        xs = [t.x for t in tables if t.x is not None]
-        ys = [t.y for t in tables if t.y is not None]
-        min_x, max_x = min(xs), max(xs)
-        min_y, max_y = min(ys), max(ys)
-        span_x = max(1.0, max_x - min_x)
-        span_y = max(1.0, max_y - min_y)
-        scale_x = (img_width - 2 * margin_x) / span_x
-        scale_y = (img_height - 2 * margin_y) / span_y
-        scale = min(scale_x, scale_y)
-    
-    for i, table in enumerate(tables):
-        # מיקום
-        if has_positions and table.x is not None and table.y is not None:
-            x = margin_x + (table.x - min_x) * scale
-            y = margin_y + (table.y - min_y) * scale
-        else:
-            # פריסה רשתית אם אין קואורדינטות
-            row = i // 6
-            col = i % 6
-            x = margin_x + col * (default_table_size + 140)
-            y = margin_y + row * (default_table_size + 120)
-
-        size = default_table_size
-        # חישוב תפוסה לפני ציור כדי שנוכל לפלטר שולחנות
-        table_seatings = [s for s in seatings if s.table_id == table.id]
-        occupied = 0
-        for seating in table_seatings:
-            guest = db.query(models.Guest).filter(models.Guest.id == seating.guest_id).first()
-            if guest and (gender is None or guest.gender == gender):
-                occupied += 1
-        capacity = getattr(table, 'size', len(table_seatings) or 0)
-        empty = max(0, capacity - occupied)
-
-        # סינון: רק שולחנות ריקים (אפס תפוסים)
-        if only_empty_tables and occupied > 0:
-            continue
-        # סינון: רק שולחנות עם מקומות פנויים (לא מלאים)
-        if only_available_tables and empty == 0:
-            continue
+    occupancy = seating_image.table_occupancy(db, event_id, [t.id for t in tables], gender)
 
-        # ציור שולחן לפי צורה (אחרי הסינון)
-        if getattr(table, 'shape', 'circular') == 'rectangular':
-            w = size * 1.4
-            h = size * 0.8
-            draw.rectangle([x - w/2, y - h/2, x + w/2, y + h/2], outline='blue', width=3)
-  
-        else:
-            draw.ellipse([x - size/2, y - size/2, x + size/2, y + size/2], outline='blue', width=3)
-
-        # מספר שולחן
-        draw.text((x, y), f"Table {table.table_number}", fill='blue', anchor='mm')
-
-        # טקסט סטטיסטי ליד השולחן
-        info = f"{occupied}/{capacity}"
-        draw.text((x, y + size/2 + 16), info, fill='darkgreen', anchor='mm', font=font)
-        if show_empty_seats:
-            draw.text((x, y + size/2 + 34), f"Empty: {empty}", fill='red', anchor='mm', font=font)
-    
-    # שמירת התמונה
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
-        media_type="image/png",
-        headers={"Content-Disposition": f"attachment; filename=seating-map-{event_id}.png"}
+    placements, width, height = seating_image.layout(
+        tables, occupancy, only_empty_tables=bool(only_empty_tables), only_available_tables=bool(only_available_tables)
     )
+    render = seating_image.render_svg if format == "svg" else seating_image.render_png
+    image = render(placements, width, height, event_id, gender, show_empty_seats=bool(show_empty_seats))
+    return StreamingResponse(io.BytesIO(image), media_type=media_type, headers=headers)
 
 @router.get("/event/{event_id}/with-fields")
 def get_guests_with_fields(
@@ -650,6 +386,43 @@ def get_guests_with_fields(
 ):
     return repository.get_guests_with_fields(db, event_id, limit=limit, offset=offset)
 
+@router.get("/event/{event_id}/grid", response_model=schemas.GuestGridPage)
+def get_guests_grid(
+    event_id: int,
+    columns: str = Query("first_name,last_name", description="עמודות מופרדות בפסיק: שמות עמודות בטבלת guests או field:<custom_field_id>"),
+    sort: str = Query("id"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(repository.GRID_DEFAULT_LIMIT, ge=1, le=repository.GRID_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor מהעמוד הקודם"),
+    filter: Optional[List[str]] = Query(None, description="column:value - מחרוזות לפי הכלה, שאר הסוגים לפי שוויון; column:=value - התאמה מדויקת"),
+    search: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user),
+):
+    """עמוד של טבלת המוזמנים - keyset pagination עם בחירת עמודות, מיון וסינון ב-SQL"""
+    filters = []
+    for raw in filter or []:
+        if raw.startswith(repository.GRID_FIELD_PREFIX):
+            field_id, _, value = raw[len(repository.GRID_FIELD_PREFIX):].partition(":")
+            key = repository.GRID_FIELD_PREFIX + field_id
+        else:
+            key, _, value = raw.partition(":")
+        filters.append((key.strip(), value))
+    try:
+        return repository.get_guests_grid(
+            db,
+            event_id,
+            [c.strip() for c in columns.split(",") if c.strip()],
+            sort=sort,
+            descending=order == "desc",
+            limit=limit,
+            cursor=cursor,
+            filters=filters,
+            search=search,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/event/{event_id}/count")
 def get_guests_count(event_id: int, db: Session = Depends(get_db)):
     """מחזיר את מספר המוזמנים הכולל לאירוע"""
@@ -283,6 +283,12 @@ class GuestWithFields(BaseModel):
     fields: Dict[str, Optional[str]] = {}
 
 
+class GuestGridPage(BaseModel):
+    columns: List[str]
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
 
 # ---------- Custom Fields ----------
 class CustomFieldBase(BaseModel):
@@ -310,7 +316,8 @@ class FieldValueBase(BaseModel):
 
 
 class FieldValueOut(FieldValueBase):
-    id: int
+    # None לערכים שלא שמורים כשורה ב-guest_field_values (עמודת custom_field_N או JSONB)
+    id: Optional[int] = None
 
     class Config:
         from_attributes = True
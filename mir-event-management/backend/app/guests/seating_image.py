@@ -0,0 +1,223 @@
+"""
+רינדור תמונת מפת ישיבה (GET /guests/export-seating-image).
+
+התפוסה של כל השולחנות מחושבת בשאילתת aggregate אחת (table_id, מגדר), הפונטים נטענים
+פעם אחת לתהליך, והפריסה מחושבת פעם אחת ומשמשת גם ל-PNG וגם ל-SVG.
+באולם בלי קואורדינטות השולחנות נפרסים ברשת והקנבס גדל לפי מספר השורות, כך שגם
+מאות שולחנות נכנסים לתמונה; SVG מתאים לאולמות גדולים (וקטורי, בלי הגבלת רזולוציה).
+"""
+import io
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.guests import models
+from app.seatings import models as seating_models
+from app.tables import models as table_models
+
+IMG_WIDTH = 1800
+IMG_HEIGHT = 1200
+MARGIN_X = 120
+MARGIN_Y = 160
+TABLE_SIZE = 110
+GRID_COLUMNS = 6
+GRID_STEP_X = TABLE_SIZE + 140
+GRID_STEP_Y = TABLE_SIZE + 120
+
+
+@dataclass
+class TablePlacement:
+    table_number: int
+    shape: str
+    x: float
+    y: float
+    occupied: int
+    capacity: int
+
+    @property
+    def empty(self) -> int:
+        return max(0, self.capacity - self.occupied)
+
+
+@lru_cache(maxsize=1)
+def _fonts() -> Tuple[ImageFont.ImageFont, ImageFont.ImageFont]:
+    """(font, title_font) - נטענים פעם אחת"""
+    try:
+        return ImageFont.truetype("arial.ttf", 16), ImageFont.truetype("arial.ttf", 20)
+    except OSError:
+        default = ImageFont.load_default()
+        return default, default
+
+
+def hall_type_for_gender(gender: Optional[str]) -> Optional[str]:
+    """סוג אולם לפי מגדר: גברים -> 'm', נשים -> 'w'"""
+    if not gender:
+        return None
+    return {"male": "m", "female": "w"}.get(gender.lower())
+
+
+def table_occupancy(db: Session, event_id: int, table_ids: List[int], gender: Optional[str]) -> Dict[int, int]:
+    """table_id -> מספר המושבים התפוסים (ע"י מוזמן קיים, ובמגדר המבוקש אם צוין) - שאילתה אחת"""
+    if not table_ids:
+        return {}
+    rows = (
+        db.query(seating_models.Seating.table_id, models.Guest.gender, func.count(seating_models.Seating.id))
+        .join(models.Guest, models.Guest.id == seating_models.Seating.guest_id)
+        .filter(
+            seating_models.Seating.event_id == event_id,
+            seating_models.Seating.table_id.in_(table_ids),
+        )
+        .group_by(seating_models.Seating.table_id, models.Guest.gender)
+        .all()
+    )
+    occupancy: Dict[int, int] = {}
+    for table_id, guest_gender, count in rows:
+        if gender is None or guest_gender == gender:
+            occupancy[table_id] = occupancy.get(table_id, 0) + count
+    return occupancy
+
+
+def layout(
+    tables: List[table_models.Table],
+    occupancy: Dict[int, int],
+    only_empty_tables: bool = False,
+    only_available_tables: bool = False,
+) -> Tuple[List[TablePlacement], int, int]:
+    """מיקום השולחנות על הקנבס אחרי הסינון. מחזיר (placements, width, height)"""
+    has_positions = any(t.x is not None and t.y is not None for t in tables)
+    height = IMG_HEIGHT
+    if has_positions:
+        xs = [t.x for t in tables if t.x is not None]
+        ys = [t.y for t in tables if t.y is not None]
+        min_x, min_y = min(xs), min(ys)
+        span_x = max(1.0, max(xs) - min_x)
+        span_y = max(1.0, max(ys) - min_y)
+        scale = min((IMG_WIDTH - 2 * MARGIN_X) / span_x, (IMG_HEIGHT - 2 * MARGIN_Y) / span_y)
+    else:
+        rows = (len(tables) + GRID_COLUMNS - 1) // GRID_COLUMNS
+        height = max(IMG_HEIGHT, MARGIN_Y + rows * GRID_STEP_Y + MARGIN_Y // 2)
+
+    placements = []
+    for i, table in enumerate(tables):
+        if has_positions and table.x is not None and table.y is not None:
+            x = MARGIN_X + (table.x - min_x) * scale
+            y = MARGIN_Y + (table.y - min_y) * scale
+        else:
+            # פריסה רשתית אם אין קואורדינטות
+            x = MARGIN_X + (i % GRID_COLUMNS) * GRID_STEP_X
+            y = MARGIN_Y + (i // GRID_COLUMNS) * GRID_STEP_Y
+
+        placement = TablePlacement(
+            table_number=table.table_number,
+            shape=table.shape or "circular",
+            x=x,
+            y=y,
+            occupied=occupancy.get(table.id, 0),
+            capacity=table.size or 0,
+        )
+        # סינון: רק שולחנות ריקים (אפס תפוסים)
+        if only_empty_tables and placement.occupied > 0:
+            continue
+        # סינון: רק שולחנות עם מקומות פנויים (לא מלאים)
+        if only_available_tables and placement.empty == 0:
+            continue
+        placements.append(placement)
+    return placements, IMG_WIDTH, height
+
+
+def _title(event_id: int, gender: Optional[str]) -> str:
+    title = f"Seating Map - Event {event_id}"
+    if gender:
+        title += f" ({gender})"
+    return title
+
+
+def render_png(
+    placements: List[TablePlacement],
+    width: int,
+    height: int,
+    event_id: int,
+    gender: Optional[str],
+    show_empty_seats: bool = True,
+) -> bytes:
+    font, title_font = _fonts()
+    img = Image.new("RGB", (width, height), color="white")
+    draw = ImageDraw.Draw(img)
+    draw.text((width // 2, 50), _title(event_id, gender), fill="black", anchor="mm", font=title_font)
+
+    size = TABLE_SIZE
+    for p in placements:
+        if p.shape == "rectangular":
+            w, h = size * 1.4, size * 0.8
+            draw.rectangle([p.x - w / 2, p.y - h / 2, p.x + w / 2, p.y + h / 2], outline="blue", width=3)
+        else:
+            draw.ellipse([p.x - size / 2, p.y - size / 2, p.x + size / 2, p.y + size / 2], outline="blue", width=3)
+        draw.text((p.x, p.y), f"Table {p.table_number}", fill="blue", anchor="mm")
+        draw.text((p.x, p.y + size / 2 + 16), f"{p.occupied}/{p.capacity}", fill="darkgreen", anchor="mm", font=font)
+        if show_empty_seats:
+            draw.text((p.x, p.y + size / 2 + 34), f"Empty: {p.empty}", fill="red", anchor="mm", font=font)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_svg(
+    placements: List[TablePlacement],
+    width: int,
+    height: int,
+    event_id: int,
+    gender: Optional[str],
+    show_empty_seats: bool = True,
+) -> bytes:
+    size = TABLE_SIZE
+    text_attrs = 'text-anchor="middle" dominant-baseline="central" font-family="Arial, sans-serif"'
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<text x="{width // 2}" y="50" {text_attrs} font-size="20">{escape(_title(event_id, gender))}</text>',
+    ]
+    for p in placements:
+        if p.shape == "rectangular":
+            w, h = size * 1.4, size * 0.8
+            parts.append(
+                f'<rect x="{p.x - w / 2:.1f}" y="{p.y - h / 2:.1f}" width="{w:.1f}" height="{h:.1f}" '
+                f'fill="none" stroke="blue" stroke-width="3"/>'
+            )
+        else:
+            parts.append(
+                f'<circle cx="{p.x:.1f}" cy="{p.y:.1f}" r="{size / 2:.1f}" fill="none" stroke="blue" stroke-width="3"/>'
+            )
+        parts.append(f'<text x="{p.x:.1f}" y="{p.y:.1f}" {text_attrs} font-size="12" fill="blue">Table {p.table_number}</text>')
+        parts.append(
+            f'<text x="{p.x:.1f}" y="{p.y + size / 2 + 16:.1f}" {text_attrs} font-size="16" fill="darkgreen">'
+            f'{p.occupied}/{p.capacity}</text>'
+        )
+        if show_empty_seats:
+            parts.append(
+                f'<text x="{p.x:.1f}" y="{p.y + size / 2 + 34:.1f}" {text_attrs} font-size="16" fill="red">'
+                f'Empty: {p.empty}</text>'
+            )
+    parts.append("</svg>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def render_message(message: str, image_format: str = "png", width: int = 800, height: int = 400) -> bytes:
+    """תמונה עם הודעה בלבד (למשל כשאין מוזמנים)"""
+    if image_format == "svg":
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">'
+            f'<rect width="{width}" height="{height}" fill="white"/>'
+            f'<text x="{width // 2}" y="{height // 2}" text-anchor="middle" dominant-baseline="central" '
+            f'font-family="Arial, sans-serif" fill="red">{escape(message)}</text></svg>'
+        ).encode("utf-8")
+    img = Image.new("RGB", (width, height), color="white")
+    ImageDraw.Draw(img).text((width // 2, height // 2), message, fill="red", anchor="mm")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -0,0 +1,482 @@
+"""
+מסלול ייבוא מהיר ל-PostgreSQL (mode="bulk").
+כל באץ' נטען ב-COPY לטבלת staging זמנית ומשם ב-INSERT ... ON CONFLICT (event_id, id_number)
+DO UPDATE לטבלת guests, וערכי השדות הדינמיים נטענים באותה צורה ל-guest_field_values
+(או ממוזגים ל-guests.custom_fields במצב GUEST_FIELDS_STORAGE=jsonb).
+ההתאמה לשורות ללא ת"ז (שם + טלפון/אימייל) נעשית מול GuestMatchIndex של הג'וב, ומול שאר
+שורות הקובץ לפי ה-id_number שנקבע להן בשלב התכנון.
+"""
+import io
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import UniqueConstraint, text
+
+from app.guests import models as guest_models
+from app.guests import repository as guests_repo
+from app.imports import service
+from app.imports.matching import GuestMatchIndex
+from app.seatings import snapshot as seating_snapshot
+
+GUEST_STAGE_TABLE = "import_stage_guests"
+MERGED_STAGE_TABLE = "import_stage_guests_merged"
+FIELD_VALUE_STAGE_TABLE = "import_stage_field_values"
+
+DEFAULT_FIRST_NAME = "ללא שם"
+DEFAULT_LAST_NAME = "ללא שם משפחה"
+VALID_GENDERS = ["male", "female", "זכר", "נקבה", "גבר", "אשה"]
+MAX_DYNAMIC_FIELDS = 15
+
+# עמודות שלא נטענות מהקובץ
+_SKIP_COLUMNS = {"id", "event_id"}
+# השדות שלפיהם שורות מותאמות (GuestMatchIndex)
+_MATCH_FIELDS = ("first_name", "last_name", "mobile_phone", "home_phone", "alt_phone_1", "alt_phone_2", "email")
+
+
+def is_supported(db) -> bool:
+    dialect = db.bind.dialect.name if db.bind else ""
+    return dialect in ("postgresql", "postgres")
+
+
+def _copy_value(value: Any) -> str:
+    """המרת ערך לפורמט הטקסט של COPY"""
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_rows(db, table: str, columns: List[str], rows: List[tuple]) -> None:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(v) for v in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        cursor.copy_expert(f"COPY {table} ({column_list}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def _error_row(row: Dict[str, Any], message: str, global_row_index: int) -> Dict[str, Any]:
+    return {
+        # מספר שורת הנתונים בקובץ (1 = השורה הראשונה אחרי הכותרות, בלי שורות ריקות)
+        "row_number": global_row_index + 1,
+        "first_name": row.get("שם", row.get("first_name", row.get("שם פרטי", ""))),
+        "last_name": row.get("שם משפחה", row.get("last_name", "")),
+        "error": message,
+    }
+
+
+def _match_guest(values: Dict[str, Any], id_number: Optional[str] = None) -> guest_models.Guest:
+    """מוזמן זמני עם שדות ההתאמה של השורה - לא נכנס ל-session"""
+    return guest_models.Guest(id_number=id_number, **{f: values.get(f) for f in _MATCH_FIELDS})
+
+
+def _resolve_id_number(
+    id_number_raw: Optional[str],
+    values: Dict[str, Any],
+    match_index: GuestMatchIndex,
+    batch_index: GuestMatchIndex,
+    event_id: int,
+    job_id: int,
+    global_row_index: int,
+    resolved_id: Optional[str] = None,
+) -> str:
+    """
+    מחזיר את ה-id_number שלפיו השורה תיכנס/תתעדכן (מפתח ה-ON CONFLICT). ההתאמה נעשית מול
+    מוזמני האירוע (match_index) ואז מול השורות הקודמות בבאץ' (batch_index): ת"ז קיימת, שם +
+    טלפון/אימייל, ת"ז מנורמלת חדשה. לשורה בלי ת"ז - בדיקת הכפילות של מסלול ה-ORM
+    (find_duplicate), ה-id_number שנקבע לשורה בשלב התכנון (resolved_id) או TEMP ID.
+    """
+    id_number_norm, _ = service._id_number_norm(id_number_raw)
+    indexes = (match_index, batch_index)
+
+    if id_number_norm:
+        for index in indexes:
+            existing = index.by_id(id_number_norm, id_number_raw)
+            if existing is not None:
+                return existing.id_number
+
+    phone = (values.get("mobile_phone") or values.get("home_phone") or "").strip()
+    for index in indexes:
+        existing = index.by_name_and_contact(
+            values.get("first_name"), values.get("last_name"), phone, values.get("email")
+        )
+        if existing is not None and existing.id_number:
+            return existing.id_number
+
+    if id_number_norm:
+        return id_number_norm
+
+    candidate = _match_guest(values)
+    for index in indexes:
+        existing = index.find_duplicate(candidate)
+        if existing is not None and existing.id_number:
+            return existing.id_number
+    return resolved_id or f"TEMP-{event_id}-{job_id}-{global_row_index}"
+
+
+def _add_pending(
+    batch_index: GuestMatchIndex,
+    pending: Dict[str, guest_models.Guest],
+    id_number: str,
+    values: Dict[str, Any],
+) -> None:
+    """
+    רושם שורה שנקבע לה id_number באינדקס של הבאץ', כך ששורה מאוחרת באותו באץ' תתמזג אליה
+    (כמו המוזמנים החדשים שנכנסים לאינדקס במסלול ה-ORM). לכל id_number מוזמן זמני אחד,
+    שמקבל את הערכים הלא ריקים של כל השורות שלו; הם לא נכנסים ל-session ולא לאינדקס של הג'וב
+    """
+    guest = pending.get(id_number)
+    if guest is None:
+        guest = pending[id_number] = _match_guest(values, id_number)
+    else:
+        for field in _MATCH_FIELDS:
+            if values.get(field):
+                setattr(guest, field, values[field])
+    batch_index.add(guest)
+
+
+def _map_row(row: tuple, plan: service.ColumnPlan) -> Tuple[Dict[str, Any], List[Tuple[str, str]]]:
+    """מפצל שורה לערכי עמודות בטבלת guests ולערכי שדות דינמיים"""
+    values: Dict[str, Any] = {}
+    for col_idx, db_field_name, convert in plan.base_columns:
+        if db_field_name in _SKIP_COLUMNS or db_field_name == "id_number":
+            continue
+        converted_val = convert(row[col_idx])
+        if isinstance(converted_val, str) and "\x00" in converted_val:
+            # COPY לא מקבל תו NUL - שגיאה לשורה הזו בלבד
+            raise ValueError(f"{db_field_name}: value contains a NUL character")
+        # ערך ריק לא דורס (כמו במסלול ה-ORM) - גם לא ערך משורה קודמת עם אותה ת"ז
+        if converted_val is not None and not (isinstance(converted_val, str) and not converted_val.strip()):
+            values[db_field_name] = converted_val
+    dynamic: List[Tuple[str, str]] = []
+    for col_idx, field_name in plan.dynamic_columns:
+        value_str = str(row[col_idx] or "").strip()
+        if value_str:
+            dynamic.append((field_name, value_str))
+
+    gender = str(values.get("gender") or "").lower()
+    values["gender"] = gender if gender in VALID_GENDERS else None
+    return values, dynamic
+
+
+def _ensure_custom_fields(db, event_id: int, names: List[str]) -> Dict[str, int]:
+    existing = (
+        db.query(guest_models.GuestCustomField)
+        .filter(guest_models.GuestCustomField.event_id == event_id)
+        .filter(guest_models.GuestCustomField.name.in_(names))
+        .all()
+    )
+    field_ids = {f.name: f.id for f in existing}
+    for name in names:
+        if name in field_ids:
+            continue
+        new_field = guest_models.GuestCustomField(event_id=event_id, name=name, field_type="text", form_key=None)
+        db.add(new_field)
+        db.flush()
+        field_ids[name] = new_field.id
+    return field_ids
+
+
+def _column_type(db, column: str) -> str:
+    return guest_models.Guest.__table__.columns[column].type.compile(dialect=db.bind.dialect)
+
+
+def _stage_guests(db, columns: List[str], staged: List[tuple]) -> None:
+    """
+    COPY לטבלת ה-staging. העמודות נטענות כטקסט, כך שערך שלא מתאים לעמודה בטבלת guests
+    לא מפיל את ה-COPY של כל הבאץ' - הוא נבדק לכל שורה ב-_validate_staged
+    """
+    stage_defs = ", ".join(["row_no INTEGER"] + [f'"{c}" TEXT' for c in columns])
+    db.execute(text(f"CREATE TEMP TABLE {GUEST_STAGE_TABLE} ({stage_defs}) ON COMMIT DROP"))
+    _copy_rows(db, GUEST_STAGE_TABLE, ["row_no"] + columns, staged)
+
+
+def _validate_staged(db, event_id: int, columns: List[str]) -> Dict[int, str]:
+    """
+    בדיקת השורות בטבלת ה-staging לפני ה-upsert: המרה לטיפוס העמודה, עמודות חובה, מפתחות
+    זרים ואילוצי ייחודיות לאירוע (מלבד (event_id, id_number) - מפתח המיזוג). מחזיר
+    row_no -> הודעת שגיאה, והשורות האלה נמחקות מה-staging.
+    """
+    guest_table = guest_models.Guest.__table__
+    db.execute(
+        text(
+            "CREATE OR REPLACE FUNCTION pg_temp.import_cast_error(value TEXT, type_name TEXT) RETURNS TEXT "
+            "LANGUAGE plpgsql AS $$ BEGIN "
+            "EXECUTE format('SELECT %L::%s', value, type_name); RETURN NULL; "
+            "EXCEPTION WHEN others THEN RETURN SQLERRM; END $$"
+        )
+    )
+
+    typed = {c: _column_type(db, c) for c in columns if c != "id_number"}
+    typed = {c: t for c, t in typed.items() if t not in ("VARCHAR", "TEXT")}
+    cast_exprs = [f"pg_temp.import_cast_error(s.\"{c}\", '{t}') AS \"{c}\"" for c, t in typed.items()]
+    checks = [f"CASE WHEN t.\"{c}\" IS NOT NULL THEN '{c}: ' || t.\"{c}\" END" for c in typed]
+
+    def valid(c: str) -> str:
+        # מפתח זר / ייחודיות נבדקים רק לערך שעבר את בדיקת הטיפוס
+        base = f's."{c}" IS NOT NULL'
+        return f'{base} AND t."{c}" IS NULL' if c in typed else base
+
+    def value(c: str) -> str:
+        return f's."{c}"::{typed[c]}' if c in typed else f's."{c}"'
+
+    for c in columns:
+        column = guest_table.columns[c]
+        # עמודות חובה בלי ברירת מחדל - הערך יכול להגיע משורה אחרת של אותו מוזמן או מהמוזמן הקיים
+        has_default = column.default is not None or column.server_default is not None
+        if not column.nullable and not has_default and c not in ("id_number", "first_name", "last_name", "gender"):
+            checks.append(
+                f"CASE WHEN NOT EXISTS (SELECT 1 FROM {GUEST_STAGE_TABLE} s2 "
+                f"WHERE s2.id_number = s.id_number AND s2.\"{c}\" IS NOT NULL) "
+                f"AND NOT EXISTS (SELECT 1 FROM guests g WHERE g.event_id = :event_id AND g.id_number = s.id_number) "
+                f"THEN '{c}: required' END"
+            )
+        for fk in column.foreign_keys:
+            target = fk.column
+            checks.append(
+                f"CASE WHEN {valid(c)} AND NOT EXISTS (SELECT 1 FROM {target.table.name} r "
+                f"WHERE r.\"{target.name}\" = {value(c)}) "
+                f"THEN '{c}: no {target.table.name} row ' || s.\"{c}\" END"
+            )
+
+    unique_column_sets = [
+        [col.name for col in constraint.columns]
+        for constraint in guest_table.constraints
+        if isinstance(constraint, UniqueConstraint)
+    ] + [[col.name for col in index.columns] for index in guest_table.indexes if index.unique]
+    for names in unique_column_sets:
+        others = [n for n in names if n != "event_id"]
+        if "event_id" not in names or len(others) != 1 or others[0] == "id_number" or others[0] not in columns:
+            continue
+        c = others[0]
+        checks.append(
+            f"CASE WHEN {valid(c)} AND ("
+            f"EXISTS (SELECT 1 FROM guests g WHERE g.event_id = :event_id AND g.\"{c}\" = {value(c)} "
+            f"AND g.id_number IS DISTINCT FROM s.id_number) "
+            f"OR EXISTS (SELECT 1 FROM {GUEST_STAGE_TABLE} s2 WHERE s2.\"{c}\" = s.\"{c}\" "
+            f"AND s2.id_number <> s.id_number AND s2.row_no < s.row_no)) "
+            f"THEN '{c}: duplicate value ' || s.\"{c}\" END"
+        )
+
+    if not checks:
+        return {}
+    lateral = f"CROSS JOIN LATERAL (SELECT {', '.join(cast_exprs)}) t " if cast_exprs else ""
+    result = db.execute(
+        text(
+            f"SELECT row_no, error FROM ("
+            f"SELECT s.row_no, concat_ws('; ', {', '.join(checks)}) AS error "
+            f"FROM {GUEST_STAGE_TABLE} s {lateral}"
+            f") v WHERE v.error <> ''"
+        ),
+        {"event_id": event_id},
+    )
+    invalid = {row_no: error for row_no, error in result}
+    if invalid:
+        db.execute(
+            text(f"DELETE FROM {GUEST_STAGE_TABLE} WHERE row_no = ANY(:row_nos)"),
+            {"row_nos": list(invalid)},
+        )
+    return invalid
+
+
+def _upsert_guests(db, event_id: int, columns: List[str]) -> Dict[str, int]:
+    """
+    upsert מטבלת ה-staging (אחרי _validate_staged) לטבלת guests. מחזיר id_number -> guest.id
+
+    שורות עם אותה ת"ז בבאץ' ממוזגות לשורה אחת לפני ה-upsert, עמודה-עמודה: הערך הלא ריק
+    האחרון לפי סדר השורות בקובץ (כמו מיזוג הכפילויות במסלול ה-ORM).
+    """
+    merged_exprs = [
+        f'(array_agg(s."{c}" ORDER BY s.row_no DESC) FILTER (WHERE s."{c}" IS NOT NULL))[1] AS "{c}"'
+        for c in columns
+        if c != "id_number"
+    ]
+    db.execute(
+        text(
+            f"CREATE TEMP TABLE {MERGED_STAGE_TABLE} ON COMMIT DROP AS "
+            f"SELECT s.id_number, {', '.join(merged_exprs)} "
+            f"FROM {GUEST_STAGE_TABLE} s GROUP BY s.id_number"
+        )
+    )
+
+    # עמודות חובה מקבלות ברירת מחדל בהכנסה, ובעדכון לא דורסות ערך קיים
+    select_exprs = []
+    update_exprs = []
+    for c in columns:
+        if c == "first_name":
+            select_exprs.append(f"COALESCE(m.first_name, '{DEFAULT_FIRST_NAME}')")
+            update_exprs.append(f"first_name = COALESCE(NULLIF(EXCLUDED.first_name, '{DEFAULT_FIRST_NAME}'), guests.first_name)")
+        elif c == "last_name":
+            select_exprs.append(f"COALESCE(m.last_name, '{DEFAULT_LAST_NAME}')")
+            update_exprs.append(f"last_name = COALESCE(NULLIF(EXCLUDED.last_name, '{DEFAULT_LAST_NAME}'), guests.last_name)")
+        elif c == "gender":
+            select_exprs.append("COALESCE(m.gender, 'male')")
+            update_exprs.append(
+                f"gender = COALESCE((SELECT m2.gender FROM {MERGED_STAGE_TABLE} m2 "
+                f"WHERE m2.id_number = EXCLUDED.id_number), guests.gender)"
+            )
+        elif c == "id_number":
+            select_exprs.append("m.id_number")
+        else:
+            select_exprs.append(f'm."{c}"::{_column_type(db, c)}')
+            update_exprs.append(f'"{c}" = COALESCE(EXCLUDED."{c}", guests."{c}")')
+
+    insert_columns = ", ".join(["event_id", "confirmed_arrival", "registration_source"] + [f'"{c}"' for c in columns])
+    result = db.execute(
+        text(
+            f"INSERT INTO guests ({insert_columns}) "
+            f"SELECT :event_id, false, 'import', {', '.join(select_exprs)} "
+            f"FROM {MERGED_STAGE_TABLE} m "
+            f"ON CONFLICT (event_id, id_number) DO UPDATE SET {', '.join(update_exprs)} "
+            f"RETURNING id, id_number"
+        ),
+        {"event_id": event_id},
+    )
+    return {id_number: guest_id for guest_id, id_number in result}
+
+
+def _upsert_field_values(db, staged: List[tuple]) -> None:
+    db.execute(
+        text(
+            f"CREATE TEMP TABLE {FIELD_VALUE_STAGE_TABLE} "
+            f"(guest_id INTEGER, custom_field_id INTEGER, value VARCHAR) ON COMMIT DROP"
+        )
+    )
+    _copy_rows(db, FIELD_VALUE_STAGE_TABLE, ["guest_id", "custom_field_id", "value"], staged)
+    if guests_repo.uses_jsonb_field_storage():
+        # מצב jsonb - מיזוג כל ערכי המוזמן ל-guests.custom_fields ב-UPDATE אחד
+        db.execute(
+            text(
+                f"UPDATE guests g SET custom_fields = g.custom_fields || s.fields "
+                f"FROM (SELECT guest_id, jsonb_object_agg(custom_field_id::text, value) AS fields "
+                f"FROM {FIELD_VALUE_STAGE_TABLE} GROUP BY guest_id) s "
+                f"WHERE g.id = s.guest_id"
+            )
+        )
+        return
+    # ל-guest_field_values אין אילוץ ייחודי - עדכון הקיימים ואז הכנסת החסרים
+    db.execute(
+        text(
+            f"UPDATE guest_field_values v SET value = s.value FROM {FIELD_VALUE_STAGE_TABLE} s "
+            f"WHERE v.guest_id = s.guest_id AND v.custom_field_id = s.custom_field_id"
+        )
+    )
+    db.execute(
+        text(
+            f"INSERT INTO guest_field_values (guest_id, custom_field_id, value) "
+            f"SELECT s.guest_id, s.custom_field_id, s.value FROM {FIELD_VALUE_STAGE_TABLE} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM guest_field_values v "
+            f"WHERE v.guest_id = s.guest_id AND v.custom_field_id = s.custom_field_id)"
+        )
+    )
+
+
+def process_batch_bulk(
+    db,
+    rows: List[Dict[str, Any]],
+    event_id: int,
+    job_id: int,
+    batch_start_index: int,
+    match_index: GuestMatchIndex,
+    plan: Optional[service.ColumnPlan] = None,
+):
+    """
+    עיבוד באץ' במסלול ה-COPY. מחזיר (ok, err, errors) כמו _process_batch.
+    שורות שלא עוברות את הבדיקה ב-staging (_validate_staged) נרשמות כשגיאה עם מספר השורה,
+    ושאר הבאץ' נשמר. רק כשל לא צפוי מעבד את הבאץ' מחדש במסלול ה-ORM הרגיל.
+    """
+    if plan is None:
+        plan, rows = service.ColumnPlan.from_dicts(rows)
+
+    errors: List[Dict[str, Any]] = []
+    mapped: List[Tuple[int, Dict[str, Any], List[Tuple[str, str]]]] = []
+    batch_index = GuestMatchIndex(event_id)
+    pending: Dict[str, guest_models.Guest] = {}
+    for row_index, row in enumerate(rows):
+        try:
+            values, dynamic = _map_row(row, plan)
+            global_row_index = batch_start_index + row_index
+            values["id_number"] = _resolve_id_number(
+                plan.id_number_raw(row),
+                values,
+                match_index,
+                batch_index,
+                event_id,
+                job_id,
+                global_row_index,
+                plan.resolved_ids.get(global_row_index),
+            )
+            _add_pending(batch_index, pending, values["id_number"], values)
+            mapped.append((row_index, values, dynamic))
+        except Exception as e:
+            errors.append(_error_row(plan.row_dict(row), str(e), batch_start_index + row_index))
+
+    if not mapped:
+        return 0, len(errors), errors
+
+    columns = sorted({c for _, values, _ in mapped for c in values} | {"first_name", "last_name", "gender", "id_number"})
+    staged = [(row_index,) + tuple(values.get(c) for c in columns) for row_index, values, _ in mapped]
+
+    try:
+        _stage_guests(db, columns, staged)
+        invalid = _validate_staged(db, event_id, columns)
+        for row_index in sorted(invalid):
+            errors.append(
+                _error_row(plan.row_dict(rows[row_index]), invalid[row_index], batch_start_index + row_index)
+            )
+        mapped = [m for m in mapped if m[0] not in invalid]
+
+        guest_ids = _upsert_guests(db, event_id, columns) if mapped else {}
+        # ה-upsert עוקף את ה-ORM - פרטי מוזמנים משובצים עשויים להשתנות
+        seating_snapshot.mark_changed(db, event_id)
+
+        # 15 השדות הדינמיים הראשונים של הבאץ' (כמו במסלול ה-ORM)
+        dynamic_names: List[str] = []
+        for _, _, dynamic in mapped:
+            for name, _ in dynamic:
+                if name not in dynamic_names and len(dynamic_names) < MAX_DYNAMIC_FIELDS:
+                    dynamic_names.append(name)
+        if dynamic_names:
+            field_ids = _ensure_custom_fields(db, event_id, dynamic_names)
+            field_values: Dict[Tuple[int, int], str] = {}
+            # לפי סדר השורות - לשורה מאוחרת עם אותה ת"ז הערך האחרון
+            for _, values, dynamic in mapped:
+                guest_id = guest_ids.get(values["id_number"])
+                if not guest_id:
+                    continue
+                for name, value in dynamic:
+                    if name in field_ids:
+                        field_values[(guest_id, field_ids[name])] = value
+            if field_values:
+                _upsert_field_values(db, [(g, f, v) for (g, f), v in field_values.items()])
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[import-job] bulk batch failed unexpectedly, falling back to ORM path: {e}")
+        return service._process_batch(db, rows, event_id, job_id, batch_start_index, match_index, plan)
+
+    # עדכון אינדקס ההתאמה כדי ששורות בבאצ'ים הבאים (וגם נפילה למסלול ה-ORM) יזוהו -
+    # המוזמנים עצמם נטענים ל-session, כך ששינוי שלהם בבאץ' מאוחר יותר נשמר
+    if guest_ids:
+        for guest in db.query(guest_models.Guest).filter(guest_models.Guest.id.in_(list(guest_ids.values()))):
+            match_index.add(guest)
+
+    # שורות שמוזגו לשורה אחרת עם אותה ת"ז נספרות כהצלחה
+    ok = len(mapped)
+    print(f"[import-job] bulk batch: {len(rows)} rows, upserted {len(guest_ids)} guests, errors {len(errors)}")
+    return ok, len(errors), errors
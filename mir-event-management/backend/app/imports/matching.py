@@ -0,0 +1,277 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.guests import models as guest_models
+from app.guests import repository as guests_repo
+
+
+def _digits(raw: Optional[str]) -> str:
+    return "".join(ch for ch in (raw or "") if ch.isdigit())
+
+
+def _strip(raw: Optional[str]) -> str:
+    return (raw or "").strip()
+
+
+class GuestMatchIndex:
+    """
+    אינדקס בזיכרון של מוזמני האירוע עבור ג'וב ייבוא.
+    נטען פעם אחת לכל ג'וב ומתעדכן תוך כדי שמירת שורות, כך שההתאמה
+    (לפי ת"ז, שם+טלפון, שם+אימייל) לא דורשת שאילתה לכל שורה.
+    """
+
+    def __init__(self, event_id: int):
+        self.event_id = event_id
+        self._by_id: Dict[str, guest_models.Guest] = {}
+        self._by_name_phone: Dict[Tuple[str, str, str], guest_models.Guest] = {}
+        self._by_name_email: Dict[Tuple[str, str, str], guest_models.Guest] = {}
+        # שם מנורמל (lower/trim) -> מוזמנים לפי סדר הוספה (הוותיק ראשון)
+        self._by_name: Dict[Tuple[str, str], List[guest_models.Guest]] = {}
+        # המפתחות שנרשמו לכל מוזמן - כדי לנקות אותם באינדוקס מחדש
+        self._keys: Dict[int, List[Tuple[dict, tuple]]] = {}
+        self._name_keys: Dict[int, Tuple[str, str]] = {}
+
+    @classmethod
+    def load(cls, db: Session, event_id: int) -> "GuestMatchIndex":
+        index = cls(event_id)
+        index.reload(db)
+        return index
+
+    def reload(self, db: Session) -> None:
+        """טוען מחדש את כל מוזמני האירוע בשאילתה אחת"""
+        self._by_id.clear()
+        self._by_name_phone.clear()
+        self._by_name_email.clear()
+        self._by_name.clear()
+        self._keys.clear()
+        self._name_keys.clear()
+        guests = (
+            db.query(guest_models.Guest)
+            .filter(guest_models.Guest.event_id == self.event_id)
+            .order_by(guest_models.Guest.id.asc())
+            .all()
+        )
+        for guest in guests:
+            self.add(guest)
+        print(f"[import-job] GuestMatchIndex: loaded {len(guests)} guests for event {self.event_id}")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, guest: guest_models.Guest) -> None:
+        """מוסיף (או מאנדקס מחדש) מוזמן לאינדקס"""
+        self.discard(guest)
+        keys: List[Tuple[dict, tuple]] = []
+
+        id_number = _strip(guest.id_number)
+        if id_number and id_number != "-":
+            self._by_id.setdefault(id_number, guest)
+            keys.append((self._by_id, id_number))
+            if not id_number.startswith("TEMP-"):
+                norm = _digits(id_number)
+                if norm:
+                    self._by_id.setdefault(norm, guest)
+                    keys.append((self._by_id, norm))
+
+        first = _strip(guest.first_name)
+        last = _strip(guest.last_name)
+        if first and last:
+            for phone in (_strip(guest.mobile_phone), _strip(guest.home_phone)):
+                if phone:
+                    key = (first, last, phone)
+                    self._by_name_phone.setdefault(key, guest)
+                    keys.append((self._by_name_phone, key))
+            email = _strip(guest.email).lower()
+            if email:
+                key = (first, last, email)
+                self._by_name_email.setdefault(key, guest)
+                keys.append((self._by_name_email, key))
+
+            name_key = (first.lower(), last.lower())
+            self._by_name.setdefault(name_key, []).append(guest)
+            self._name_keys[id(guest)] = name_key
+
+        self._keys[id(guest)] = keys
+
+    def discard(self, guest: guest_models.Guest) -> None:
+        keys = self._keys.pop(id(guest), None)
+        if keys is None:
+            return
+        for mapping, key in keys:
+            if mapping.get(key) is guest:
+                del mapping[key]
+        name_key = self._name_keys.pop(id(guest), None)
+        if name_key is not None:
+            bucket = [g for g in self._by_name.get(name_key, []) if g is not guest]
+            if bucket:
+                self._by_name[name_key] = bucket
+            else:
+                self._by_name.pop(name_key, None)
+
+    def by_id(self, id_number_norm: Optional[str], id_number_raw: Optional[str] = None) -> Optional[guest_models.Guest]:
+        """התאמה לפי ת"ז מנורמלת ואז לפי הערך הגולמי"""
+        if id_number_norm:
+            guest = self._by_id.get(id_number_norm)
+            if guest is not None:
+                return guest
+        if id_number_raw:
+            return self._by_id.get(_strip(id_number_raw))
+        return None
+
+    def by_name_and_contact(
+        self,
+        first_name: Optional[str],
+        last_name: Optional[str],
+        phone: Optional[str] = None,
+        email: Optional[str] = None,
+    ) -> Optional[guest_models.Guest]:
+        """התאמה מדויקת לפי שם פרטי + שם משפחה + (טלפון נייד/בית או אימייל)"""
+        first = _strip(first_name)
+        last = _strip(last_name)
+        if not first or not last:
+            return None
+        phone = _strip(phone)
+        if phone and phone != "-":
+            guest = self._by_name_phone.get((first, last, phone))
+            if guest is not None:
+                return guest
+        email = _strip(email).lower()
+        if email and email != "-":
+            return self._by_name_email.get((first, last, email))
+        return None
+
+    def find_duplicate(
+        self,
+        guest: guest_models.Guest,
+    ) -> Optional[guest_models.Guest]:
+        """
+        בדיקת כפילות לפני יצירת מוזמן חדש - מקבילה בזיכרון ל-
+        find_guest_by_id_number ו-find_guest_by_name_and_phone_or_email.
+        """
+        id_number = _strip(guest.id_number)
+        if id_number and not id_number.startswith("TEMP-"):
+            norm = _digits(id_number)
+            if len(norm) >= 6:
+                existing = self._by_id.get(norm)
+                if existing is not None and existing is not guest:
+                    return existing
+
+        first = _strip(guest.first_name).lower()
+        last = _strip(guest.last_name).lower()
+        if not first or not last:
+            return None
+        candidates = [g for g in self._by_name.get((first, last), []) if g is not guest]
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+
+        phone_norm = guests_repo._normalize_phone_number(guest.mobile_phone or guest.home_phone or "")
+        if phone_norm and len(phone_norm) >= 7:
+            for candidate in candidates:
+                candidate_phones = [
+                    guests_repo._normalize_phone_number(candidate.mobile_phone or ""),
+                    guests_repo._normalize_phone_number(candidate.home_phone or ""),
+                    guests_repo._normalize_phone_number(candidate.alt_phone_1 or ""),
+                    guests_repo._normalize_phone_number(candidate.alt_phone_2 or ""),
+                ]
+                if phone_norm in candidate_phones:
+                    return candidate
+
+        email_norm = _strip(guest.email).lower()
+        if email_norm and "@" in email_norm:
+            for candidate in candidates:
+                if _strip(candidate.email).lower() == email_norm:
+                    return candidate
+
+        # אין התאמה לפי טלפון/אימייל - הוותיק ביותר
+        return candidates[0]
+
+
+class ImportRowResolver:
+    """
+    התאמת שורות הקובץ זו לזו בשלב התכנון, לפני החלוקה למחיצות - כדי שמחיצות של אותו
+    ג'וב ירוצו במקביל בלי ליצור את אותו אדם פעמיים.
+
+    השורות מקובצות לפי סדרן בקובץ ולפי אותם כללים כמו אינדקס ההתאמה: ת"ז, שם + טלפון/אימייל
+    (by_name_and_contact) ושם בלבד (find_duplicate - הקבוצה הוותיקה). לכל שורה בלי ת"ז נקבע
+    ה-id_number של הקבוצה שלה - הת"ז הראשונה בקבוצה, או ה-TEMP ID של השורה הראשונה בה -
+    כך שמחיצות שונות שיוצרות את אותו מוזמן מתמזגות על המפתח הייחודי (event_id, id_number).
+    שורות עם ת"ז שומרות על הת"ז שלהן; שורה עם ת"ז שמתאימה לקבוצה שכבר יש לה ת"ז אחרת
+    פותחת קבוצה חדשה.
+    """
+
+    def __init__(self):
+        self._group_id_number: List[Optional[str]] = []
+        self._group_first_row: List[int] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_name_phone: Dict[Tuple[str, str, str], int] = {}
+        self._by_name_email: Dict[Tuple[str, str, str], int] = {}
+        self._by_name: Dict[Tuple[str, str], int] = {}
+        # (מספר שורה, קבוצה) לשורות בלי ת"ז
+        self._id_less_rows: List[Tuple[int, int]] = []
+
+    def _new_group(self, row_no: int, id_number: Optional[str]) -> int:
+        self._group_id_number.append(id_number)
+        self._group_first_row.append(row_no)
+        return len(self._group_first_row) - 1
+
+    def _match(self, first: str, last: str, phone: str, email: str) -> Optional[int]:
+        if not first or not last:
+            return None
+        if phone and phone != "-":
+            group = self._by_name_phone.get((first, last, phone))
+            if group is not None:
+                return group
+        if email and email != "-":
+            group = self._by_name_email.get((first, last, email))
+            if group is not None:
+                return group
+        return self._by_name.get((first.lower(), last.lower()))
+
+    def add(
+        self,
+        row_no: int,
+        id_number_norm: str,
+        first_name: Optional[str],
+        last_name: Optional[str],
+        phone: Optional[str] = None,
+        email: Optional[str] = None,
+    ) -> None:
+        """מוסיף שורה (לפי סדר הקובץ); id_number_norm ריק לשורה בלי ת"ז תקינה"""
+        first = _strip(first_name)
+        last = _strip(last_name)
+        phone = _strip(phone)
+        email = _strip(email).lower()
+
+        if id_number_norm:
+            group = self._by_id.get(id_number_norm)
+            if group is None:
+                group = self._match(first, last, phone, email)
+                if group is not None and self._group_id_number[group] is None:
+                    self._group_id_number[group] = id_number_norm
+                else:
+                    group = self._new_group(row_no, id_number_norm)
+                self._by_id[id_number_norm] = group
+        else:
+            group = self._match(first, last, phone, email)
+            if group is None:
+                group = self._new_group(row_no, None)
+            self._id_less_rows.append((row_no, group))
+
+        if first and last:
+            if phone and phone != "-":
+                self._by_name_phone.setdefault((first, last, phone), group)
+            if email and email != "-":
+                self._by_name_email.setdefault((first, last, email), group)
+            self._by_name.setdefault((first.lower(), last.lower()), group)
+
+    def resolved_ids(self, event_id: int, job_id: int) -> Dict[int, str]:
+        """מספר שורה -> id_number, לשורות בלי ת"ז שה-id_number שלהן שונה מה-TEMP ID של השורה עצמה"""
+        resolved: Dict[int, str] = {}
+        for row_no, group in self._id_less_rows:
+            id_number = self._group_id_number[group] or f"TEMP-{event_id}-{job_id}-{self._group_first_row[group]}"
+            if id_number != f"TEMP-{event_id}-{job_id}-{row_no}":
+                resolved[row_no] = id_number
+        return resolved
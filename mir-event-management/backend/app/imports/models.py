@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -13,6 +13,8 @@ class ImportJob(Base):
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
 
     file_name = Column(String, nullable=False)
+    file_path = Column(String, nullable=True)  # הקובץ שנשמר ב-uploads - ה-worker קורא ממנו
+    mode = Column(String, nullable=False, default="orm")  # orm | bulk
     status = Column(String, nullable=False, default="pending")  # pending | running | success | failed | partial
     total_rows = Column(Integer, nullable=False, default=0)
     processed_rows = Column(Integer, nullable=False, default=0)
@@ -20,10 +22,48 @@ class ImportJob(Base):
     error_count = Column(Integer, nullable=False, default=0)
     error_log_path = Column(String, nullable=True)
 
+    # תור עבודות: worker תופס את הג'וב (lease) לשלב התכנון - ספירה וחלוקה למחיצות
+    partition_count = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+
     started_at = Column(DateTime, nullable=True)
     finished_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     event = relationship("Event", backref="import_jobs", lazy="joined")
+    partitions = relationship("ImportJobPartition", back_populates="job", order_by="ImportJobPartition.start_row")
+
+    __table_args__ = (Index("ix_import_jobs_status_lease", "status", "lease_expires_at"),)
+
+
+class ImportJobPartition(Base):
+    """טווח שורות [start_row, end_row) מתוך קובץ ייבוא - מעובד ע"י worker אחד בכל פעם"""
+    __tablename__ = "import_job_partitions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    start_row = Column(Integer, nullable=False)
+    end_row = Column(Integer, nullable=True)  # None = עד סוף הקובץ
+    start_offset = Column(BigInteger, nullable=True)  # offset של start_row בקובץ (readers.plan_partitions)
+    status = Column(String, nullable=False, default="pending")  # pending | running | done | failed
+
+    processed_rows = Column(Integer, nullable=False, default=0)
+    success_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    error_log_path = Column(String, nullable=True)
+
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    job = relationship("ImportJob", back_populates="partitions")
 
+    __table_args__ = (Index("ix_import_job_partitions_status_lease", "status", "lease_expires_at"),)
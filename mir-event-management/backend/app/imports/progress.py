@@ -0,0 +1,291 @@
+"""
+ערוץ התקדמות לג'ובי ייבוא בתוך התהליך.
+
+ה-workers מדווחים מוני מחיצות לזיכרון (בלי כתיבה למסד לכל באץ'), thread רקע
+כותב אותם ל-import_job_partitions / import_jobs כל IMPORT_PROGRESS_FLUSH_SECONDS
+(וגם מאריך את ה-lease), ו-GET /imports/{job_id}/stream דוחף כל שינוי למנויים (SSE).
+מחיצות שרצות בתהליך אחר (python -m app.imports.worker) נטענות מהמסד בכל flush.
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.imports import models, repository
+
+FINAL_STATUSES = ("success", "partial", "failed")
+_COUNTERS = ("processed_rows", "success_count", "error_count")
+
+
+class ProgressStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # job_id -> שדות הג'וב (status, total_rows, ...) ומוני המחיצות שלו
+        self._jobs: Dict[int, Dict[str, Any]] = {}
+        self._partitions: Dict[int, Dict[int, Dict[str, int]]] = {}
+        # מחיצות מקומיות שרצות כעת: partition_id -> (job_id, worker_id)
+        self._live: Dict[int, Tuple[int, str]] = {}
+        self._dirty: Set[int] = set()
+        self._lost: Set[int] = set()
+        self._versions: Dict[int, int] = {}
+        self._subscribers: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    # -- צד ה-workers ---------------------------------------------------------
+
+    def report_partition(
+        self,
+        job_id: int,
+        partition_id: int,
+        worker_id: str,
+        *,
+        processed_rows: int,
+        success_count: int,
+        error_count: int,
+    ) -> None:
+        with self._lock:
+            self._partitions.setdefault(job_id, {})[partition_id] = {
+                "processed_rows": processed_rows,
+                "success_count": success_count,
+                "error_count": error_count,
+            }
+            self._live[partition_id] = (job_id, worker_id)
+            self._dirty.add(partition_id)
+            self._lost.discard(partition_id)
+        self._notify(job_id)
+
+    def end_partition(self, partition_id: int) -> None:
+        """המחיצה הסתיימה (או ננטשה) - המונים שלה כבר נכתבו למסד ע"י ה-worker"""
+        with self._lock:
+            live = self._live.pop(partition_id, None)
+            self._dirty.discard(partition_id)
+            self._lost.discard(partition_id)
+            if live is None:
+                return
+            job_id = live[0]
+            # אף אחד לא מאזין ואין עוד מחיצות מקומיות של הג'וב - המונים כבר במסד
+            if not self._subscribers.get(job_id) and not any(j == job_id for j, _ in self._live.values()):
+                self._partitions.pop(job_id, None)
+
+    def is_lost(self, partition_id: int) -> bool:
+        """True אם ה-flush גילה שה-lease על המחיצה כבר לא שייך ל-worker הזה"""
+        with self._lock:
+            return partition_id in self._lost
+
+    def publish_job(self, job_id: int, **fields: Any) -> None:
+        """עדכון שדות ברמת הג'וב (status, total_rows, finished_at ...)"""
+        final = fields.get("status") in FINAL_STATUSES
+        with self._lock:
+            job = self._jobs.setdefault(job_id, {})
+            job.update(fields)
+            if final:
+                # הג'וב הסתיים - מוני המחיצות כבר לא נחוצים, הסיכום נמצא בשדות הג'וב
+                self._partitions.pop(job_id, None)
+        self._notify(job_id)
+        if final:
+            with self._lock:
+                if not self._subscribers.get(job_id):
+                    self._jobs.pop(job_id, None)
+                    self._versions.pop(job_id, None)
+
+    # -- צד ה-flush ------------------------------------------------------------
+
+    def take_dirty(self) -> List[Tuple[int, int, str, Dict[str, int]]]:
+        with self._lock:
+            dirty = []
+            for partition_id in self._dirty:
+                live = self._live.get(partition_id)
+                if live is None:
+                    continue
+                job_id, worker_id = live
+                counters = self._partitions.get(job_id, {}).get(partition_id)
+                if counters is not None:
+                    dirty.append((partition_id, job_id, worker_id, dict(counters)))
+            self._dirty.clear()
+            return dirty
+
+    def mark_lost(self, partition_id: int) -> None:
+        with self._lock:
+            if partition_id in self._live:
+                self._lost.add(partition_id)
+
+    def watched_jobs(self) -> List[int]:
+        with self._lock:
+            return [job_id for job_id, subs in self._subscribers.items() if subs]
+
+    def merge_remote(self, job_id: int, job_fields: Dict[str, Any], partitions: Dict[int, Dict[str, int]]) -> None:
+        """ממזג מצב מהמסד (מחיצות של תהליכים אחרים); מחיצות מקומיות חיות לא נדרסות"""
+        with self._lock:
+            local = self._partitions.setdefault(job_id, {})
+            changed = False
+            for partition_id, counters in partitions.items():
+                if partition_id in self._live:
+                    continue
+                if local.get(partition_id) != counters:
+                    local[partition_id] = counters
+                    changed = True
+            job = self._jobs.setdefault(job_id, {})
+            for key, value in job_fields.items():
+                if job.get(key) != value:
+                    job[key] = value
+                    changed = True
+        if changed:
+            self._notify(job_id)
+
+    # -- צד המנויים -------------------------------------------------------------
+
+    def snapshot(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if job_id not in self._jobs and job_id not in self._partitions:
+                return None
+            data = dict(self._jobs.get(job_id, {}))
+            partitions = self._partitions.get(job_id)
+            if partitions:
+                for key in _COUNTERS:
+                    data[key] = sum(p[key] for p in partitions.values())
+            data["job_id"] = job_id
+            return data
+
+    def version(self, job_id: int) -> int:
+        with self._lock:
+            return self._versions.get(job_id, 0)
+
+    def subscribe(self, job_id: int) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((asyncio.get_running_loop(), event))
+        return event
+
+    def unsubscribe(self, job_id: int, event: asyncio.Event) -> None:
+        with self._lock:
+            subs = [s for s in self._subscribers.get(job_id, []) if s[1] is not event]
+            if subs:
+                self._subscribers[job_id] = subs
+            else:
+                self._subscribers.pop(job_id, None)
+                # אין מי שמאזין והג'וב הסתיים - אפשר לשכוח אותו
+                if self._jobs.get(job_id, {}).get("status") in FINAL_STATUSES:
+                    self._jobs.pop(job_id, None)
+                    self._versions.pop(job_id, None)
+
+    def _notify(self, job_id: int) -> None:
+        with self._lock:
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            subs = list(self._subscribers.get(job_id, []))
+        for loop, event in subs:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # ה-loop נסגר
+
+
+store = ProgressStore()
+
+
+# ---------------------------------------------------------------------------
+# flush למסד
+# ---------------------------------------------------------------------------
+
+def _job_fields(job: models.ImportJob) -> Dict[str, Any]:
+    return {
+        "status": job.status,
+        "total_rows": job.total_rows,
+        "partition_count": job.partition_count,
+        "error_log_path": job.error_log_path,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def flush(db) -> None:
+    """כותב את מוני המחיצות המקומיות למסד (ומאריך lease) וטוען מצב של ג'ובים שיש להם מנויים"""
+    dirty = store.take_dirty()
+    jobs: Set[int] = set()
+    for partition_id, job_id, worker_id, counters in dirty:
+        still_owner = repository.heartbeat_partition(
+            db, partition_id, worker_id, settings.IMPORT_LEASE_SECONDS, **counters
+        )
+        if not still_owner:
+            store.mark_lost(partition_id)
+        jobs.add(job_id)
+    for job_id in jobs:
+        repository.refresh_job_counters(db, job_id)
+
+    for job_id in store.watched_jobs():
+        job = repository.get_job(db, job_id)
+        if not job:
+            continue
+        partitions = {
+            p.id: {key: getattr(p, key) for key in _COUNTERS}
+            for p in repository.get_partitions(db, job_id)
+        }
+        store.merge_remote(job_id, _job_fields(job), partitions)
+    db.rollback()
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(settings.IMPORT_PROGRESS_FLUSH_SECONDS)
+        db = SessionLocal()
+        try:
+            flush(db)
+        except Exception as e:
+            print(f"[import-progress] flush failed: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+
+_flusher: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+
+
+def start_flusher() -> None:
+    """מפעיל את thread ה-flush (פעם אחת לתהליך)"""
+    global _flusher
+    with _flusher_lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name="import-progress-flush", daemon=True)
+        _flusher.start()
+
+
+# ---------------------------------------------------------------------------
+# SSE
+# ---------------------------------------------------------------------------
+
+def _sse(data: Dict[str, Any]) -> str:
+    return f"event: progress\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+async def stream_events(job_id: int, initial: Dict[str, Any], keepalive_seconds: float = 15.0) -> AsyncIterator[str]:
+    """
+    זרם SSE של התקדמות ג'וב: המצב הנוכחי מיד, אחר כך כל שינוי בערוץ.
+    הזרם נסגר כשהג'וב מגיע לסטטוס סופי.
+    """
+    event = store.subscribe(job_id)
+    try:
+        current = dict(initial)
+        current.update(store.snapshot(job_id) or {})
+        yield _sse(current)
+        if current.get("status") in FINAL_STATUSES:
+            return
+        seen = store.version(job_id)
+        while True:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            event.clear()
+            version = store.version(job_id)
+            if version == seen:
+                continue
+            seen = version
+            current.update(store.snapshot(job_id) or {})
+            yield _sse(current)
+            if current.get("status") in FINAL_STATUSES:
+                return
+    finally:
+        store.unsubscribe(job_id, event)
@@ -0,0 +1,252 @@
+"""
+קריאת קבצי ייבוא בסטרימינג - שורה אחר שורה, בלי לטעון את כל הקובץ לזיכרון.
+CSV נקרא ב-csv.DictReader עצל, XLSX ב-openpyxl במצב read_only.
+
+plan_partitions עובר על הקובץ פעם אחת בשלב התכנון ומחזיר לכל מחיצה offset (בבתים) שממנו
+היא מתחילה, כך שכל מחיצה קוראת רק את השורות שלה. ב-CSV ה-offset הוא בקובץ עצמו; Excel
+אי אפשר לקרוא מאמצע, ולכן השורות נכתבות באותו מעבר לקובץ spool (<file>.rows, רשומת pickle
+לשורה - הערכים נשמרים עם הטיפוסים שלהם, למשל תאריכים) וה-offsets מתייחסים אליו.
+באותו מעבר השורות מועברות גם ל-visit (ההתאמה בין שורות הקובץ, service.plan_job), והתוצאה
+נשמרת ליד הקובץ (<file>.ids) לשימוש המחיצות.
+"""
+import csv
+import json
+import os
+import pickle
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+CSV_ENCODING = "utf-8-sig"  # מטפל גם בקבצים עם BOM וגם בלי
+SPOOL_SUFFIX = ".rows"
+RESOLVED_IDS_SUFFIX = ".ids"
+
+
+def _is_excel(file_path: str) -> bool:
+    return file_path.lower().endswith((".xlsx", ".xls"))
+
+
+def _is_blank(values) -> bool:
+    return all(v is None or (isinstance(v, str) and not v.strip()) for v in values)
+
+
+def _cell(value: Any) -> Any:
+    # תאים ריקים מגיעים כ-None; ב-CSV הם מחרוזת ריקה - נאחד
+    return "" if value is None else value
+
+
+def _header_names(raw: List[Any]) -> List[str]:
+    return [str(h).strip() if h is not None else "" for h in raw]
+
+
+def _iter_xlsx_values(file_path: str) -> Iterator[tuple]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        for values in ws.iter_rows(values_only=True):
+            yield values
+    finally:
+        wb.close()
+
+
+def _iter_xls_values(file_path: str) -> Iterator[tuple]:
+    # openpyxl לא תומך ב-xls ישן - נשאר עם pandas/xlrd (הפורמט מוגבל ל-65k שורות)
+    import pandas as pd
+
+    df = pd.read_excel(file_path, engine="xlrd", header=None, keep_default_na=False, na_values=[], dtype=object)
+    for values in df.itertuples(index=False, name=None):
+        yield values
+
+
+def _iter_csv_values(f) -> Iterator[list]:
+    try:
+        yield from csv.reader(f)
+    finally:
+        f.close()
+
+
+def _iter_excel_values(file_path: str) -> Iterator[tuple]:
+    if file_path.lower().endswith(".xls"):
+        return _iter_xls_values(file_path)
+    return _iter_xlsx_values(file_path)
+
+
+def read_header(file_path: str) -> List[str]:
+    """מחזיר את שמות העמודות (השורה הראשונה) של הקובץ"""
+    if _is_excel(file_path):
+        for values in _iter_excel_values(file_path):
+            return _header_names(list(values))
+        return []
+    with open(file_path, "r", encoding=CSV_ENCODING, newline="") as f:
+        return _header_names(next(csv.reader(f), []))
+
+
+class _OffsetLines:
+    """שורות טקסט מקובץ שנפתח בינארית, עם ה-offset של סוף השורה האחרונה שנקראה"""
+
+    def __init__(self, f, offset: int = 0):
+        self._f = f
+        self.offset = offset
+        # BOM יכול להופיע רק בתחילת הקובץ
+        self._encoding = CSV_ENCODING if offset == 0 else "utf-8"
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self._f.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        text = line.decode(self._encoding)
+        self._encoding = "utf-8"
+        return text
+
+
+def _records(values_iter, width: int, cell=None) -> Iterator[tuple]:
+    for values in values_iter:
+        if _is_blank(values):
+            continue
+        if len(values) != width:
+            values = tuple(values[:width]) + ("",) * (width - len(values))
+        yield tuple(map(cell, values)) if cell else tuple(values)
+
+
+def spool_path(file_path: str) -> str:
+    return file_path + SPOOL_SUFFIX
+
+
+RowVisitor = Callable[[int, tuple], None]
+
+
+def _plan_csv(file_path: str, partition_rows: int, visit: Optional[RowVisitor]) -> Tuple[int, List[int]]:
+    total_rows = 0
+    offsets: List[int] = []
+    with open(file_path, "rb") as f:
+        lines = _OffsetLines(f)
+        reader = csv.reader(lines)
+        width = len(next(reader, None) or [])
+        # csv.reader קורא שורה-שורה לפי הצורך, כך ש-lines.offset הוא תחילת הרשומה הבאה
+        start = lines.offset
+        for values in reader:
+            if not _is_blank(values):
+                if total_rows % partition_rows == 0:
+                    offsets.append(start)
+                if visit is not None:
+                    # אותה צורה כמו ב-iter_records
+                    visit(total_rows, next(_records((values,), width)))
+                total_rows += 1
+            start = lines.offset
+    return total_rows, offsets
+
+
+def _plan_excel(file_path: str, partition_rows: int, visit: Optional[RowVisitor]) -> Tuple[int, List[int]]:
+    total_rows = 0
+    offsets: List[int] = []
+    tmp_path = spool_path(file_path) + ".tmp"
+    with open(tmp_path, "wb") as out:
+        for values in iter_records(file_path):
+            if total_rows % partition_rows == 0:
+                offsets.append(out.tell())
+            pickle.dump(values, out, protocol=pickle.HIGHEST_PROTOCOL)
+            if visit is not None:
+                visit(total_rows, values)
+            total_rows += 1
+    os.replace(tmp_path, spool_path(file_path))
+    return total_rows, offsets
+
+
+def plan_partitions(
+    file_path: str, partition_rows: int, visit: Optional[RowVisitor] = None
+) -> Tuple[int, List[int]]:
+    """
+    מעבר אחד על הקובץ: מספר שורות הנתונים (ללא כותרת ושורות ריקות) ו-offset לתחילת
+    כל מחיצה של partition_rows שורות (ל-iter_records(file_path, offset)).
+    visit(row_no, values) נקרא לכל שורת נתונים, עם אותו tuple ש-iter_records מחזיר
+    """
+    if _is_excel(file_path):
+        return _plan_excel(file_path, partition_rows, visit)
+    return _plan_csv(file_path, partition_rows, visit)
+
+
+def _iter_spool(path: str, offset: int) -> Iterator[tuple]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def iter_records(file_path: str, offset: Optional[int] = None) -> Iterator[tuple]:
+    """
+    מחזיר את שורות הנתונים כ-tuple לפי סדר הכותרות של read_header (שורות ריקות מדולגות).
+    שורה קצרה מרופדת ב-"", ערכים מעבר למספר הכותרות נחתכים.
+    עם offset (מ-plan_partitions) הקריאה מתחילה מהשורה של ה-offset ולא מתחילת הקובץ.
+    """
+    if offset is not None:
+        if _is_excel(file_path):
+            yield from _iter_spool(spool_path(file_path), offset)
+            return
+        width = len(read_header(file_path))
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            yield from _records(csv.reader(_OffsetLines(f, offset)), width)
+        return
+
+    if _is_excel(file_path):
+        values_iter = _iter_excel_values(file_path)
+        cell = _cell
+    else:
+        f = open(file_path, "r", encoding=CSV_ENCODING, newline="")
+        values_iter = _iter_csv_values(f)
+        cell = None
+
+    header = next(values_iter, None)
+    if header is None:
+        return
+    yield from _records(values_iter, len(header), cell)
+
+
+def resolved_ids_path(file_path: str) -> str:
+    return file_path + RESOLVED_IDS_SUFFIX
+
+
+def write_resolved_ids(file_path: str, resolved_ids: Dict[int, str]) -> None:
+    """שומר את ה-id_number שנקבע בשלב התכנון לשורות (מספר שורה -> id_number)"""
+    tmp_path = resolved_ids_path(file_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({str(row_no): id_number for row_no, id_number in resolved_ids.items()}, f)
+    os.replace(tmp_path, resolved_ids_path(file_path))
+
+
+def read_resolved_ids(file_path: str, start: int = 0, end: Optional[int] = None) -> Dict[int, str]:
+    """ה-id_number שנקבעו לשורות [start, end) - ריק אם הג'וב תוכנן בלי הקובץ"""
+    try:
+        with open(resolved_ids_path(file_path), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    resolved: Dict[int, str] = {}
+    for key, id_number in raw.items():
+        row_no = int(key)
+        if row_no >= start and (end is None or row_no < end):
+            resolved[row_no] = id_number
+    return resolved
+
+
+def remove_spool(file_path: str) -> None:
+    """מוחק את קבצי העזר של שלב התכנון (spool של Excel ו-<file>.ids)"""
+    for path in (spool_path(file_path), resolved_ids_path(file_path)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def iter_rows(file_path: str) -> Iterator[Dict[str, Any]]:
+    """מחזיר את שורות הקובץ אחת-אחת כ-dict לפי כותרות העמודות (שורות ריקות מדולגות)"""
+    header = read_header(file_path)
+    for values in iter_records(file_path):
+        yield {name: values[i] for i, name in enumerate(header) if name}
@@ -1,6 +1,7 @@
-from datetime import datetime
-from typing import Optional
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, noload
 
 from app.imports import models, schemas
 
@@ -9,6 +10,8 @@ def create_job(db: Session, data: schemas.ImportJobCreate) -> models.ImportJob:
     job = models.ImportJob(
         event_id=data.event_id,
         file_name=data.file_name,
+        file_path=data.file_path,
+        mode=data.mode,
         created_by=data.created_by,
         status="pending",
         total_rows=0,
@@ -62,3 +65,257 @@ def update_job_status(
     db.refresh(job)
     return job
 
+
+
+# ---------------------------------------------------------------------------
+# תור עבודות ייבוא (claim / lease / heartbeat)
+# ---------------------------------------------------------------------------
+
+def claim_job_for_planning(db: Session, worker_id: str, lease_seconds: int) -> Optional[models.ImportJob]:
+    """
+    תופס ג'וב שממתין לתכנון (ספירת שורות וחלוקה למחיצות).
+    ג'וב שה-worker שלו נפל באמצע התכנון (lease פג) נתפס מחדש.
+    """
+    now = datetime.utcnow()
+    job = (
+        db.query(models.ImportJob)
+        .options(noload(models.ImportJob.event))
+        .filter(
+            or_(
+                models.ImportJob.status == "pending",
+                and_(
+                    models.ImportJob.status == "running",
+                    models.ImportJob.partition_count == 0,
+                    or_(models.ImportJob.lease_expires_at.is_(None), models.ImportJob.lease_expires_at < now),
+                ),
+            )
+        )
+        .order_by(models.ImportJob.id.asc())
+        .with_for_update(skip_locked=True, of=models.ImportJob)
+        .first()
+    )
+    if not job:
+        db.rollback()
+        return None
+    job.status = "running"
+    job.lease_owner = worker_id
+    job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+    job.heartbeat_at = now
+    job.attempts = (job.attempts or 0) + 1
+    if not job.started_at:
+        job.started_at = now
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def release_job_lease(db: Session, job_id: int, worker_id: str) -> None:
+    """משחרר את ה-lease על ג'וב שהתכנון שלו נכשל - כדי שייתפס שוב"""
+    db.query(models.ImportJob).filter(
+        models.ImportJob.id == job_id,
+        models.ImportJob.lease_owner == worker_id,
+    ).update(
+        {models.ImportJob.lease_owner: None, models.ImportJob.lease_expires_at: None},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def create_partitions(
+    db: Session,
+    job_id: int,
+    total_rows: int,
+    partition_rows: int,
+    offsets: Optional[List[int]] = None,
+) -> List[models.ImportJobPartition]:
+    """
+    מחלק את הקובץ לטווחי שורות; המחיצה האחרונה פתוחה עד סוף הקובץ (total_rows יכול להיות הערכה).
+    offsets - offset תחילת כל מחיצה בקובץ (readers.plan_partitions), אם ידוע
+    """
+    partitions = []
+    start = 0
+    while True:
+        end = start + partition_rows
+        index = len(partitions)
+        start_offset = offsets[index] if offsets and index < len(offsets) else None
+        if end >= total_rows:
+            partitions.append(
+                models.ImportJobPartition(job_id=job_id, start_row=start, end_row=None, start_offset=start_offset)
+            )
+            break
+        partitions.append(
+            models.ImportJobPartition(job_id=job_id, start_row=start, end_row=end, start_offset=start_offset)
+        )
+        start = end
+    db.add_all(partitions)
+    job = get_job(db, job_id)
+    job.partition_count = len(partitions)
+    job.total_rows = total_rows
+    job.lease_owner = None
+    job.lease_expires_at = None
+    db.commit()
+    return partitions
+
+
+def claim_partition(db: Session, worker_id: str, lease_seconds: int) -> Optional[models.ImportJobPartition]:
+    """
+    תופס את המחיצה הבאה שממתינה, או מחיצה שה-lease שלה פג (worker שנפל).
+    מחיצות רצות במקביל, גם של אותו ג'וב - שורות בלי ת"ז הותאמו זו לזו בשלב התכנון
+    (service.plan_job), ומוזמן שנוצר בשתי מחיצות מתמזג על (event_id, id_number).
+    """
+    now = datetime.utcnow()
+    partition = (
+        db.query(models.ImportJobPartition)
+        .filter(
+            or_(
+                models.ImportJobPartition.status == "pending",
+                and_(
+                    models.ImportJobPartition.status == "running",
+                    models.ImportJobPartition.lease_expires_at < now,
+                ),
+            )
+        )
+        .order_by(models.ImportJobPartition.id.asc())
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not partition:
+        db.rollback()
+        return None
+    partition.status = "running"
+    partition.lease_owner = worker_id
+    partition.lease_expires_at = now + timedelta(seconds=lease_seconds)
+    partition.heartbeat_at = now
+    partition.attempts = (partition.attempts or 0) + 1
+    partition.started_at = now
+    # עיבוד חוזר מתחיל מתחילת הטווח
+    partition.processed_rows = 0
+    partition.success_count = 0
+    partition.error_count = 0
+    db.commit()
+    db.refresh(partition)
+    return partition
+
+
+def heartbeat_partition(
+    db: Session,
+    partition_id: int,
+    worker_id: str,
+    lease_seconds: int,
+    *,
+    processed_rows: int,
+    success_count: int,
+    error_count: int,
+) -> bool:
+    """מאריך את ה-lease ושומר מונים. מחזיר False אם ה-lease כבר לא שייך ל-worker הזה"""
+    now = datetime.utcnow()
+    updated = (
+        db.query(models.ImportJobPartition)
+        .filter(
+            models.ImportJobPartition.id == partition_id,
+            models.ImportJobPartition.lease_owner == worker_id,
+            models.ImportJobPartition.status == "running",
+        )
+        .update(
+            {
+                models.ImportJobPartition.lease_expires_at: now + timedelta(seconds=lease_seconds),
+                models.ImportJobPartition.heartbeat_at: now,
+                models.ImportJobPartition.processed_rows: processed_rows,
+                models.ImportJobPartition.success_count: success_count,
+                models.ImportJobPartition.error_count: error_count,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return updated == 1
+
+
+def finish_partition(
+    db: Session,
+    partition_id: int,
+    worker_id: str,
+    *,
+    status: str,
+    error_log_path: Optional[str] = None,
+) -> bool:
+    updated = (
+        db.query(models.ImportJobPartition)
+        .filter(
+            models.ImportJobPartition.id == partition_id,
+            models.ImportJobPartition.lease_owner == worker_id,
+        )
+        .update(
+            {
+                models.ImportJobPartition.status: status,
+                models.ImportJobPartition.error_log_path: error_log_path,
+                models.ImportJobPartition.lease_expires_at: None,
+                models.ImportJobPartition.finished_at: datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return updated == 1
+
+
+def release_partition(db: Session, partition_id: int, worker_id: str) -> None:
+    """מחזיר מחיצה שנכשלה לתור (pending) לניסיון נוסף"""
+    db.query(models.ImportJobPartition).filter(
+        models.ImportJobPartition.id == partition_id,
+        models.ImportJobPartition.lease_owner == worker_id,
+    ).update(
+        {
+            models.ImportJobPartition.status: "pending",
+            models.ImportJobPartition.lease_owner: None,
+            models.ImportJobPartition.lease_expires_at: None,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def refresh_job_counters(db: Session, job_id: int) -> None:
+    """סכימת מוני המחיצות לתוך הג'וב (לתצוגת התקדמות)"""
+    processed, success, errors = (
+        db.query(
+            func.coalesce(func.sum(models.ImportJobPartition.processed_rows), 0),
+            func.coalesce(func.sum(models.ImportJobPartition.success_count), 0),
+            func.coalesce(func.sum(models.ImportJobPartition.error_count), 0),
+        )
+        .filter(models.ImportJobPartition.job_id == job_id)
+        .one()
+    )
+    db.query(models.ImportJob).filter(models.ImportJob.id == job_id).update(
+        {
+            models.ImportJob.processed_rows: processed,
+            models.ImportJob.success_count: success,
+            models.ImportJob.error_count: errors,
+            models.ImportJob.heartbeat_at: datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def lock_job(db: Session, job_id: int) -> Optional[models.ImportJob]:
+    return (
+        db.query(models.ImportJob)
+        .options(noload(models.ImportJob.event))
+        .populate_existing()
+        .filter(models.ImportJob.id == job_id)
+        .with_for_update(of=models.ImportJob)
+        .first()
+    )
+
+
+def get_partitions(db: Session, job_id: int) -> List[models.ImportJobPartition]:
+    # populate_existing: ה-session של ה-worker רץ עם expire_on_commit=False, כך שמחיצות
+    # שכבר טעונות בו (למשל זו שהוא עצמו עיבד) עלולות להחזיק סטטוס ישן
+    return (
+        db.query(models.ImportJobPartition)
+        .populate_existing()
+        .filter(models.ImportJobPartition.job_id == job_id)
+        .order_by(models.ImportJobPartition.start_row.asc())
+        .all()
+    )
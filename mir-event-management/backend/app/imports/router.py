@@ -1,37 +1,36 @@
 import os
 import shutil
+import uuid
 from typing import Optional
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from app.auth.dependencies import get_current_user
-from app.core.database import SessionLocal
-from app.imports import repository, schemas, service
+from app.core.database import get_db
+from app.imports import progress, repository, schemas, service
 from app.users import models as user_models
 
 
 router = APIRouter(prefix="/imports", tags=["Imports"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post("/", response_model=schemas.ImportJobOut)
 async def create_import_job(
     event_id: int = Form(...),
     file: UploadFile = File(...),
+    mode: str = Form("orm"),
     db=Depends(get_db),
     current_user: user_models.User = Depends(get_current_user),
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="קובץ חסר")
+    if mode not in service.IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"מצב ייבוא לא נתמך: {mode}")
 
     # שמירת קובץ
     os.makedirs("uploads/imports", exist_ok=True)
-    temp_path = os.path.join("uploads", "imports", file.filename)
+    # שם ייחודי - הקובץ נשאר בתור עד שה-worker יעבד אותו
+    temp_path = os.path.join("uploads", "imports", f"{uuid.uuid4().hex}_{os.path.basename(file.filename)}")
     with open(temp_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
@@ -40,12 +39,14 @@ async def create_import_job(
         schemas.ImportJobCreate(
             event_id=event_id,
             file_name=file.filename,
+            file_path=temp_path,
+            mode=mode,
             created_by=current_user.id if current_user else None,
         ),
     )
 
-    # משגר משימה ברקע
-    service.enqueue_import_job(job.id, event_id, temp_path, current_user.id if current_user else None)
+    # מעיר את ה-workers (הג'וב כבר נשמר בתור)
+    service.notify_import_workers()
 
     return job
 
@@ -57,3 +58,25 @@ def get_import_job(job_id: int, db=Depends(get_db), current_user: user_models.Us
         raise HTTPException(status_code=404, detail="Import job not found")
     return job
 
+
+@router.get("/{job_id}/stream")
+def stream_import_job(
+    job_id: int,
+    db=Depends(get_db),
+    current_user: user_models.User = Depends(get_current_user),
+):
+    """
+    התקדמות ג'וב ייבוא ב-Server-Sent Events (במקום polling על GET /imports/{job_id}).
+    אירוע progress נשלח מיד עם המצב הנוכחי ואחר כך בכל שינוי, עד לסטטוס סופי.
+    """
+    job = repository.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    initial = jsonable_encoder(schemas.ImportJobOut.model_validate(job))
+    # ה-session משותף עם get_current_user - משחררים את החיבור לפני שהזרם נפתח לאורך זמן
+    db.close()
+    return StreamingResponse(
+        progress.stream_events(job_id, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -7,12 +7,14 @@ class ImportJobBase(BaseModel):
     id: int
     event_id: int
     file_name: str
+    mode: Optional[str] = None
     status: str
     total_rows: int
     processed_rows: int
     success_count: int
     error_count: int
     error_log_path: Optional[str] = None
+    partition_count: Optional[int] = None
     started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
     created_at: Optional[datetime] = None
@@ -25,6 +27,8 @@ class ImportJobBase(BaseModel):
 class ImportJobCreate(BaseModel):
     event_id: int
     file_name: str
+    file_path: Optional[str] = None
+    mode: str = "orm"
     created_by: Optional[int] = None
 
 
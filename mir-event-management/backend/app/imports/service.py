@@ -1,22 +1,24 @@
 import csv
+import itertools
 import os
-import tempfile
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, List, Dict, Any, Set
+import re
+from datetime import date, datetime
+from typing import Optional, List, Dict, Any, Set, Callable, Sequence, Tuple
 
-import pandas as pd
-from sqlalchemy import func, or_
 from sqlalchemy.exc import IntegrityError
 
-from app.core.database import SessionLocal
-from app.imports import repository
+from app.core.config import settings
+from app.imports import progress, readers, repository
+from app.imports.matching import GuestMatchIndex, ImportRowResolver
 from app.guests import models as guest_models
 from app.guests import repository as guests_repo
 from app.tableStructure import repository as table_structure_repo
 
-# Executor קטן לעיבוד ברקע
-executor = ThreadPoolExecutor(max_workers=2)
+# מצבי ייבוא: orm - המסלול הרגיל, bulk - COPY + upsert (PostgreSQL בלבד)
+IMPORT_MODES = ("orm", "bulk")
+
+# עמודות ת"ז לפי סדר עדיפות (אחרי _clean_key)
+ID_PRIORITY_KEYS = ["ת.ז./ח.פ.", "מזהה", "מזהה יבוא", "תעודת זהות", "id_number", "ת.ז", "תז", "מספר זהות"]
 
 
 def _safe_update(db, job_id: int, **kwargs):
@@ -26,189 +28,310 @@ def _safe_update(db, job_id: int, **kwargs):
         print(f"[import-job] failed to update job {job_id}: {e}")
 
 
-def _process_file(job_id: int, event_id: int, file_path: str, created_by: Optional[int] = None, batch_size: int = 500):
-    db = SessionLocal()
+def _remove_job_files(file_path: Optional[str]) -> None:
+    """
+    מחיקת הקובץ שהועלה וקבצי העזר של התכנון כשהג'וב מגיע לסטטוס סופי (הצליח או נכשל) -
+    uploads/imports נגיש דרך /uploads, והקובץ מכיל את פרטי המוזמנים
+    """
+    if not file_path:
+        return
+    readers.remove_spool(file_path)
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(f"[import-job] failed to remove {file_path}: {e}")
+
+
+def _fail_job(db, job_id: int, file_path: Optional[str] = None):
+    finished_at = datetime.utcnow()
+    _safe_update(db, job_id, status="failed", finished_at=finished_at)
+    progress.store.publish_job(job_id, status="failed", finished_at=finished_at.isoformat())
+    _remove_job_files(file_path)
+
+
+def _select_batch_processor(db, mode: str):
+    if mode == "bulk":
+        from app.imports import bulk
+        if bulk.is_supported(db):
+            return bulk.process_batch_bulk
+        print(f"[import-job] bulk mode requires PostgreSQL, using ORM path")
+    return _process_batch
+
+
+def _run_batch(process_batch, db, rows_buffer, event_id, job_id, batch_start_index, match_index, plan):
+    """מריץ באצ' אחד; כשל כללי של הבאצ' נרשם כשגיאה לכל השורות שבו"""
     try:
-        _safe_update(db, job_id, status="running", started_at=datetime.utcnow())
-
-        # המרה ל-CSV אם XLSX
-        work_path = file_path
-        cleanup_path = None
-        if file_path.lower().endswith((".xlsx", ".xls")):
-            # קרא את כל השורות, כולל שורות ריקות
-            # חשוב: na_values=[] ו-keep_default_na=False מונעים מ-pandas להפסיק לקרוא שורות ריקות
-            engine = 'openpyxl' if file_path.lower().endswith('.xlsx') else 'xlrd'
-            print(f"[import-job] Reading Excel file with engine={engine}")
-            df = pd.read_excel(file_path, engine=engine, keep_default_na=False, na_values=[])
-            print(f"[import-job] Excel file read: {len(df)} rows, {len(df.columns)} columns")
-            cleanup_path = tempfile.NamedTemporaryFile(delete=False, suffix=".csv").name
-            df.to_csv(cleanup_path, index=False, na_rep='')
-            print(f"[import-job] CSV saved to {cleanup_path}")
-            work_path = cleanup_path
-
-        total_rows = 0
-        processed_rows = 0
-        success_count = 0
-        error_count = 0
+        return process_batch(db, rows_buffer, event_id, job_id, batch_start_index, match_index, plan)
+    except Exception as batch_e:
+        import traceback
+        print(f"[import-job] Batch at row {batch_start_index} failed: {batch_e}\n{traceback.format_exc()}")
         errors = []
+        for values in rows_buffer:
+            row = plan.row_dict(values)
+            errors.append({
+                "first_name": row.get("שם", row.get("first_name", "")),
+                "last_name": row.get("שם משפחה", row.get("last_name", "")),
+                "error": f"Batch processing failed: {str(batch_e)}"
+            })
+        return 0, len(rows_buffer), errors
 
-        # קרא את כל השורות קודם כדי לדעת כמה יש
-        print(f"[import-job] Starting to read file: {work_path}")
-        all_rows = []
-        try:
-            with open(work_path, "r", encoding="utf-8", newline="") as f:
-                reader = csv.DictReader(f)
-                print(f"[import-job] Reading CSV file...")
-                all_rows = list(reader)
-                total_rows = len(all_rows)
-                print(f"[import-job] Read {total_rows} rows from file")
-        except UnicodeDecodeError:
-            # נסה עם encoding אחר
-            print(f"[import-job] UTF-8 failed, trying UTF-8-sig...")
-            try:
-                with open(work_path, "r", encoding="utf-8-sig", newline="") as f:
-                    reader = csv.DictReader(f)
-                    all_rows = list(reader)
-                    total_rows = len(all_rows)
-                    print(f"[import-job] Read {total_rows} rows from file (UTF-8-sig)")
-            except Exception as e:
-                print(f"[import-job] failed to read file {work_path}: {e}")
-                raise
-        except Exception as e:
-            print(f"[import-job] failed to read file {work_path}: {e}")
-            raise
 
-        # עדכן את total_rows מיד
+def _resolve_file_rows(file_path: str, column_names: List[str], event_id: int, job_id: int):
+    """
+    מעבר התכנון על הקובץ עם התאמת השורות זו לזו (ImportRowResolver). מחזיר
+    (total_rows, offsets) של readers.plan_partitions; ה-id_number שנקבעו נשמרים ליד הקובץ
+    """
+    plan = ColumnPlan(column_names)
+    resolver = ImportRowResolver()
+
+    def visit(row_no: int, values: tuple) -> None:
+        id_number_norm, _ = _id_number_norm(plan.id_number_raw(values))
+        resolver.add(
+            row_no,
+            id_number_norm,
+            plan.first_value(values, plan.first_name_idx),
+            plan.first_value(values, plan.last_name_idx),
+            plan.first_value(values, plan.phone_idx),
+            plan.first_value(values, plan.email_idx),
+        )
+
+    total_rows, offsets = readers.plan_partitions(file_path, settings.IMPORT_PARTITION_ROWS, visit)
+    resolved_ids = resolver.resolved_ids(event_id, job_id)
+    readers.write_resolved_ids(file_path, resolved_ids)
+    print(f"[import-job] job {job_id}: {len(resolved_ids)} rows without id_number matched to other rows of the file")
+    return total_rows, offsets
+
+
+def plan_job(db, job, worker_id: str) -> None:
+    """
+    שלב התכנון של ג'וב: קריאת כותרות, ספירת שורות, עדכון מבנה הטבלה
+    וחלוקת הקובץ למחיצות. המחיצות מעובדות במקביל - גם של אותו ג'וב: שורות בלי ת"ז
+    שמתאימות זו לזו מקבלות כאן id_number משותף, ומחיצות שיוצרות אותו מוזמן מתמזגות
+    על המפתח הייחודי (event_id, id_number).
+    """
+    job_id = job.id
+    file_path = job.file_path
+    try:
+        if job.attempts > settings.IMPORT_MAX_ATTEMPTS:
+            print(f"[import-job] job {job_id} exceeded {settings.IMPORT_MAX_ATTEMPTS} planning attempts, marking as failed")
+            _fail_job(db, job_id, file_path)
+            return
+        if not file_path or not os.path.exists(file_path):
+            print(f"[import-job] job {job_id}: file {file_path} not found, marking as failed")
+            _fail_job(db, job_id, file_path)
+            return
+
+        # הקובץ נקרא בסטרימינג (CSV עצל / openpyxl read_only) - הכותרות, ומעבר אחד שסופר את
+        # השורות, מחזיר לכל מחיצה offset לתחילתה (ב-Excel גם כותב את קובץ ה-spool)
+        # ומתאים את השורות בלי ת"ז לשאר שורות הקובץ
+        print(f"[import-job] Planning job {job_id} ({worker_id}): {file_path}")
+        column_names = readers.read_header(file_path)
+        total_rows, offsets = _resolve_file_rows(file_path, column_names, job.event_id, job_id)
+        print(f"[import-job] File has {len(column_names)} columns, ~{total_rows} rows")
+
         if total_rows == 0:
             print(f"[import-job] File is empty, marking as failed")
-            _safe_update(db, job_id, status="failed", finished_at=datetime.utcnow())
+            _fail_job(db, job_id, file_path)
             return
 
         # עדכן את מבנה הטבלה הגלובלי לפי העמודות של הקובץ
-        if all_rows:
-            column_names = list(all_rows[0].keys())  # שמות העמודות מהקובץ
+        if column_names:
             base_fields = ["id", "table_head_id", "confirmed_arrival"]
             print(f"[import-job] Updating global table structure with {len(column_names)} columns")
             try:
                 table_structure_repo.update_table_structure_from_columns(db, column_names, base_fields)
                 print(f"[import-job] Global table structure updated successfully")
             except Exception as e:
+                db.rollback()
                 print(f"[import-job] Warning: Failed to update table structure: {e}")
 
-        print(f"[import-job] Updating job {job_id} with total_rows={total_rows}")
-        _safe_update(db, job_id, total_rows=total_rows)
-        print(f"[import-job] Starting to process {total_rows} rows in batches of {batch_size}")
+        partitions = repository.create_partitions(db, job_id, total_rows, settings.IMPORT_PARTITION_ROWS, offsets)
+        progress.store.publish_job(job_id, status="running", total_rows=total_rows, partition_count=len(partitions))
+        print(f"[import-job] job {job_id} split into {len(partitions)} partitions of up to {settings.IMPORT_PARTITION_ROWS} rows")
+    except Exception as e:
+        import traceback
+        print(f"[import-job] planning job {job_id} failed: {e}\n{traceback.format_exc()}")
+        db.rollback()
+        if job.attempts >= settings.IMPORT_MAX_ATTEMPTS:
+            _fail_job(db, job_id, file_path)
+        else:
+            # משחרר את ה-lease כדי ש-worker (זה או אחר) ינסה שוב
+            repository.release_job_lease(db, job_id, worker_id)
 
-        # עבד את השורות בבאצ'ים
-        rows_buffer = []
-        batch_count = 0
-        for idx, row in enumerate(all_rows):
-            rows_buffer.append(row)
 
-            if len(rows_buffer) >= batch_size:
-                batch_count += 1
-                print(f"[import-job] Processing batch {batch_count} ({len(rows_buffer)} rows)...")
-                try:
-                    ok, err, batch_errors = _process_batch(db, rows_buffer, event_id, job_id, processed_rows)
-                    processed_rows += len(rows_buffer)
-                    success_count += ok
-                    error_count += err
-                    errors.extend(batch_errors)
-                except Exception as batch_e:
-                    import traceback
-                    error_msg = f"[import-job] Batch {batch_count} failed: {batch_e}\n{traceback.format_exc()}"
-                    print(error_msg)
-                    # Mark all rows in this batch as errors
-                    processed_rows += len(rows_buffer)
-                    error_count += len(rows_buffer)
-                    for row in rows_buffer:
-                        errors.append({
-                            "first_name": row.get("שם", row.get("first_name", "")),
-                            "last_name": row.get("שם משפחה", row.get("last_name", "")),
-                            "error": f"Batch processing failed: {str(batch_e)}"
-                        })
-                finally:
-                    rows_buffer = []
-                
-                # עדכן את הסטטוס אחרי כל batch
-                _safe_update(
-                    db,
-                    job_id,
-                    processed_rows=processed_rows,
-                    success_count=success_count,
-                    error_count=error_count,
-                )
-                print(f"[import-job] Batch {batch_count} completed: {processed_rows}/{total_rows} rows processed")
-            
-            # עדכן כל 100 שורות גם אם לא סיימנו batch (למעקב התקדמות)
-            if (idx + 1) % 100 == 0 and len(rows_buffer) < batch_size:
-                _safe_update(db, job_id, processed_rows=processed_rows)
+def process_partition(db, partition, worker_id: str, batch_size: int = 500) -> None:
+    """
+    עיבוד מחיצה אחת: השורות [start_row, end_row) נקראות מהקובץ בסטרימינג ומעובדות בבאצ'ים.
+    אחרי כל באצ' המונים מדווחים לערוץ ההתקדמות; ה-flush כותב אותם למסד ומאריך את ה-lease.
+    אם ה-lease אבד (worker אחר תפס) העיבוד נעצר.
+    """
+    partition_id = partition.id
+    job = repository.get_job(db, partition.job_id)
+    job_id = job.id
+    event_id = job.event_id
+    start = partition.start_row
+    end = partition.end_row
 
-        # שאריות
-        if rows_buffer:
-            try:
-                ok, err, batch_errors = _process_batch(db, rows_buffer, event_id, job_id, processed_rows)
-                processed_rows += len(rows_buffer)
-                success_count += ok
-                error_count += err
-                errors.extend(batch_errors)
-            except Exception as batch_e:
-                import traceback
-                error_msg = f"[import-job] Final batch failed: {batch_e}\n{traceback.format_exc()}"
-                print(error_msg)
-                # Mark all rows in this batch as errors
-                processed_rows += len(rows_buffer)
-                error_count += len(rows_buffer)
-                for row in rows_buffer:
-                    errors.append({
-                        "first_name": row.get("שם", row.get("first_name", "")),
-                        "last_name": row.get("שם משפחה", row.get("last_name", "")),
-                        "error": f"Batch processing failed: {str(batch_e)}"
-                    })
+    if partition.attempts > settings.IMPORT_MAX_ATTEMPTS:
+        print(f"[import-job] partition {partition_id} exceeded {settings.IMPORT_MAX_ATTEMPTS} attempts, marking as failed")
+        repository.finish_partition(db, partition_id, worker_id, status="failed")
+        finalize_job_if_complete(db, job_id)
+        return
+
+    processed_rows = 0
+    success_count = 0
+    error_count = 0
+    errors = []
+    try:
+        print(f"[import-job] job {job_id} partition {partition_id} ({worker_id}): rows {start}-{end if end is not None else 'EOF'}")
+        # טעינת מוזמני האירוע פעם אחת למחיצה - ההתאמה לשורות נעשית בזיכרון
+        match_index = GuestMatchIndex.load(db, event_id)
+        process_batch = _select_batch_processor(db, job.mode)
+        # מיפוי הכותרות לשדות נבנה פעם אחת; השורות נקראות כ-tuple לפי סדר הכותרות
+        plan = ColumnPlan(readers.read_header(job.file_path))
+        plan.resolved_ids = readers.read_resolved_ids(job.file_path, start, end)
+
+        if partition.start_offset is not None:
+            # קריאה מה-offset של המחיצה - בלי לעבור על השורות של המחיצות שלפניה
+            rows = readers.iter_records(job.file_path, offset=partition.start_offset)
+            if end is not None:
+                rows = itertools.islice(rows, end - start)
+        else:
+            rows = itertools.islice(readers.iter_records(job.file_path), start, end)
+        while True:
+            rows_buffer = list(itertools.islice(rows, batch_size))
+            if not rows_buffer:
+                break
+            ok, err, batch_errors = _run_batch(
+                process_batch, db, rows_buffer, event_id, job_id, start + processed_rows, match_index, plan
+            )
+            processed_rows += len(rows_buffer)
+            success_count += ok
+            error_count += err
+            errors.extend(batch_errors)
+
+            progress.store.report_partition(
+                job_id,
+                partition_id,
+                worker_id,
+                processed_rows=processed_rows,
+                success_count=success_count,
+                error_count=error_count,
+            )
+            if progress.store.is_lost(partition_id):
+                print(f"[import-job] partition {partition_id}: lease lost, stopping ({worker_id})")
+                return
+            print(f"[import-job] partition {partition_id}: {processed_rows} rows processed")
 
         error_log_path = None
         if errors:
             os.makedirs("uploads/imports", exist_ok=True)
-            error_log_path = os.path.join("uploads", "imports", f"import_job_{job_id}_errors.csv")
+            error_log_path = os.path.join("uploads", "imports", f"import_job_{job_id}_part_{partition_id}_errors.csv")
             _write_errors_csv(error_log_path, errors)
 
-        status = "success" if error_count == 0 else "partial"
-        _safe_update(
+        # המונים הסופיים נכתבים ישירות, לפני סגירת המחיצה
+        progress.store.end_partition(partition_id)
+        repository.heartbeat_partition(
             db,
-            job_id,
-            status=status,
-            total_rows=total_rows,
+            partition_id,
+            worker_id,
+            settings.IMPORT_LEASE_SECONDS,
             processed_rows=processed_rows,
             success_count=success_count,
             error_count=error_count,
-            error_log_path=error_log_path,
-            finished_at=datetime.utcnow(),
         )
+        if repository.finish_partition(db, partition_id, worker_id, status="done", error_log_path=error_log_path):
+            repository.refresh_job_counters(db, job_id)
+            finalize_job_if_complete(db, job_id)
     except Exception as e:
         import traceback
-        error_msg = f"[import-job] job {job_id} failed: {e}\n{traceback.format_exc()}"
-        print(error_msg)
-        try:
-            _safe_update(
-                db,
-                job_id,
-                status="failed",
-                total_rows=total_rows if 'total_rows' in locals() else 0,
-                processed_rows=processed_rows if 'processed_rows' in locals() else 0,
-                success_count=success_count if 'success_count' in locals() else 0,
-                error_count=error_count if 'error_count' in locals() else 0,
-                error_log_path=None,
-                finished_at=datetime.utcnow(),
-            )
-        except Exception as update_error:
-            print(f"[import-job] failed to update job {job_id} status: {update_error}")
+        print(f"[import-job] partition {partition_id} failed: {e}\n{traceback.format_exc()}")
+        db.rollback()
+        if partition.attempts >= settings.IMPORT_MAX_ATTEMPTS:
+            if repository.finish_partition(db, partition_id, worker_id, status="failed"):
+                finalize_job_if_complete(db, job_id)
+        else:
+            repository.release_partition(db, partition_id, worker_id)
     finally:
-        db.close()
-        if cleanup_path and os.path.exists(cleanup_path):
+        progress.store.end_partition(partition_id)
+
+
+def finalize_job_if_complete(db, job_id: int) -> None:
+    """
+    נקרא אחרי סיום כל מחיצה. כשכל המחיצות הסתיימו - מאחד את קבצי השגיאות, קובע את
+    סטטוס הג'וב ומוחק את הקובץ שהועלה. הנעילה על הג'וב מבטיחה שרק worker אחד יסגור אותו.
+    """
+    job = repository.lock_job(db, job_id)
+    if not job or job.status != "running":
+        db.rollback()
+        return
+    partitions = repository.get_partitions(db, job_id)
+    if not partitions or any(p.status not in ("done", "failed") for p in partitions):
+        db.rollback()
+        return
+
+    errors = []
+    for p in partitions:
+        if p.error_log_path and os.path.exists(p.error_log_path):
+            with open(p.error_log_path, "r", encoding="utf-8", newline="") as f:
+                errors.extend(csv.DictReader(f))
+    error_log_path = None
+    if errors:
+        error_log_path = os.path.join("uploads", "imports", f"import_job_{job_id}_errors.csv")
+        _write_errors_csv(error_log_path, errors)
+
+    processed_rows = sum(p.processed_rows for p in partitions)
+    success_count = sum(p.success_count for p in partitions)
+    error_count = sum(p.error_count for p in partitions)
+    failed_partitions = sum(1 for p in partitions if p.status == "failed")
+
+    if failed_partitions:
+        status = "partial" if success_count else "failed"
+    else:
+        status = "success" if error_count == 0 else "partial"
+        # total_rows נספר בשלב התכנון - בסיום מעדכנים לספירה בפועל
+        job.total_rows = processed_rows
+
+    job.status = status
+    job.processed_rows = processed_rows
+    job.success_count = success_count
+    job.error_count = error_count
+    job.error_log_path = error_log_path
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    progress.store.publish_job(
+        job_id,
+        status=status,
+        total_rows=job.total_rows,
+        processed_rows=processed_rows,
+        success_count=success_count,
+        error_count=error_count,
+        error_log_path=error_log_path,
+        finished_at=job.finished_at.isoformat(),
+    )
+
+    for p in partitions:
+        if p.error_log_path and os.path.exists(p.error_log_path):
             try:
-                os.remove(cleanup_path)
-            except Exception:
+                os.remove(p.error_log_path)
+            except OSError:
                 pass
+    _remove_job_files(job.file_path)
+    print(f"[import-job] job {job_id} finished: {status} ({success_count} ok, {error_count} errors, {failed_partitions} failed partitions)")
+
+
+def _id_number_norm(id_number_raw: Optional[str]) -> Tuple[str, bool]:
+    """
+    ת"ז מנורמלת (ספרות בלבד) מהערך בקובץ, ו-looks_like_uuid.
+    "" כשאין ת"ז תקינה: ריק, "-", UUID (מקפים ואותיות) או בלי ספרות - שורה כזו מקבלת TEMP ID
+    """
+    if not id_number_raw or id_number_raw == "-":
+        return "", False
+    # UUID pattern: contains dashes and letters (e.g., "e1dd5f10-a22a-4c6f-9493-4cc279adfa95")
+    if "-" in id_number_raw and any(c.isalpha() for c in id_number_raw):
+        return "", True
+    return re.sub(r'[^0-9]', '', id_number_raw), False
 
 
 def _normalize_id(raw: str) -> str:
@@ -559,58 +682,50 @@ def _get_all_field_mappings() -> Dict[str, str]:
     }
 
 
-def _get_field_value(row: Dict[str, Any], possible_keys: List[str]) -> str:
-    """מחפש ערך בעמודה עם כמה אפשרויות של שמות"""
-    for key in possible_keys:
-        # נסה עם השם המדויק
-        if key in row:
-            val = str(row[key] or "").strip()
-            if val:
-                return val
-        # נסה עם trim (למקרה שיש רווחים מיותרים)
-        for row_key in row.keys():
-            if row_key.strip() == key.strip():
-                val = str(row[row_key] or "").strip()
-                if val:
-                    return val
-    return ""
+def _get_fallback_base_map(guest_model_fields: Dict[str, Any]) -> Dict[str, str]:
+    """Fallback base map - hardcoded mapping for basic fields (Hebrew -> DB field)"""
+    fallback_base_map = {
+        "שם פרטי": "first_name",
+        "שם משפחה": "last_name",
+        "מספר נייד": "mobile_phone",  # תיקון: mobile_phone הוא השדה הקיים במודל
+        "אימייל": "email",
+        "מייל": "email",
+        "עיר": "city",
+        "רחוב": "street",
+        "ת.ז./ח.פ.": "id_number",
+        "תז": "id_number",
+        "ת.ז": "id_number",
+        "מזהה": "id_number",
+        "מזהה יבוא": "id_number",
+    }
+    
+    # Add optional fields only if they exist in the model
+    if "home_phone" in guest_model_fields:
+        fallback_base_map["טלפון בית"] = "home_phone"
+        fallback_base_map["טלפון_בית"] = "home_phone"  # גם עם קו תחתון
+    if "alt_phone_1" in guest_model_fields:
+        fallback_base_map["טלפון נוסף"] = "alt_phone_1"
+    if "alt_phone_2" in guest_model_fields:
+        fallback_base_map["טלפון נוסף 2"] = "alt_phone_2"
+    if "building_number" in guest_model_fields:
+        fallback_base_map["מספר בניין"] = "building_number"
+    if "postal_code" in guest_model_fields:
+        fallback_base_map["מיקוד"] = "postal_code"
+    elif "zip_code" in guest_model_fields:
+        fallback_base_map["מיקוד"] = "zip_code"
+    if "manager_personal_number" in guest_model_fields:
+        fallback_base_map["מספר אישי מניג'ר"] = "manager_personal_number"
+        fallback_base_map["מספר אישי מניגר"] = "manager_personal_number"  # גרסה ללא גרש (אחרי _clean_key)
+    if "card_id" in guest_model_fields:
+        fallback_base_map["CardID"] = "card_id"
+    if "account_number" in guest_model_fields:
+        fallback_base_map["מספר חשבון"] = "account_number"
+    return fallback_base_map
 
 
 def _convert_value(value: Any, field_type: type) -> Any:
     """המרת ערך לפי סוג השדה"""
-    if value is None or (isinstance(value, str) and not value.strip()):
-        return None
-    
-    if field_type == bool:
-        val_str = str(value).strip().lower()
-        return val_str in ["true", "1", "yes", "כן", "יש", "✓"]
-    elif field_type == int:
-        try:
-            return int(float(str(value).replace(",", "").strip()))
-        except (ValueError, TypeError):
-            return None
-    elif field_type == datetime:
-        # If value is already a datetime object, return as-is
-        if isinstance(value, datetime):
-            return value
-        # If value is a date object, convert to datetime
-        from datetime import date
-        if isinstance(value, date) and not isinstance(value, datetime):
-            return datetime.combine(value, datetime.min.time())
-        # Try parsing string formats
-        try:
-            val_str = str(value).strip()
-            for fmt in ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"]:
-                try:
-                    return datetime.strptime(val_str, fmt)
-                except ValueError:
-                    continue
-            return None
-        except (ValueError, TypeError):
-            return None
-    else:
-        result = str(value).strip() if value is not None else None
-        return result if result else None
+    return _get_converter(field_type)(value)
 
 
 def _clean_key(key: str) -> str:
@@ -619,7 +734,6 @@ def _clean_key(key: str) -> str:
     """
     if not key:
         return ""
-    import re
     # Strip whitespace
     cleaned = key.strip()
     # Remove BOM if exists
@@ -632,26 +746,179 @@ def _clean_key(key: str) -> str:
     return cleaned.strip()
 
 
-def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, batch_start_index: int = 0):
+# עמודות החיפוש של השדות המרכזיים (אחרי _clean_key), לפי סדר עדיפות
+FIRST_NAME_KEYS = ["שם", "first_name", "שם פרטי", "שם_פרטי"]
+LAST_NAME_KEYS = ["שם משפחה", "last_name", "שם_משפחה"]
+GENDER_KEYS = ["gender", "מגדר", "מין"]
+PHONE_KEYS = ["טלפון", "phone", "טלפון נייד", "מספר טלפון", "מספר נייד"]
+EMAIL_KEYS = ["אימייל", "email", "מייל", "דואר אלקטרוני"]
+
+_TRUE_VALUES = frozenset(["true", "1", "yes", "כן", "יש", "✓"])
+_DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"]
+
+
+def _convert_bool(value: Any) -> Any:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return str(value).strip().lower() in _TRUE_VALUES
+
+
+def _convert_int(value: Any) -> Any:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        return int(float(str(value).replace(",", "").strip()))
+    except (ValueError, TypeError):
+        return None
+
+
+def _convert_datetime(value: Any) -> Any:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    # If value is already a datetime object, return as-is
+    if isinstance(value, datetime):
+        return value
+    # If value is a date object, convert to datetime
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    # Try parsing string formats
+    val_str = str(value).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(val_str, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _convert_str(value: Any) -> Any:
+    if value is None:
+        return None
+    result = str(value).strip()
+    return result if result else None
+
+
+def _get_converter(field_type: type) -> Callable[[Any], Any]:
+    """ממיר ייעודי לסוג השדה - נבחר פעם אחת לכל עמודה ולא לכל ערך"""
+    if field_type == bool:
+        return _convert_bool
+    if field_type == int:
+        return _convert_int
+    if field_type == datetime:
+        return _convert_datetime
+    return _convert_str
+
+
+def _column_python_type(col) -> type:
+    try:
+        return col.type.python_type
+    except (AttributeError, NotImplementedError):
+        return str
+
+
+class ColumnPlan:
+    """
+    תוכנית מיפוי עמודות לקובץ ייבוא - נבנית פעם אחת מהכותרות.
+    כל שורה מגיעה כ-tuple לפי סדר הכותרות, כך שהעבודה לשורה היא גישה לפי אינדקס:
+    base_columns - (אינדקס, שדה בטבלת guests, ממיר), dynamic_columns - (אינדקס, שם שדה דינמי).
+    """
+
+    def __init__(self, header: Sequence[Any]):
+        self.header = list(header)
+        self.guest_model_fields = {col.name: col for col in guest_models.Guest.__table__.columns}
+        field_mappings = _get_all_field_mappings()
+        fallback_base_map = _get_fallback_base_map(self.guest_model_fields)
+
+        # כותרת מנורמלת -> אינדקס; כמו ב-dict, כותרת כפולה - העמודה האחרונה קובעת
+        index: Dict[str, int] = {}
+        for i, raw in enumerate(self.header):
+            key = _clean_key(str(raw)) if raw else ""
+            if key:
+                index[key] = i
+        self.columns: List[Tuple[str, int]] = list(index.items())
+
+        self.base_columns: List[Tuple[int, str, Callable[[Any], Any]]] = []
+        self.dynamic_columns: List[Tuple[int, str]] = []
+        for key, i in self.columns:
+            db_field_name = fallback_base_map.get(key) or field_mappings.get(key)
+            if db_field_name and db_field_name in self.guest_model_fields:
+                field_type = _column_python_type(self.guest_model_fields[db_field_name])
+                self.base_columns.append((i, db_field_name, _get_converter(field_type)))
+            elif not db_field_name:
+                self.dynamic_columns.append((i, key))
+
+        self.first_name_idx = [index[k] for k in FIRST_NAME_KEYS if k in index]
+        self.last_name_idx = [index[k] for k in LAST_NAME_KEYS if k in index]
+        self.gender_idx = [index[k] for k in GENDER_KEYS if k in index]
+        self.phone_idx = [index[k] for k in PHONE_KEYS if k in index]
+        self.email_idx = [index[k] for k in EMAIL_KEYS if k in index]
+        self.id_idx = [index[k] for k in ID_PRIORITY_KEYS if k in index]
+        # מספר שורה גלובלי -> id_number שנקבע בשלב התכנון לשורות בלי ת"ז (readers.read_resolved_ids)
+        self.resolved_ids: Dict[int, str] = {}
+
+        mapped = ", ".join(f"{self.header[i]!s}->{name}" for i, name, _ in self.base_columns)
+        print(f"[import-job] ColumnPlan: {len(self.base_columns)} base columns ({mapped}), {len(self.dynamic_columns)} dynamic columns")
+
+    @classmethod
+    def from_dicts(cls, rows: List[Dict[str, Any]]) -> Tuple["ColumnPlan", List[tuple]]:
+        """לקריאות ישירות עם שורות dict - בונה תוכנית מאיחוד המפתחות וממיר את השורות ל-tuple"""
+        header: Dict[str, None] = {}
+        for row in rows:
+            for k in row.keys():
+                if k:
+                    header.setdefault(k, None)
+        keys = list(header)
+        return cls(keys), [tuple(row.get(k, "") for k in keys) for row in rows]
+
+    @staticmethod
+    def first_value(values: tuple, indices: List[int]) -> str:
+        """הערך הלא-ריק הראשון מבין העמודות האפשריות (במקום _get_field_value)"""
+        for i in indices:
+            val = str(values[i] or "").strip()
+            if val:
+                return val
+        return ""
+
+    def id_number_raw(self, values: tuple) -> Optional[str]:
+        # "-" נחשב ריק (ת"ז לא תקינה) - גורם לשגיאות מפתח כפול
+        for i in self.id_idx:
+            val = str(values[i] or "").strip()
+            if val and val != "-":
+                return val
+        return None
+
+    def row_dict(self, values: tuple) -> Dict[str, Any]:
+        """השורה כ-dict לפי כותרות מנורמלות (לקובץ השגיאות)"""
+        return {key: values[i] for key, i in self.columns}
+
+
+def _process_batch(
+    db,
+    rows: List[Dict[str, Any]],
+    event_id: int,
+    job_id: int,
+    batch_start_index: int = 0,
+    match_index: Optional[GuestMatchIndex] = None,
+    plan: Optional[ColumnPlan] = None,
+):
     """
     ולידציה בסיסית + יצירה/עדכון אורחים בבאץ' + כל השדות מהקובץ.
     משתמש במיפוי מלא של כל השדות בטבלת guests.
     
     Args:
         db: Database session
-        rows: List of row dictionaries
+        rows: List of row tuples (aligned with plan.header), or row dictionaries when plan is None
         event_id: Event ID
         job_id: Import job ID (for TEMP ID generation)
         batch_start_index: Global row index of first row in this batch (for TEMP ID uniqueness)
+        match_index: In-memory index of the event's guests, shared across the job's batches
+        plan: Column plan compiled once per file from its header
     """
     print(f"[import-job] _process_batch: Processing {len(rows)} rows for event {event_id}, job {job_id}, batch_start_index {batch_start_index}")
     
-    # Normalize all row keys first
-    rows_cleaned = []
-    for row in rows:
-        row_clean = {_clean_key(k): v for k, v in row.items() if k}
-        rows_cleaned.append(row_clean)
-    rows = rows_cleaned
+    # קריאה ישירה עם שורות dict - בונים תוכנית מהמפתחות
+    if plan is None:
+        plan, rows = ColumnPlan.from_dicts(rows)
     ok = 0  # Will be computed after successful commit
     err = 0
     errors: List[Dict[str, Any]] = []
@@ -667,151 +934,13 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
     skipped_missing_id_count = 0
     temp_id_generated_count = 0  # Track TEMP ID generation
 
-    # טען את המיפוי המלא
-    field_mappings = _get_all_field_mappings()
-    print(f"[import-job] _process_batch: Loaded field mappings")
-    
-    # קבל את כל שמות השדות בטבלת Guest (needed for fallback_base_map)
-    guest_model_fields = {col.name: col for col in guest_models.Guest.__table__.columns}
-    
-    # Fallback base map - hardcoded mapping for basic fields (Hebrew -> DB field)
-    fallback_base_map = {
-        "שם פרטי": "first_name",
-        "שם משפחה": "last_name",
-        "מספר נייד": "mobile_phone",  # תיקון: mobile_phone הוא השדה הקיים במודל
-        "אימייל": "email",
-        "מייל": "email",
-        "עיר": "city",
-        "רחוב": "street",
-        "ת.ז./ח.פ.": "id_number",
-        "תז": "id_number",
-        "ת.ז": "id_number",
-        "מזהה": "id_number",
-        "מזהה יבוא": "id_number",
-    }
-    
-    # Add optional fields only if they exist in the model
-    if "home_phone" in guest_model_fields:
-        fallback_base_map["טלפון בית"] = "home_phone"
-        fallback_base_map["טלפון_בית"] = "home_phone"  # גם עם קו תחתון
-    if "alt_phone_1" in guest_model_fields:
-        fallback_base_map["טלפון נוסף"] = "alt_phone_1"
-    if "alt_phone_2" in guest_model_fields:
-        fallback_base_map["טלפון נוסף 2"] = "alt_phone_2"
-    if "building_number" in guest_model_fields:
-        fallback_base_map["מספר בניין"] = "building_number"
-    if "postal_code" in guest_model_fields:
-        fallback_base_map["מיקוד"] = "postal_code"
-    elif "zip_code" in guest_model_fields:
-        fallback_base_map["מיקוד"] = "zip_code"
-    if "manager_personal_number" in guest_model_fields:
-        fallback_base_map["מספר אישי מניג'ר"] = "manager_personal_number"
-        fallback_base_map["מספר אישי מניגר"] = "manager_personal_number"  # גרסה ללא גרש (אחרי _clean_key)
-    if "card_id" in guest_model_fields:
-        fallback_base_map["CardID"] = "card_id"
-    if "account_number" in guest_model_fields:
-        fallback_base_map["מספר חשבון"] = "account_number"
-    
-    # מפה לקיצוץ חיפושים
-    existing_by_id: Dict[str, guest_models.Guest] = {}
+    guest_model_fields = plan.guest_model_fields
+
     custom_fields_cache: Dict[str, guest_models.GuestCustomField] = {}
 
-    # נבנה סט מזהים נדרשים בבאץ' - כולל גם normalized וגם raw IDs
-    needed_ids_normalized: Set[str] = set()
-    needed_ids_raw: Set[str] = set()
-    
-    for row in rows:
-        # Find id_number with priority order (using cleaned keys)
-        id_number_raw = None
-        id_priority_keys = ["ת.ז./ח.פ.", "מזהה", "מזהה יבוא", "תעודת זהות", "id_number", "ת.ז", "תז", "מספר זהות"]
-        for key in id_priority_keys:
-            if key in row:
-                val = str(row[key] or "").strip()
-                # Treat "-" as empty (invalid ID) - same logic as in row processing
-                if val and val != "-":
-                    id_number_raw = val
-                    break
-        
-        if id_number_raw:
-            needed_ids_raw.add(id_number_raw)
-            # Normalize id_number - keep only digits
-            import re
-            norm = re.sub(r'[^0-9]', '', id_number_raw)
-            if norm:
-                needed_ids_normalized.add(norm)
-
-    # Query existing guests by both normalized and raw IDs
-    if needed_ids_normalized or needed_ids_raw:
-        print(f"[import-job] _process_batch: Querying existing guests (normalized: {len(needed_ids_normalized)}, raw: {len(needed_ids_raw)})")
-        
-        # Detect database dialect for cross-db compatibility
-        dialect = db.bind.dialect.name if db.bind else ""
-        
-        # Build OR condition for both normalized and raw IDs
-        conditions = []
-        
-        # Always query by raw IDs (works on both SQLite and Postgres)
-        if needed_ids_raw:
-            conditions.append(guest_models.Guest.id_number.in_(list(needed_ids_raw)))
-        
-        # Only use regexp_replace on Postgres (SQLite doesn't support it)
-        if needed_ids_normalized and dialect in ("postgresql", "postgres"):
-            conditions.append(
-                func.regexp_replace(guest_models.Guest.id_number, '[^0-9]', '', 'g').in_(list(needed_ids_normalized))
-            )
-        
-        existing = []
-        if conditions:
-            existing = (
-                db.query(guest_models.Guest)
-                .filter(guest_models.Guest.event_id == event_id)
-                .filter(or_(*conditions))
-                .all()
-            )
-        
-        # For SQLite, also fetch guests that might match after normalization in Python
-        # Since SQLite doesn't support regexp_replace, we need to filter in Python
-        if needed_ids_normalized and dialect not in ("postgresql", "postgres"):
-            # Only fetch guests that weren't already found by raw ID match
-            existing_ids = {g.id for g in existing}
-            # Fetch additional guests that might match after normalization
-            # We check guests with id_number that contains digits
-            query = (
-                db.query(guest_models.Guest)
-                .filter(guest_models.Guest.event_id == event_id)
-                .filter(guest_models.Guest.id_number.isnot(None))
-            )
-            # Exclude already found guests
-            if existing_ids:
-                query = query.filter(~guest_models.Guest.id.in_(list(existing_ids)))
-            
-            additional_guests = query.all()
-            
-            # Filter by normalized IDs in Python
-            for g in additional_guests:
-                if g.id_number:
-                    norm_key = _normalize_id(g.id_number)
-                    if norm_key in needed_ids_normalized:
-                        existing.append(g)
-                        existing_ids.add(g.id)
-        
-        found_existing_count = len(existing)
-        print(f"[import-job] _process_batch: Found {found_existing_count} existing guests (dialect: {dialect})")
-        
-        # Map by both normalized and raw ID
-        # NOTE: Don't map guests with invalid IDs (like "-") to prevent matching new rows with TEMP IDs
-        for g in existing:
-            if g.id_number:
-                # Skip mapping for invalid IDs (like "-" or empty) - these should get TEMP IDs
-                if g.id_number != "-" and g.id_number.strip():
-                    norm_key = _normalize_id(g.id_number)
-                    if norm_key:
-                        existing_by_id[norm_key] = g
-                    # Also map by raw ID (only if valid)
-                    existing_by_id[g.id_number] = g
-        
-        # Note: We no longer check for "-" because we always generate TEMP IDs for invalid IDs
-        # Old guests with id_number = "-" will be handled as separate guests (each gets its own TEMP ID)
+    # אינדקס ההתאמה נטען פעם אחת לכל ג'וב; קריאה ישירה לבאץ' בונה אותו כאן
+    if match_index is None:
+        match_index = GuestMatchIndex.load(db, event_id)
 
     new_objects = []
     existing_updated_list = []  # Track existing guests that need to be updated
@@ -825,47 +954,25 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
         processed_row_indices.add(row_index)
         try:
             # מצא שם פרטי, שם משפחה, מגדר
-            first = _get_field_value(row, ["שם", "first_name", "שם פרטי", "שם_פרטי"])
-            last = _get_field_value(row, ["שם משפחה", "last_name", "שם_משפחה"])
-            gender_raw = _get_field_value(row, ["gender", "מגדר", "מין"])
+            first = plan.first_value(row, plan.first_name_idx)
+            last = plan.first_value(row, plan.last_name_idx)
+            gender_raw = plan.first_value(row, plan.gender_idx)
             if gender_raw:
                 gender_raw = gender_raw.lower()
             gender = gender_raw if gender_raw in ["male", "female", "זכר", "נקבה", "גבר", "אשה"] else "male"
             
             # Find id_number with priority order
-            id_number_raw = None
-            id_priority_keys = ["ת.ז./ח.פ.", "מזהה", "מזהה יבוא", "תעודת זהות", "id_number", "ת.ז", "תז", "מספר זהות"]
-            for key in id_priority_keys:
-                if key in row:
-                    val = str(row[key] or "").strip()
-                    # Treat "-" as empty (invalid ID) - it will cause duplicate key errors
-                    if val and val != "-":
-                        id_number_raw = val
-                        break
+            id_number_raw = plan.id_number_raw(row)
             
             # Get phone and email for duplicate detection (before TEMP ID generation)
-            phone = _get_field_value(row, ["טלפון", "phone", "טלפון נייד", "מספר טלפון", "מספר נייד"])
-            email = _get_field_value(row, ["אימייל", "email", "מייל", "דואר אלקטרוני"])
+            phone = plan.first_value(row, plan.phone_idx)
+            email = plan.first_value(row, plan.email_idx)
             # Normalize phone and email for comparison
             phone_normalized = phone.strip() if phone else None
             email_normalized = email.strip().lower() if email else None
             
-            # Normalize id_number - keep only digits
-            import re
-            # Check if the raw ID looks like a UUID (contains dashes and letters) - these should get TEMP IDs
-            looks_like_uuid = False
-            if id_number_raw and id_number_raw != "-":
-                # UUID pattern: contains dashes and letters (e.g., "e1dd5f10-a22a-4c6f-9493-4cc279adfa95")
-                if "-" in id_number_raw and any(c.isalpha() for c in id_number_raw):
-                    looks_like_uuid = True
-                    id_number_norm = ""
-                else:
-                    id_number_norm = re.sub(r'[^0-9]', '', id_number_raw)
-                    # If normalization resulted in empty string (no digits), treat as missing ID
-                    if not id_number_norm:
-                        id_number_norm = ""
-            else:
-                id_number_norm = ""
+            # Normalize id_number - keep only digits; UUID-like IDs (dashes and letters) get TEMP IDs
+            id_number_norm, looks_like_uuid = _id_number_norm(id_number_raw)
 
             # Before generating TEMP ID, try to find existing guest by name + phone/email
             # This prevents duplicates when re-importing the same file
@@ -877,37 +984,18 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                 search_last = last if last and last != "ללא שם משפחה" else None
                 
                 if search_first and search_last and (phone_normalized or email_normalized):
-                    # Try to find existing guest by name + (phone OR email)
-                    query = db.query(guest_models.Guest).filter(
-                        guest_models.Guest.event_id == event_id,
-                        guest_models.Guest.first_name == search_first,
-                        guest_models.Guest.last_name == search_last
+                    # Try to find existing guest by name + (phone OR email) - mobile_phone/home_phone/email
+                    existing_by_name_match = match_index.by_name_and_contact(
+                        search_first, search_last, phone_normalized, email_normalized
                     )
-                    
-                    # Add phone OR email condition
-                    conditions = []
-                    if phone_normalized and phone_normalized != "-":
-                        # בדוק גם mobile_phone וגם home_phone (phone לא קיים במודל)
-                        conditions.append(
-                            or_(
-                                guest_models.Guest.mobile_phone == phone_normalized,
-                                guest_models.Guest.home_phone == phone_normalized
-                            )
-                        )
-                    if email_normalized and email_normalized != "-":
-                        conditions.append(guest_models.Guest.email == email_normalized)
-                    
-                    if conditions:
-                        query = query.filter(or_(*conditions))
-                        existing_by_name_match = query.first()
-                        if existing_by_name_match:
-                            # Found existing guest - don't create TEMP ID, we'll use the existing guest
-                            match_info = []
-                            if phone_normalized and phone_normalized != "-":
-                                match_info.append(f"phone={phone_normalized}")
-                            if email_normalized and email_normalized != "-":
-                                match_info.append(f"email={email_normalized}")
-                            print(f"[import-job] _process_batch: Found existing guest by name+phone/email for row {row_index}: {search_first} {search_last} ({', '.join(match_info)}) (existing id_number: {existing_by_name_match.id_number})")
+                    if existing_by_name_match:
+                        # Found existing guest - don't create TEMP ID, we'll use the existing guest
+                        match_info = []
+                        if phone_normalized and phone_normalized != "-":
+                            match_info.append(f"phone={phone_normalized}")
+                        if email_normalized and email_normalized != "-":
+                            match_info.append(f"email={email_normalized}")
+                        print(f"[import-job] _process_batch: Found existing guest by name+phone/email for row {row_index}: {search_first} {search_last} ({', '.join(match_info)}) (existing id_number: {existing_by_name_match.id_number})")
             
             # Generate TEMP ID if id_number is still missing or invalid
             # Cases: empty, "-", UUID format, or empty after normalization
@@ -916,8 +1004,10 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
             if (not id_number_norm or id_number_norm == "-" or (id_number_raw and id_number_raw == "-") or looks_like_uuid):
                 if not existing_by_name_match:
                     # Generate deterministic TEMP ID: TEMP-{event_id}-{job_id}-{global_row_index}
+                    # שורה שהותאמה בשלב התכנון לשורה אחרת בקובץ מקבלת את ה-id_number של הקבוצה
+                    # (גם אם השורה האחרת במחיצה אחרת)
                     global_row_index = batch_start_index + row_index
-                    id_number_norm = f"TEMP-{event_id}-{job_id}-{global_row_index}"
+                    id_number_norm = plan.resolved_ids.get(global_row_index) or f"TEMP-{event_id}-{job_id}-{global_row_index}"
                     temp_id_generated_count += 1
                     print(f"[import-job] _process_batch: Generated TEMP ID for row {row_index} (global {global_row_index}): {id_number_norm} (raw was: {id_number_raw}, looks_like_uuid: {looks_like_uuid})")
                     # After generating TEMP ID, id_number_raw is no longer relevant for lookup
@@ -944,11 +1034,10 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                 found_by_name_match = True
             # Otherwise, if we have a valid (non-TEMP) ID, try to find by ID
             elif not id_number_norm.startswith("TEMP-"):
-                # Try to find existing guest by normalized ID first
-                existing = existing_by_id.get(id_number_norm)
-                # If not found and we have a raw ID, try raw ID lookup
-                if not existing and id_number_raw:
-                    existing = existing_by_id.get(id_number_raw)
+                # Try to find existing guest by normalized ID first, then by raw ID
+                existing = match_index.by_id(id_number_norm, id_number_raw)
+                if existing:
+                    found_existing_count += 1
             
             # If still not found by ID, try to find by name+phone/email (even if we have valid ID)
             # This prevents duplicates when the same person appears with different IDs or missing ID
@@ -957,40 +1046,21 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                 search_last = last if last and last != "ללא שם משפחה" else None
                 
                 if search_first and search_last and (phone_normalized or email_normalized):
-                    # Build query with name match and (phone OR email) match
-                    query = db.query(guest_models.Guest).filter(
-                        guest_models.Guest.event_id == event_id,
-                        guest_models.Guest.first_name == search_first,
-                        guest_models.Guest.last_name == search_last
+                    # Name match and (phone OR email) match
+                    existing = match_index.by_name_and_contact(
+                        search_first, search_last, phone_normalized, email_normalized
                     )
-                    
-                    # Add phone OR email condition
-                    conditions = []
-                    if phone_normalized and phone_normalized != "-":
-                        # בדוק גם mobile_phone וגם home_phone (phone לא קיים במודל)
-                        conditions.append(
-                            or_(
-                                guest_models.Guest.mobile_phone == phone_normalized,
-                                guest_models.Guest.home_phone == phone_normalized
-                            )
-                        )
-                    if email_normalized and email_normalized != "-":
-                        conditions.append(guest_models.Guest.email == email_normalized)
-                    
-                    if conditions:
-                        query = query.filter(or_(*conditions))
-                        existing = query.first()
-                        if existing:
-                            found_by_name_match = True
-                            # Update row_id_map with existing guest's id_number
-                            if existing.id_number:
-                                row_id_map[row_index] = existing.id_number
-                            match_info = []
-                            if phone_normalized and phone_normalized != "-":
-                                match_info.append(f"phone={phone_normalized}")
-                            if email_normalized and email_normalized != "-":
-                                match_info.append(f"email={email_normalized}")
-                            print(f"[import-job] _process_batch: Found existing guest by name+phone/email (after ID search failed) for row {row_index}: {search_first} {search_last} ({', '.join(match_info)}) (existing id_number: {existing.id_number}, new id_number: {id_number_norm})")
+                    if existing:
+                        found_by_name_match = True
+                        # Update row_id_map with existing guest's id_number
+                        if existing.id_number:
+                            row_id_map[row_index] = existing.id_number
+                        match_info = []
+                        if phone_normalized and phone_normalized != "-":
+                            match_info.append(f"phone={phone_normalized}")
+                        if email_normalized and email_normalized != "-":
+                            match_info.append(f"email={email_normalized}")
+                        print(f"[import-job] _process_batch: Found existing guest by name+phone/email (after ID search failed) for row {row_index}: {search_first} {search_last} ({', '.join(match_info)}) (existing id_number: {existing.id_number}, new id_number: {id_number_norm})")
             
             if existing:
                 guest = existing
@@ -1009,123 +1079,57 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                 )
                 new_objects.append(guest)
             
-            # עבר על כל העמודות בקובץ והכנס אותן לשדות המתאימים
-            # Track which base fields we've already set to avoid duplicates in dynamic
-            base_fields_set = set()
-            
-            # Debug: Log all column keys for first row to help diagnose mapping issues
-            if row_index == 0:
-                phone_related_cols = [k for k in row.keys() if "טלפון" in k or "phone" in k.lower()]
-                if phone_related_cols:
-                    print(f"[import-job] _process_batch: Phone-related columns in file: {phone_related_cols}")
-                # Debug: Check for manager_personal_number related columns
-                manager_cols = [k for k in row.keys() if "מניג" in k or "manager" in k.lower()]
-                if manager_cols:
-                    print(f"[import-job] _process_batch: Manager personal number related columns in file: {manager_cols}")
-                    for col in manager_cols:
-                        print(f"[import-job] _process_batch: Column '{col}' value: '{row.get(col, '')}'")
-            
-            for col_key, val in row.items():
-                if not col_key:
-                    continue
-                
-                # Debug: Check if this column might be one of our target fields
-                is_target_field = any(keyword in col_key for keyword in ["טלפון בית", "טלפון נוסף", "card", "כרטיס אשראי", "מספר אישי מניג'ר", "מספר אישי מניגר", "manager_personal_number"])
-                
-                # First check fallback_base_map (hardcoded basic fields)
-                db_field_name = fallback_base_map.get(col_key)
-                if is_target_field:
-                    print(f"[import-job] _process_batch: DEBUG - Checking column '{col_key}' (value: '{val}') - fallback_base_map result: {db_field_name}")
+            # עבר על עמודות הקובץ לפי התוכנית והכנס אותן לשדות המתאימים
+            for col_idx, db_field_name, convert in plan.base_columns:
+                # זה שדה בטבלת guests - המרת ערך לפי סוג השדה
+                converted_val = convert(row[col_idx])
                 
-                # If not in fallback_base_map, try field_mappings
-                if not db_field_name:
-                    db_field_name = field_mappings.get(col_key)
-                    if is_target_field:
-                        print(f"[import-job] _process_batch: DEBUG - field_mappings result for '{col_key}': {db_field_name}")
-                    # Debug: Log if target field not found in mappings
-                    if is_target_field and not db_field_name:
-                        print(f"[import-job] _process_batch: WARNING - Target field column '{col_key}' not found in mappings (value: '{val}')")
-                        # Show available keys that contain similar text
-                        similar_keys = [k for k in field_mappings.keys() if "טלפון" in k or "בית" in k or "נוסף" in k or "מניג" in k]
-                        if similar_keys:
-                            print(f"[import-job] _process_batch: Similar keys in field_mappings: {similar_keys[:10]}")
+                # אל תדרוס שדות חובה (first_name, last_name) אם הערך ריק
+                if db_field_name in ["first_name", "last_name"]:
+                    if converted_val is None or (isinstance(converted_val, str) and not converted_val.strip()):
+                        continue  # דלג על עדכון שדות חובה אם הערך ריק
                 
-                # Debug: Log when target field is found
-                if is_target_field and db_field_name:
-                    print(f"[import-job] _process_batch: DEBUG - Found target field: '{col_key}' -> '{db_field_name}' (value: '{val}')")
-                
-                # If found and exists in model, save to base field
-                if db_field_name and db_field_name in guest_model_fields:
-                    # Mark that we've set this base field
-                    base_fields_set.add(db_field_name)
-                    
-                    # זה שדה בטבלת guests - נשמור אותו
-                    col_def = guest_model_fields[db_field_name]
-                    field_type = col_def.type.python_type if hasattr(col_def.type, 'python_type') else str
-                    
-                    # המרת ערך לפי סוג השדה
-                    converted_val = _convert_value(val, field_type)
-                    
-                    # אל תדרוס שדות חובה (first_name, last_name) אם הערך ריק
-                    if db_field_name in ["first_name", "last_name"]:
-                        if converted_val is None or (isinstance(converted_val, str) and not converted_val.strip()):
-                            continue  # דלג על עדכון שדות חובה אם הערך ריק
+                # CRITICAL: Never overwrite id_number if it's already a TEMP ID or if the new value is invalid
+                # EXCEPTION: If guest was found by name+phone/email, allow updating TEMP ID with valid ID
+                if db_field_name == "id_number":
+                    # Check if the new value is valid (not "-", not empty, not UUID-like)
+                    is_valid_new_id = False
+                    if converted_val and isinstance(converted_val, str) and converted_val.strip():
+                        converted_val_str = converted_val.strip()
+                        # Check if it's not "-" and not UUID-like
+                        if converted_val_str != "-" and not (any(c.isalpha() for c in converted_val_str) and "-" in converted_val_str):
+                            # Check if it contains at least some digits (normalized ID would have digits)
+                            norm_check = re.sub(r'[^0-9]', '', converted_val_str)
+                            if norm_check:  # Has digits, so it's a valid numeric ID
+                                is_valid_new_id = True
                     
-                    # CRITICAL: Never overwrite id_number if it's already a TEMP ID or if the new value is invalid
-                    # EXCEPTION: If guest was found by name+phone/email, allow updating TEMP ID with valid ID
-                    if db_field_name == "id_number":
-                        # Check if the new value is valid (not "-", not empty, not UUID-like)
-                        is_valid_new_id = False
-                        if converted_val and isinstance(converted_val, str) and converted_val.strip():
-                            converted_val_str = converted_val.strip()
-                            # Check if it's not "-" and not UUID-like
-                            if converted_val_str != "-" and not (any(c.isalpha() for c in converted_val_str) and "-" in converted_val_str):
-                                import re
-                                # Check if it contains at least some digits (normalized ID would have digits)
-                                norm_check = re.sub(r'[^0-9]', '', converted_val_str)
-                                if norm_check:  # Has digits, so it's a valid numeric ID
-                                    is_valid_new_id = True
-                        
-                        # If id_number is already set to a TEMP ID, only overwrite if:
-                        # 1. Guest was found by name match (not by ID), AND
-                        # 2. The new value is a valid ID
-                        if guest.id_number and guest.id_number.startswith("TEMP-"):
-                            if found_by_name_match and is_valid_new_id:
-                                # Allow updating TEMP ID with valid ID when guest was found by name
-                                pass  # Continue to update
-                            else:
-                                continue  # Don't overwrite TEMP ID with raw value from file
-                        # Also don't overwrite with invalid values like "-"
-                        if not is_valid_new_id:
-                            continue  # Don't overwrite with invalid ID
-                    
-                    # Update if value is not None/empty (always update existing fields with new values from file)
-                    # This allows re-importing the same file to update field values
-                    if converted_val is not None and not (isinstance(converted_val, str) and not converted_val.strip()):
-                        old_value = getattr(guest, db_field_name, None)
-                        setattr(guest, db_field_name, converted_val)
-                        # Debug log for specific fields we're tracking
-                        if db_field_name in ["home_phone", "mobile_phone", "alt_phone_1", "alt_phone_2", "card_id", "credit_card_number", "manager_personal_number", "account_number"]:
-                            print(f"[import-job] _process_batch: Updated {db_field_name} for guest {guest.id} (id_number: {guest.id_number}): '{old_value}' -> '{converted_val}'")
-                    elif db_field_name in ["home_phone", "mobile_phone", "alt_phone_1", "alt_phone_2", "card_id", "credit_card_number", "manager_personal_number", "account_number"]:
-                        # Debug: Log when value is empty/None and not updated
-                        print(f"[import-job] _process_batch: Skipped updating {db_field_name} for guest {guest.id} - value is empty/None (raw value: '{val}')")
-                else:
-                    # זה שדה דינמי - נשמור ב-dynamic_values_buffer
-                    # BUT: only if it's not already mapped to a base field (avoid duplicates)
-                    # Only add to dynamic if no mapping was found OR mapping exists but field not in model
-                    # AND it's not in base fields that we already processed
-                    if not db_field_name:
-                        # No mapping found at all - check if it's not accidentally a base field
-                        is_mapped_base_field = (col_key in fallback_base_map) or (col_key in field_mappings and field_mappings.get(col_key) in guest_model_fields)
-                        if not is_mapped_base_field:
-                            value_str = str(val or "").strip()
-                            if value_str:
-                                dynamic_values_buffer.append({
-                                    "id_number_norm": id_number_norm,
-                                    "field_name": col_key,
-                                    "value": value_str,
-                                })
+                    # If id_number is already set to a TEMP ID, only overwrite if:
+                    # 1. Guest was found by name match (not by ID), AND
+                    # 2. The new value is a valid ID
+                    if guest.id_number and guest.id_number.startswith("TEMP-"):
+                        if found_by_name_match and is_valid_new_id:
+                            # Allow updating TEMP ID with valid ID when guest was found by name
+                            pass  # Continue to update
+                        else:
+                            continue  # Don't overwrite TEMP ID with raw value from file
+                    # Also don't overwrite with invalid values like "-"
+                    if not is_valid_new_id:
+                        continue  # Don't overwrite with invalid ID
+                
+                # Update if value is not None/empty (always update existing fields with new values from file)
+                # This allows re-importing the same file to update field values
+                if converted_val is not None and not (isinstance(converted_val, str) and not converted_val.strip()):
+                    setattr(guest, db_field_name, converted_val)
+
+            # עמודות ללא מיפוי - שדות דינמיים, נשמרים ב-dynamic_values_buffer
+            for col_idx, field_name in plan.dynamic_columns:
+                value_str = str(row[col_idx] or "").strip()
+                if value_str:
+                    dynamic_values_buffer.append({
+                        "id_number_norm": id_number_norm,
+                        "field_name": field_name,
+                        "value": value_str,
+                    })
             
             # Don't mark row as OK yet - will be marked after successful commit
             # row_ok_flags[row_index] will remain False until commit succeeds
@@ -1134,7 +1138,7 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
             # Mark row as failed
             row_ok_flags[row_index] = False
             err += 1
-            error_row = dict(row)
+            error_row = plan.row_dict(row)
             error_row["error"] = str(e)
             errors.append(error_row)
             print(f"[import-job] _process_batch: Error processing row {row_index}: {e}")
@@ -1142,29 +1146,13 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
     # הפרדה בין חדשים לישנים לפני bulk_save
     truly_new = [g for g in new_objects if g.id is None]
     
-    # בדיקת כפילות נוספת לפני שמירה - מונע כפילויות
+    # בדיקת כפילות נוספת לפני שמירה - מונע כפילויות (לפי ת"ז ואז לפי שם + טלפון/אימייל, מול האינדקס)
     truly_new_filtered = []
     for g in truly_new:
-        duplicate_found = False
-        existing = None
-        
-        # 1. בדוק כפילות לפי id_number (אם יש)
-        if g.id_number and g.id_number.strip() and not g.id_number.startswith("TEMP-"):
-            existing = guests_repo.find_guest_by_id_number(db, event_id, g.id_number)
-            if existing:
-                duplicate_found = True
-                print(f"[import-job] _process_batch: Duplicate detected by id_number: {g.id_number}, updating existing guest {existing.id}")
-        
-        # 2. אם לא מצאנו לפי id_number, נבדוק לפי שם + טלפון/אימייל
-        if not duplicate_found and g.first_name and g.last_name:
-            phone = g.mobile_phone or g.home_phone or ""
-            email = g.email or ""
-            existing = guests_repo.find_guest_by_name_and_phone_or_email(
-                db, event_id, g.first_name, g.last_name, phone, email
-            )
-            if existing:
-                duplicate_found = True
-                print(f"[import-job] _process_batch: Duplicate detected by name+phone/email: {g.first_name} {g.last_name}, updating existing guest {existing.id}")
+        existing = match_index.find_duplicate(g)
+        duplicate_found = existing is not None
+        if duplicate_found:
+            print(f"[import-job] _process_batch: Duplicate detected: {g.first_name} {g.last_name} (id_number: {g.id_number}), updating existing guest {existing.id}")
         
         # אם נמצאה כפילות - עדכן את המוזמן הקיים
         if duplicate_found and existing:
@@ -1184,8 +1172,9 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                 existing_updated_list.append(existing)
             continue  # דלג על יצירה - זה כפילות
         
-        # אין כפילות - הוסף לרשימה
+        # אין כפילות - הוסף לרשימה ולאינדקס (כך שכפילות בהמשך הבאץ' תתמזג אליו)
         truly_new_filtered.append(g)
+        match_index.add(g)
     
     try:
         # Save new guests (רק אלה שאין להם כפילות)
@@ -1213,6 +1202,10 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
             db.flush()  # Flush changes to existing objects
         
         db.commit()  # ✅ ONE commit per batch
+
+        # ערכים שהתעדכנו (שם/טלפון/ת"ז) צריכים להיות מאונדקסים מחדש לבאצ'ים הבאים
+        for g in existing_updated_list:
+            match_index.add(g)
         
         # After successful commit, mark all processed rows as OK
         # All rows that were processed successfully (either created new or updated existing)
@@ -1226,6 +1219,8 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
         
     except IntegrityError as e:
         db.rollback()
+        # ה-rollback ביטל את המוזמנים החדשים שנוספו לאינדקס - טען אותו מחדש
+        match_index.reload(db)
         print(f"[import-job] _process_batch: IntegrityError saving guests (likely duplicate id_number): {e}")
         print(f"[import-job] _process_batch: Attempting to save {len(truly_new_filtered)} new guests one by one with duplicate check")
         # Reset all processed row_ok_flags to False since commit failed
@@ -1251,46 +1246,49 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
             duplicate_found = False
             existing = None
             
-            # 1. בדוק לפי id_number
-            if g.id_number and g.id_number.strip() and not g.id_number.startswith("TEMP-"):
-                existing = guests_repo.find_guest_by_id_number(db, event_id, g.id_number)
+            # 1. בדוק לפי id_number - גם TEMP: מחיצה אחרת של הג'וב יכלה ליצור את אותו מוזמן
+            # (האינדקס נטען מחדש אחרי ה-rollback, כולל מה שמחיצות אחרות שמרו)
+            if g.id_number and g.id_number.strip():
+                if g.id_number.startswith("TEMP-"):
+                    existing = match_index.by_id(None, g.id_number)
+                else:
+                    existing = match_index.by_id(_normalize_id(g.id_number), g.id_number)
                 if existing:
                     duplicate_found = True
                     print(f"[import-job] _process_batch: Duplicate detected (one-by-one): id_number={g.id_number}, existing guest {existing.id}")
             
             # 2. אם לא מצאנו, נבדוק לפי שם + טלפון/אימייל
             if not duplicate_found and g.first_name and g.last_name:
-                phone = g.mobile_phone or g.home_phone or ""
-                email = g.email or ""
-                existing = guests_repo.find_guest_by_name_and_phone_or_email(
-                    db, event_id, g.first_name, g.last_name, phone, email
-                )
+                existing = match_index.find_duplicate(g)
                 if existing:
                     duplicate_found = True
                     print(f"[import-job] _process_batch: Duplicate detected (one-by-one): name+phone/email: {g.first_name} {g.last_name}, existing guest {existing.id}")
-                    # העתק שדות מהמוזמן החדש למוזמן הקיים
-                    for key, value in g.__dict__.items():
-                        if key not in ['id', '_sa_instance_state', 'event_id'] and value is not None:
-                            if key == 'id_number' and existing.id_number and existing.id_number.startswith("TEMP-"):
+
+            if duplicate_found:
+                # העתק שדות מהמוזמן החדש למוזמן הקיים
+                for key, value in g.__dict__.items():
+                    if key not in ['id', '_sa_instance_state', 'event_id'] and value is not None:
+                        if key == 'id_number' and existing.id_number and existing.id_number.startswith("TEMP-"):
+                            setattr(existing, key, value)
+                        elif key != 'id_number':
+                            # תמיד עדכן אם יש ערך בקובץ (לא רק אם השדה הקיים ריק)
+                            # זה מאפשר לעדכן שדות קיימים כשמעלים קובץ מחדש
+                            if value and (isinstance(value, str) and value.strip()):
                                 setattr(existing, key, value)
-                            elif key != 'id_number':
-                                # תמיד עדכן אם יש ערך בקובץ (לא רק אם השדה הקיים ריק)
-                                # זה מאפשר לעדכן שדות קיימים כשמעלים קובץ מחדש
-                                if value and (isinstance(value, str) and value.strip()):
-                                    setattr(existing, key, value)
-                    if existing not in existing_updated_list:
-                        existing_updated_list.append(existing)
-                    # זה כפילות - סמן כהצלחה (עדכון מוזמן קיים)
-                    if row_idx is not None and row_idx < len(row_ok_flags):
-                        row_ok_flags[row_idx] = True
-                    ok += 1
-                    continue  # דלג על יצירה
+                if existing not in existing_updated_list:
+                    existing_updated_list.append(existing)
+                # זה כפילות - סמן כהצלחה (עדכון מוזמן קיים)
+                if row_idx is not None and row_idx < len(row_ok_flags):
+                    row_ok_flags[row_idx] = True
+                ok += 1
+                continue  # דלג על יצירה
             
             if not duplicate_found:
                 try:
                     db.add(g)
                     db.flush()
                     db.commit()
+                    match_index.add(g)
                     ok += 1
                     created_count += 1
                     saved_guests.append(g)
@@ -1302,8 +1300,14 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                     # Duplicate - ננסה למצוא את המוזמן הקיים
                     existing = None
                     
-                    # 1. נבדוק לפי id_number
-                    if g.id_number and g.id_number.strip() and not g.id_number.startswith("TEMP-"):
+                    # 1. נבדוק לפי id_number - קודם התאמה מדויקת (גם TEMP, ממחיצה אחרת של הג'וב)
+                    if g.id_number and g.id_number.strip():
+                        existing = (
+                            db.query(guest_models.Guest)
+                            .filter(guest_models.Guest.event_id == event_id, guest_models.Guest.id_number == g.id_number)
+                            .first()
+                        )
+                    if not existing and g.id_number and g.id_number.strip() and not g.id_number.startswith("TEMP-"):
                         existing = guests_repo.find_guest_by_id_number(db, event_id, g.id_number)
                     
                     # 2. אם לא מצאנו, נבדוק לפי שם + טלפון/אימייל
@@ -1337,7 +1341,7 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                         if row_idx is not None and row_idx < len(row_ok_flags):
                             row_ok_flags[row_idx] = False
                         err += 1
-                        row = rows[row_idx] if row_idx < len(rows) else {}
+                        row = plan.row_dict(rows[row_idx]) if row_idx < len(rows) else {}
                         errors.append({
                             "first_name": row.get("שם", row.get("first_name", g.first_name)),
                             "last_name": row.get("שם משפחה", row.get("last_name", g.last_name)),
@@ -1349,13 +1353,16 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                     if row_idx is not None and row_idx < len(row_ok_flags):
                         row_ok_flags[row_idx] = False
                         err += 1
-                        row = rows[row_idx] if row_idx < len(rows) else {}
+                        row = plan.row_dict(rows[row_idx]) if row_idx < len(rows) else {}
                         errors.append({
                             "first_name": row.get("שם", row.get("first_name", g.first_name)),
                             "last_name": row.get("שם משפחה", row.get("last_name", g.last_name)),
                             "error": f"Error saving guest: {str(single_e)}"
                         })
         
+        # עדכוני המוזמנים הקיימים שנמצאו כאן ככפילויות - גם כשאחריהם לא הייתה הכנסה מוצלחת
+        db.commit()
+
         # Update truly_new to only include successfully saved guests for guest_id_by_norm
         truly_new = saved_guests
         
@@ -1389,6 +1396,7 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                         ok += 1
     except Exception as e:
         db.rollback()
+        match_index.reload(db)
         print(f"[import-job] _process_batch: Error saving guests: {e}")
         ok = 0
         # If commit fails, all processed rows in batch are errors
@@ -1397,9 +1405,10 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                 row_ok_flags[idx] = False
                 err += 1
                 if idx < len(rows):
+                    row = plan.row_dict(rows[idx])
                     errors.append({
-                        "first_name": rows[idx].get("שם", rows[idx].get("first_name", "")),
-                        "last_name": rows[idx].get("שם משפחה", rows[idx].get("last_name", "")),
+                        "first_name": row.get("שם", row.get("first_name", "")),
+                        "last_name": row.get("שם משפחה", row.get("last_name", "")),
                         "error": f"Failed to save guest: {str(e)}"
                     })
 
@@ -1470,12 +1479,15 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                     if norm_key:
                         guest_id_by_norm[norm_key] = g.id
 
+        # במצב jsonb הערכים נכתבים ל-guests.custom_fields ולא ל-guest_field_values
+        jsonb_storage = guests_repo.uses_jsonb_field_storage()
+
         # Query existing field values only for relevant guests and fields
         existing_field_values = []
         guest_ids = list(guest_id_by_norm.values())
         field_ids = [f.id for f in custom_fields_cache.values()]
         
-        if guest_ids and field_ids:
+        if guest_ids and field_ids and not jsonb_storage:
             existing_field_values = (
                 db.query(guest_models.GuestFieldValue)
                 .filter(guest_models.GuestFieldValue.guest_id.in_(guest_ids))
@@ -1488,6 +1500,7 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
             fv_map[(fv.guest_id, fv.custom_field_id)] = fv
 
         new_fv_objects = []
+        values_by_guest: Dict[int, Dict[int, Any]] = {}
         missing_guest_count = 0
         for item in limited_dynamic_values:  # שימוש ב-limited_dynamic_values במקום dynamic_values_buffer
             # Try to find guest_id by raw ID first (works for both TEMP and numeric IDs)
@@ -1500,6 +1513,10 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
             field = custom_fields_cache.get(item["field_name"])
             if not field:
                 continue
+            if jsonb_storage:
+                values_by_guest.setdefault(guest_id, {})[field.id] = item["value"]
+                dynamic_values_updated += 1
+                continue
             key = (guest_id, field.id)
             if key in fv_map:
                 fv_map[key].value = item["value"]
@@ -1525,6 +1542,14 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
                 print(f"[import-job] _process_batch: Error saving dynamic field values: {e}")
                 # Don't fail the entire batch - guests are already saved
 
+        if values_by_guest:
+            try:
+                guests_repo.merge_custom_field_values(db, values_by_guest)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[import-job] _process_batch: Error saving dynamic field values: {e}")
+
     # Count saved guests with non-empty fields (after commit)
     # Use truly_new_filtered - it's always defined after the filtering step
     guests_for_stats = truly_new_filtered
@@ -1547,8 +1572,10 @@ def _process_batch(db, rows: List[Dict[str, Any]], event_id: int, job_id: int, b
     return ok, err, errors
 
 
-def enqueue_import_job(job_id: int, event_id: int, file_path: str, created_by: Optional[int] = None):
-    executor.submit(_process_file, job_id, event_id, file_path, created_by)
+def notify_import_workers() -> None:
+    """מעיר את ה-workers המקומיים אחרי יצירת ג'וב (הג'וב כבר שמור בתור - import_jobs, status=pending)"""
+    from app.imports import worker
+    worker.notify()
 
 
 def _write_errors_csv(path: str, rows: List[Dict[str, Any]]):
@@ -0,0 +1,115 @@
+"""
+Worker לייבוא מוזמנים - תופס ג'ובים ומחיצות מהתור (import_jobs / import_job_partitions).
+
+רץ בתוך תהליך ה-API (threads, לפי IMPORT_WORKER_EMBEDDED) או כתהליכים נפרדים:
+    python -m app.imports.worker --processes 4
+
+workers שונים מעבדים מחיצות במקביל, גם של אותו ג'וב - שורות בלי ת"ז הותאמו זו לזו כבר
+בשלב התכנון (service.plan_job), כך שמחיצות שונות לא יוצרות את אותו מוזמן פעמיים.
+
+כל worker מחזיק lease על מה שתפס, וה-flush של ערוץ ההתקדמות מאריך אותו; worker שנפל
+משאיר lease שפג, והעבודה נתפסת מחדש ע"י worker אחר.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.imports import progress, repository, service
+from app.seatings import snapshot  # noqa: F401 - ביטול snapshot מפת הישיבה על כתיבות מוזמנים
+
+_wake = threading.Event()
+_threads: List[threading.Thread] = []
+_threads_lock = threading.Lock()
+
+
+def _make_worker_id(suffix: str = "") -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{suffix or uuid.uuid4().hex[:8]}"
+
+
+class ImportWorker:
+    def __init__(self, worker_id: Optional[str] = None, poll_interval: float = 2.0):
+        self.worker_id = worker_id or _make_worker_id()
+        self.poll_interval = poll_interval
+
+    def run_once(self) -> bool:
+        """מבצע יחידת עבודה אחת (תכנון ג'וב או עיבוד מחיצה). מחזיר False אם התור ריק"""
+        # expire_on_commit=False: המוזמנים שבאינדקס ההתאמה נשארים טעונים בין באצ'ים
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            job = repository.claim_job_for_planning(db, self.worker_id, settings.IMPORT_LEASE_SECONDS)
+            if job:
+                service.plan_job(db, job, self.worker_id)
+                return True
+            partition = repository.claim_partition(db, self.worker_id, settings.IMPORT_LEASE_SECONDS)
+            if partition:
+                service.process_partition(db, partition, self.worker_id)
+                return True
+            return False
+        finally:
+            db.close()
+
+    def run_forever(self, stop_event: Optional[threading.Event] = None) -> None:
+        print(f"[import-worker] {self.worker_id} started")
+        while stop_event is None or not stop_event.is_set():
+            try:
+                busy = self.run_once()
+            except Exception as e:
+                print(f"[import-worker] {self.worker_id} error: {e}")
+                busy = False
+            if not busy:
+                _wake.wait(self.poll_interval)
+                _wake.clear()
+
+
+def notify() -> None:
+    """מעיר את ה-workers שבתהליך הנוכחי (אחרי יצירת ג'וב חדש)"""
+    _wake.set()
+
+
+def start_embedded_workers(count: Optional[int] = None) -> None:
+    """מפעיל workers כ-threads בתוך תהליך ה-API (פעם אחת בלבד)"""
+    count = settings.IMPORT_WORKER_THREADS if count is None else count
+    with _threads_lock:
+        if _threads:
+            return
+        progress.start_flusher()
+        for i in range(count):
+            worker = ImportWorker(_make_worker_id(f"t{i}"))
+            thread = threading.Thread(target=worker.run_forever, name=f"import-worker-{i}", daemon=True)
+            thread.start()
+            _threads.append(thread)
+
+
+def _run_process(index: int) -> None:
+    progress.start_flusher()
+    ImportWorker(_make_worker_id(f"p{index}")).run_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import job worker")
+    parser.add_argument("--processes", type=int, default=1, help="מספר תהליכי worker")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        progress.start_flusher()
+        ImportWorker(poll_interval=args.poll_interval).run_forever()
+        return
+
+    # spawn - כל תהליך פותח pool חיבורים משלו למסד
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_run_process, args=(i,)) for i in range(args.processes)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
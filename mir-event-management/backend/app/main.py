@@ -9,6 +9,8 @@ from app.core.config import settings
 from app.core.database import Base, engine
 from app.seatings.models import Seating
 from app.imports import models as import_models  # ensure ImportJob is registered
+from app.reminders import models as reminder_models  # ensure ScheduledReminder is registered
+from app.core import email_outbox  # ensure OutboundEmail is registered
 from app.tableStructure import models as table_structure_models  # ensure TableStructure is registered
 from app.tableStructure.router import router as table_structure_router
 
@@ -37,6 +39,60 @@ with engine.begin() as conn:
             "ADD COLUMN IF NOT EXISTS form_key VARCHAR(255)"
         )
     )
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_guest_field_values_guest_field "
+            "ON guest_field_values (guest_id, custom_field_id)"
+        )
+    )
+    for index_sql in (
+        "ix_guests_event_id_id ON guests (event_id, id)",
+        "ix_guests_event_last_name_id ON guests (event_id, last_name, id)",
+        "ix_guests_event_first_name_id ON guests (event_id, first_name, id)",
+    ):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_sql}"))
+    # Custom field values in JSONB (GUEST_FIELDS_STORAGE=jsonb); backfill is in the alembic migration
+    conn.execute(text("ALTER TABLE guests ADD COLUMN IF NOT EXISTS custom_fields JSONB NOT NULL DEFAULT '{}'::jsonb"))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_guests_custom_fields "
+            "ON guests USING gin (custom_fields jsonb_path_ops)"
+        )
+    )
+    # QR check-in: signed scan token + lookup indexes
+    conn.execute(text("ALTER TABLE guests ADD COLUMN IF NOT EXISTS scan_token VARCHAR"))
+    for index_sql in (
+        "UNIQUE INDEX IF NOT EXISTS uq_guests_event_scan_token ON guests (event_id, scan_token)",
+        "INDEX IF NOT EXISTS ix_guests_event_mobile_phone ON guests (event_id, mobile_phone)",
+        "INDEX IF NOT EXISTS ix_guests_event_qr_code ON guests (event_id, qr_code)",
+        "INDEX IF NOT EXISTS ix_seatings_guest_id ON seatings (guest_id)",
+        "INDEX IF NOT EXISTS ix_seatings_table_id ON seatings (table_id)",
+    ):
+        conn.execute(text(f"CREATE {index_sql}"))
+    # guests.updated_at for the bot feeds; the triggers that bump it are created by the
+    # add_guest_updated_at alembic migration (not on every start)
+    conn.execute(text("ALTER TABLE guests ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT timezone('utc', now())"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_guests_event_updated_at_id ON guests (event_id, updated_at, id)"))
+    # Seating snapshot version (SEATING_CACHE_SHARED)
+    conn.execute(text("ALTER TABLE events ADD COLUMN IF NOT EXISTS seating_version INTEGER NOT NULL DEFAULT 0"))
+    # Import job queue columns (leases / partitions)
+    for column_sql in (
+        "file_path VARCHAR",
+        "mode VARCHAR NOT NULL DEFAULT 'orm'",
+        "partition_count INTEGER NOT NULL DEFAULT 0",
+        "lease_owner VARCHAR",
+        "lease_expires_at TIMESTAMP",
+        "heartbeat_at TIMESTAMP",
+        "attempts INTEGER NOT NULL DEFAULT 0",
+    ):
+        conn.execute(text(f"ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS {column_sql}"))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_import_jobs_status_lease "
+            "ON import_jobs (status, lease_expires_at)"
+        )
+    )
+    conn.execute(text("ALTER TABLE import_job_partitions ADD COLUMN IF NOT EXISTS start_offset BIGINT"))
     # Add new columns to greetings table if they don't exist
     try:
         conn.execute(
@@ -91,6 +147,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_import_workers():
+    from app.imports import progress, worker
+    # ה-flush רץ גם בלי workers מקומיים - כדי שזרמי ההתקדמות יקבלו עדכונים מ-workers חיצוניים
+    progress.start_flusher()
+    if settings.IMPORT_WORKER_EMBEDDED:
+        worker.start_embedded_workers()
+
+
+@app.on_event("startup")
+def start_email_workers():
+    from app.core import email_service
+    if settings.EMAIL_WORKER_EMBEDDED:
+        email_service.start_email_workers()
+
+
+@app.on_event("shutdown")
+def stop_email_workers():
+    from app.core import email_service
+    email_service.stop_email_workers()
+
+
+@app.on_event("startup")
+def start_audit_writer():
+    if settings.AUDIT_LOG_ASYNC:
+        from app.audit_log import writer
+        writer.start_writer()
+
+
+@app.on_event("shutdown")
+def stop_audit_writer():
+    from app.audit_log import writer
+    writer.stop_writer()
+
+
+@app.on_event("startup")
+async def start_realtime_pubsub():
+    from app.realtime.websocket_manager import websocket_manager
+    websocket_manager.start()
+
+
+@app.on_event("shutdown")
+def stop_realtime_pubsub():
+    from app.realtime.websocket_manager import websocket_manager
+    websocket_manager.stop()
+
+
 @app.get("/")
 def read_root():
     return {"message": "המערכת מוכנה!"}
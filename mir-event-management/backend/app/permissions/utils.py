@@ -6,7 +6,11 @@ def check_event_permission(db, user, event_id, required_roles=("event_admin",)):
     # admin או SUPERADMIN תמיד יכול
     if user.role == 'admin' or (hasattr(user, 'email') and user.email in settings.SUPERADMINS):
         return
-    # בדוק הרשאה לאירוע
-    perm = db.query(UserEventPermission).filter_by(user_id=user.id, event_id=event_id).first()
-    if not perm or perm.role_in_event not in required_roles:
+    # בדוק הרשאה לאירוע - מה-snapshot של get_current_user, בלי שאילתה
+    if hasattr(user, 'role_in_event'):
+        role_in_event = user.role_in_event(event_id)
+    else:
+        perm = db.query(UserEventPermission).filter_by(user_id=user.id, event_id=event_id).first()
+        role_in_event = perm.role_in_event if perm else None
+    if role_in_event not in required_roles:
         raise HTTPException(status_code=403, detail="אין לך הרשאה לפעולה זו") 
\ No newline at end of file
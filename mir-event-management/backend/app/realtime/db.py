@@ -0,0 +1,37 @@
+"""
+גישה למסד מתוך ה-handlers האסינכרוניים של realtime (סריקת QR, תיקון סטטוס, חימום טוקנים).
+
+ה-Session של SQLAlchemy סינכרוני, ושאילתה שרצה ישירות בתוך async def חוסמת את ה-event loop
+שמשרת גם את כל ה-WebSockets. run_db מריץ את העבודה ב-thread pool ייעודי (REALTIME_DB_THREADS),
+עם Session משלה שנפתחת ונסגרת באותו thread - כך עבודה ארוכה ב-threadpool הכללי (PDF, ייבוא)
+לא מעכבת סריקות בכניסה, והסריקות לא מעכבות את שליחת העדכונים לדשבורדים.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=settings.REALTIME_DB_THREADS, thread_name_prefix="realtime-db")
+
+
+def _call_with_session(fn: Callable[..., T], *args: Any) -> T:
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """await run_db(fn, *args) -> fn(db, *args) ב-executor של realtime, עם Session חדשה"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_call_with_session, fn, *args))
@@ -0,0 +1,165 @@
+"""
+ערוץ pub/sub בין תהליכי ה-API לעדכוני realtime (REALTIME_PUBSUB_BACKEND).
+
+WebSocketManager מפרסם כל הודעה (event_id + JSON) דרך ה-backend, וכל תהליך מקבל את ההודעות
+ושולח אותן לדשבורדים שמחוברים אליו - כך סריקה שטופלה ב-worker אחד מגיעה לדשבורדים שמחוברים
+ל-worker אחר.
+  - memory: בתוך התהליך בלבד (worker יחיד) - ההודעה נמסרת מיד.
+  - postgres: LISTEN/NOTIFY על הערוץ realtime_events. thread אחד מאזין (וגם מקבל את ההודעות
+    של התהליך עצמו), thread אחר שולח pg_notify לפי הסדר - ה-event loop לא מחכה למסד.
+    הודעות שנשלחו בזמן שחיבור ההאזנה נפל ועדיין לא חודש לא יגיעו.
+"""
+import queue
+import select
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+Deliver = Callable[[int, str], None]
+
+CHANNEL = "realtime_events"
+NOTIFY_MAX_BYTES = 7900  # מגבלת PostgreSQL ל-payload של NOTIFY היא 8000 bytes
+
+
+def _encode(event_id: int, text: str) -> str:
+    return f"{event_id}:{text}"
+
+
+def _decode(payload: str):
+    event_id, _, text = payload.partition(":")
+    return int(event_id), text
+
+
+class MemoryPubSub:
+    name = "memory"
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    def publish(self, event_id: int, text: str) -> None:
+        if self._deliver is not None:
+            self._deliver(event_id, text)
+
+    def stop(self) -> None:
+        self._deliver = None
+
+
+class PostgresPubSub:
+    name = "postgres"
+
+    def __init__(self, connect: Callable[[], Any], channel: str = CHANNEL):
+        self._connect = connect
+        self._channel = channel
+        self._deliver: Optional[Deliver] = None
+        self._outbox: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._stopping = threading.Event()
+        self._listening = threading.Event()
+        self._threads = []
+
+    def start(self, deliver: Deliver) -> None:
+        if self._threads:
+            return
+        self._deliver = deliver
+        self._stopping.clear()
+        for target, name in ((self._listen_loop, "realtime-pubsub-listen"), (self._publish_loop, "realtime-pubsub-notify")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wait_listening(self, timeout: float) -> bool:
+        return self._listening.wait(timeout)
+
+    def publish(self, event_id: int, text: str) -> None:
+        payload = _encode(event_id, text)
+        if len(payload.encode("utf-8")) > NOTIFY_MAX_BYTES:
+            # גדול מדי ל-NOTIFY - נמסר רק לדשבורדים של התהליך הזה
+            print(f"[realtime-pubsub] message for event {event_id} too large for NOTIFY ({len(payload)} chars), delivering locally")
+            if self._deliver is not None:
+                self._deliver(event_id, text)
+            return
+        self._outbox.put(payload)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._outbox.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self._listening.clear()
+
+    def _listen_loop(self) -> None:
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.cursor().execute(f"LISTEN {self._channel}")
+                self._listening.set()
+                while not self._stopping.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            event_id, text = _decode(notify.payload)
+                        except ValueError:
+                            continue
+                        if self._deliver is not None:
+                            self._deliver(event_id, text)
+            except Exception as e:
+                print(f"[realtime-pubsub] listener failed, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                self._listening.clear()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _publish_loop(self) -> None:
+        conn = None
+        while True:
+            payload = self._outbox.get()
+            if payload is None:
+                break
+            for attempt in (1, 2):
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    conn.cursor().execute("SELECT pg_notify(%s, %s)", (self._channel, payload))
+                    break
+                except Exception as e:
+                    print(f"[realtime-pubsub] notify failed (attempt {attempt}): {e}")
+                    try:
+                        if conn is not None:
+                            conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+        if conn is not None:
+            conn.close()
+
+
+def _engine_connection():
+    """חיבור psycopg2 ייעודי במצב autocommit, עם פרטי החיבור של ה-engine (מחוץ ל-pool)"""
+    from app.core.database import engine
+
+    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+    conn = engine.dialect.loaded_dbapi.connect(*cargs, **cparams)
+    conn.autocommit = True
+    return conn
+
+
+def create_backend(name: Optional[str] = None):
+    name = (name or settings.REALTIME_PUBSUB_BACKEND).lower()
+    if name == "postgres":
+        return PostgresPubSub(_engine_connection)
+    if name != "memory":
+        print(f"[realtime-pubsub] unknown backend {name!r}, using memory")
+    return MemoryPubSub()
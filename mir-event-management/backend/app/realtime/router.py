@@ -1,123 +1,160 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
-from sqlalchemy.orm import Session
+import json
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from sqlalchemy.orm import Session, joinedload
 from app.core.database import get_db
+from app.realtime import scan_tokens
+from app.realtime.db import run_db
 from app.realtime.websocket_manager import websocket_manager
 from app.realtime.schemas import QRScanRequest, QRScanResponse
 from app.guests.models import Guest
 from app.seatings.models import Seating
 from app.realtime.models import AttendanceLog, RealTimeNotification
 from datetime import datetime
-from app.tables.models import Table
 
 router = APIRouter(prefix="/realtime", tags=["RealTime"])
 
 @router.websocket("/ws/{event_id}")
 async def websocket_endpoint(websocket: WebSocket, event_id: int):
     await websocket_manager.connect(websocket, event_id)
+    # מסך הכניסה של האירוע נפתח - חימום מפת טוקני הסריקה לפני שהמוזמנים מתחילים להגיע
+    if not scan_tokens.is_warm(event_id):
+        try:
+            await run_db(scan_tokens.warm, event_id)
+        except Exception as e:
+            print(f"שגיאה בחימום טוקני סריקה לאירוע {event_id}: {e}")
     try:
         while True:
             await websocket.receive_text()  # keep alive
-    except WebSocketDisconnect:
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError - החיבור כבר נסגר מצד השרת (לקוח איטי)
+        pass
+    finally:
         websocket_manager.disconnect(websocket, event_id)
 
-@router.post("/scan-qr", response_model=QRScanResponse)
-async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
-    print(f"Received QR scan request: {qr_data}")
-    print(f"QR Code: {qr_data.qr_code}")
-    print(f"Event ID: {qr_data.event_id}")
-    
-    qr_code = qr_data.qr_code
-    event_id = qr_data.event_id
-    
-    # Validate input
-    if not qr_code or not qr_code.strip():
-        raise HTTPException(status_code=400, detail="קוד QR הוא שדה חובה")
-    
-    if not event_id:
-        raise HTTPException(status_code=400, detail="מזהה אירוע הוא שדה חובה")
-    
-    print(f"Looking for guest with QR code: {qr_code}")
-    
-    guest = None
-    
-    # נסיון 1: פורמט JSON חדש שמכיל פרטי מוזמן
-    if qr_code.strip().startswith("{"):
+@router.get("/metrics")
+def get_realtime_metrics(event_id: Optional[int] = None):
+    """חיבורים ועומק תורי השליחה לכל אירוע (או לאירוע אחד)"""
+    return websocket_manager.metrics(event_id)
+
+@router.post("/scan-tokens/{event_id}/warm")
+def warm_scan_tokens(event_id: int, db: Session = Depends(get_db)):
+    """יצירת טוקני סריקה חסרים וטעינת מפת הטוקנים של האירוע לזיכרון (לפני פתיחת הכניסה)"""
+    count = scan_tokens.warm(db, event_id)
+    return {"status": "success", "tokens": count}
+
+def _find_guest_id(db: Session, qr_code: str, event_id: int) -> Optional[int]:
+    """זיהוי המוזמן מתוכן ה-QR. טוקן סריקה - מפת הזיכרון / אינדקס; פורמטים ישנים - לפי השדות"""
+    qr_code = qr_code.strip()
+
+    # נסיון 1: פורמט JSON (כרטיס ישיבה) - עם טוקן, או פרטי מוזמן בכרטיסים ישנים
+    if qr_code.startswith("{"):
         try:
-            import json as _json
-            payload = _json.loads(qr_code)
-            print(f"Parsed QR JSON payload: {payload}")
-            
-            phone = (payload.get("phone") or "").strip()
-            first_name = (payload.get("first_name") or "").strip()
-            last_name = (payload.get("last_name") or "").strip()
+            payload = json.loads(qr_code)
             qr_event_id = payload.get("event_id")
-            
             if qr_event_id and int(qr_event_id) != int(event_id):
-                print(f"Event ID mismatch: {qr_event_id} != {event_id}")
                 raise HTTPException(status_code=400, detail="קוד QR לא תואם לאירוע זה")
-            
+
+            token = (payload.get("token") or "").strip()
+            if token:
+                guest_id = scan_tokens.resolve(db, event_id, token)
+                if guest_id is not None:
+                    return guest_id
+
+            phone = (payload.get("phone") or "").strip()
+            first_name = (payload.get("first_name") or "").strip()
+            last_name = (payload.get("last_name") or "").strip()
             if phone:
-                guest = db.query(Guest).filter(
+                guest_id = db.query(Guest.id).filter(
                     Guest.event_id == event_id,
                     Guest.mobile_phone == phone
-                ).first()
-            
-            if not guest and first_name and last_name:
-                guest = db.query(Guest).filter(
+                ).limit(1).scalar()
+                if guest_id is not None:
+                    return guest_id
+            if first_name and last_name:
+                guest_id = db.query(Guest.id).filter(
                     Guest.event_id == event_id,
                     Guest.first_name == first_name,
                     Guest.last_name == last_name
-                ).first()
-            
-            print(f"Found guest by JSON payload: {guest}")
+                ).limit(1).scalar()
+                if guest_id is not None:
+                    return guest_id
         except Exception as e:
             print(f"Error parsing JSON QR: {e}")
             # נמשיך לנסיונות הבאים
-    
-    # נסיון 2: פורמט טקסט הישן GUEST_<id>_EVENT_<id>
-    if not guest and qr_code.startswith("GUEST_") and "_EVENT_" in qr_code:
+
+    # נסיון 2: טוקן סריקה בלבד
+    else:
+        guest_id = scan_tokens.resolve(db, event_id, qr_code)
+        if guest_id is not None:
+            return guest_id
+
+    # נסיון 3: פורמט טקסט הישן GUEST_<id>_EVENT_<id>
+    if qr_code.startswith("GUEST_") and "_EVENT_" in qr_code:
+        parts = qr_code.split("_")
         try:
-            parts = qr_code.split("_")
-            print(f"QR Code parts: {parts}")
-            if len(parts) >= 4:
-                guest_id = int(parts[1])
-                event_id_from_code = int(parts[3])
-                if event_id_from_code != event_id:
-                    print(f"Event ID mismatch: {event_id_from_code} != {event_id}")
-                    raise HTTPException(status_code=400, detail="קוד QR לא תואם לאירוע זה")
-                guest = db.query(Guest).filter(Guest.id == guest_id, Guest.event_id == event_id).first()
-                print(f"Found guest: {guest}")
-            else:
-                print(f"Invalid QR code format: {qr_code}")
-                raise HTTPException(status_code=400, detail="פורמט קוד QR לא תקין")
-        except Exception as e:
-            print(f"Error parsing legacy QR code: {e}")
+            guest_id = int(parts[1])
+            event_id_from_code = int(parts[3])
+        except (IndexError, ValueError):
+            raise HTTPException(status_code=400, detail="פורמט קוד QR לא תקין")
+        if event_id_from_code != event_id:
             raise HTTPException(status_code=400, detail="פורמט קוד QR לא תקין")
+        return guest_id
+
+    # נסיון 4: חיפוש לפי Guest.qr_code ההיסטורי
+    return db.query(Guest.id).filter(Guest.event_id == event_id, Guest.qr_code == qr_code).limit(1).scalar()
+
+def _guest_seating(db: Session, guest_id: int) -> Optional[Seating]:
+    return db.query(Seating).options(joinedload(Seating.table)).filter(Seating.guest_id == guest_id).first()
+
+async def _broadcast_all(event_id: int, messages: List[dict]) -> None:
+    for message in messages:
+        await websocket_manager.broadcast_to_event(event_id, message)
+
+@router.post("/scan-qr", response_model=QRScanResponse)
+async def scan_qr_code(qr_data: QRScanRequest, background_tasks: BackgroundTasks):
+    """
+    סריקת QR בכניסה. עבודת המסד רצה ב-executor הייעודי של realtime (לא חוסמת את ה-event loop
+    שמשרת את ה-WebSockets), וההודעות לדשבורדים נשלחות אחרי שהתגובה חזרה לסורק.
+    """
+    qr_code = qr_data.qr_code
+    event_id = qr_data.event_id
     
-    # נסיון 3: חיפוש לפי Guest.qr_code ההיסטורי
-    if not guest:
-        print(f"Trying to find by Guest.qr_code field")
-        guest = db.query(Guest).filter(Guest.qr_code == qr_code, Guest.event_id == event_id).first()
-        print(f"Found guest by qr_code field: {guest}")
+    # Validate input
+    if not qr_code or not qr_code.strip():
+        raise HTTPException(status_code=400, detail="קוד QR הוא שדה חובה")
+    
+    if not event_id:
+        raise HTTPException(status_code=400, detail="מזהה אירוע הוא שדה חובה")
+    
+    messages: List[dict] = []
+    response = await run_db(_check_in, qr_code, event_id, messages)
+    if messages:
+        background_tasks.add_task(_broadcast_all, event_id, messages)
+    return response
+
+def _check_in(db: Session, qr_code: str, event_id: int, messages: List[dict]) -> QRScanResponse:
+    """כל עבודת המסד של סריקה; הודעות ה-WebSocket נאספות ל-messages"""
+    if not scan_tokens.is_warm(event_id):
+        scan_tokens.warm(db, event_id)
+    
+    guest = None
+    guest_id = _find_guest_id(db, qr_code, event_id)
+    if guest_id is not None:
+        guest = db.query(Guest).filter(Guest.id == guest_id, Guest.event_id == event_id).first()
     
     if not guest:
         print(f"Guest not found for QR code: {qr_code}")
         raise HTTPException(status_code=404, detail="מוזמן לא נמצא")
     
-    print(f"Processing guest: {guest.first_name} {guest.last_name}")
-    
     if guest.check_in_time:
-        print(f"Guest already checked in: {guest.first_name} {guest.last_name}")
-        
         # בדיקה אם ה-seating מעודכן
-        seating = db.query(Seating).filter(Seating.guest_id == guest.id).first()
+        seating = _guest_seating(db, guest.id)
         if seating and not seating.is_occupied:
-            print(f"Guest checked in but seating not occupied, updating...")
             seating.is_occupied = True
             seating.occupied_at = guest.check_in_time
             seating.occupied_by = guest.id
             db.commit()
-            print(f"Updated seating for {guest.first_name} {guest.last_name}")
             
             # שלח עדכון בזמן אמת על העדכון
             websocket_message = {
@@ -132,11 +169,8 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            print(f"Broadcasting updated seating WebSocket message: {websocket_message}")
-            await websocket_manager.broadcast_to_event(event_id, websocket_message)
-            print("WebSocket broadcast completed for updated seating")
+            messages.append(websocket_message)
         
-        seating = db.query(Seating).filter(Seating.guest_id == guest.id).first()
         table_number = seating.table.table_number if seating and seating.table else None
         return QRScanResponse(
             status="already_checked_in", 
@@ -154,19 +188,14 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
     guest.check_in_time = datetime.utcnow()
     guest.last_scan_time = datetime.utcnow()
     
-    seating = db.query(Seating).filter(Seating.guest_id == guest.id).first()
+    seating = _guest_seating(db, guest.id)
     has_seating = seating is not None
     table_number = seating.table.table_number if seating and seating.table else None
     
-    print(f"Found seating for guest: {seating}")
-    if seating:
-        print(f"Seating details: Table {seating.table_id}, Occupied: {seating.is_occupied}, Occupied by: {seating.occupied_by}")
-    
     if seating:
         seating.is_occupied = True
         seating.occupied_at = datetime.utcnow()
         seating.occupied_by = guest.id
-        print(f"Updated seating: is_occupied={seating.is_occupied}, occupied_at={seating.occupied_at}, occupied_by={seating.occupied_by}")
         
         # בדיקת תפוסת השולחן
         table = seating.table
@@ -180,8 +209,6 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
             total_seats = table.size
             occupancy_percentage = (occupied_seats / total_seats) * 100 if total_seats > 0 else 0
             
-            print(f"Table {table.table_number}: {occupied_seats}/{total_seats} seats occupied ({occupancy_percentage:.1f}%)")
-            
             # התראה על שולחן מלא מדי (יותר מ-100%)
             if occupancy_percentage > 100:
                 table_overbooked_notification = RealTimeNotification(
@@ -212,8 +239,7 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
                     },
                     "timestamp": datetime.utcnow().isoformat()
                 }
-                await websocket_manager.broadcast_to_event(event_id, table_overbooked_message)
-                print(f"Broadcasting table overbooked message: {table_overbooked_message}")
+                messages.append(table_overbooked_message)
             
             # התראה על שולחן מלא (100%)
             elif occupancy_percentage >= 100:
@@ -245,8 +271,7 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
                     },
                     "timestamp": datetime.utcnow().isoformat()
                 }
-                await websocket_manager.broadcast_to_event(event_id, table_full_message)
-                print(f"Broadcasting table full message: {table_full_message}")
+                messages.append(table_full_message)
             
             # התראה על שולחן כמעט מלא (80%+)
             elif occupancy_percentage >= 80:
@@ -277,8 +302,7 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
                     },
                     "timestamp": datetime.utcnow().isoformat()
                 }
-                await websocket_manager.broadcast_to_event(event_id, table_almost_full_message)
-                print(f"Broadcasting table almost full message: {table_almost_full_message}")
+                messages.append(table_almost_full_message)
         
         # התראה רגילה על כניסת מוזמן
         notification = RealTimeNotification(
@@ -291,7 +315,6 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
         )
         db.add(notification)
     else:
-        print(f"No seating found for guest {guest.first_name} {guest.last_name}")
         notification = RealTimeNotification(
             event_id=event_id,
             notification_type="guest_arrived_no_seat",
@@ -308,37 +331,41 @@ async def scan_qr_code(qr_data: QRScanRequest, db: Session = Depends(get_db)):
         status="checked_in"
     )
     db.add(attendance_log)
+    
+    # הפרטים לתגובה ולעדכון נאספים לפני ה-commit (אחריו האובייקטים פגי תוקף וכל גישה היא שאילתה)
+    guest_info = {
+        "id": guest.id,
+        "first_name": guest.first_name,
+        "last_name": guest.last_name,
+    }
+    guest_name = f"{guest.first_name} {guest.last_name}"
+    check_in_time = guest.check_in_time
+    table_id = seating.table_id if seating else None
     db.commit()
     
-    print(f"Successfully checked in guest: {guest.first_name} {guest.last_name}")
+    print(f"Successfully checked in guest: {guest_name}")
     
     # שלח עדכון בזמן אמת
     websocket_message = {
         "type": "guest_arrived",
         "guest": {
-            "id": guest.id,
-            "first_name": guest.first_name,
-            "last_name": guest.last_name,
-            "table_id": seating.table_id if seating else None,
-            "table_number": seating.table.table_number if seating and seating.table else None
+            **guest_info,
+            "table_id": table_id,
+            "table_number": table_number
         },
         "timestamp": datetime.utcnow().isoformat()
     }
     
-    print(f"Broadcasting WebSocket message: {websocket_message}")
-    await websocket_manager.broadcast_to_event(event_id, websocket_message)
-    print("WebSocket broadcast completed")
+    messages.append(websocket_message)
     
     return QRScanResponse(
         status="success",
-        message=(f"מוזמן {guest.first_name} {guest.last_name} נכנס בהצלחה" if has_seating else f"מוזמן {guest.first_name} {guest.last_name} נכנס (ללא מקום ישיבה)"),
+        message=(f"מוזמן {guest_name} נכנס בהצלחה" if has_seating else f"מוזמן {guest_name} נכנס (ללא מקום ישיבה)"),
         guest={
-            "id": guest.id,
-            "first_name": guest.first_name,
-            "last_name": guest.last_name,
-            "name": f"{guest.first_name} {guest.last_name}",
+            **guest_info,
+            "name": guest_name,
             "table_number": table_number,
-            "check_in_time": guest.check_in_time.isoformat() if guest.check_in_time else None
+            "check_in_time": check_in_time.isoformat() if check_in_time else None
         },
         has_seating=has_seating
     )
@@ -362,24 +389,31 @@ def mark_notification_read(notification_id: int, db: Session = Depends(get_db)):
     return {"status": "success"}
 
 @router.post("/fix-seating-status/{event_id}")
-async def fix_seating_status(event_id: int, db: Session = Depends(get_db)):
+async def fix_seating_status(event_id: int):
     """תקן את הסטטוס של כל המוזמנים שכבר נכנסו אבל ה-seating שלהם לא מעודכן"""
+    return await run_db(_fix_seating_status, event_id)
+
+def _fix_seating_status(db: Session, event_id: int):
     try:
-        # מצא את כל המוזמנים שכבר נכנסו
-        checked_in_guests = db.query(Guest).filter(
-            Guest.event_id == event_id,
-            Guest.check_in_time.isnot(None)
-        ).all()
+        # מקומות ישיבה לא מסומנים של מוזמנים שכבר נכנסו - שאילתה אחת
+        rows = (
+            db.query(Seating, Guest.check_in_time, Guest.first_name, Guest.last_name)
+            .join(Guest, Guest.id == Seating.guest_id)
+            .filter(
+                Guest.event_id == event_id,
+                Guest.check_in_time.isnot(None),
+                Seating.is_occupied.isnot(True)
+            )
+            .all()
+        )
         
         fixed_count = 0
-        for guest in checked_in_guests:
-            seating = db.query(Seating).filter(Seating.guest_id == guest.id).first()
-            if seating and not seating.is_occupied:
-                seating.is_occupied = True
-                seating.occupied_at = guest.check_in_time
-                seating.occupied_by = guest.id
-                fixed_count += 1
-                print(f"Fixed seating for {guest.first_name} {guest.last_name}")
+        for seating, check_in_time, first_name, last_name in rows:
+            seating.is_occupied = True
+            seating.occupied_at = check_in_time
+            seating.occupied_by = seating.guest_id
+            fixed_count += 1
+            print(f"Fixed seating for {first_name} {last_name}")
         
         db.commit()
         print(f"Fixed {fixed_count} seatings for event {event_id}")
@@ -0,0 +1,119 @@
+"""
+טוקן סריקה לכניסה לאירוע (POST /realtime/scan-qr).
+
+הטוקן הוא "<guest_id>.<חתימה>" - חתימת HMAC (SECRET_KEY) על האירוע והמוזמן, כך שטוקן מזויף
+או של אירוע אחר נדחה בלי לגשת למסד. הטוקן נשמר ב-guests.scan_token עם אינדקס ייחודי
+(event_id, scan_token), ונכנס ל-payload של ה-QR בכרטיס הישיבה.
+
+לכל אירוע נשמרת בזיכרון מפה טוקן -> מוזמן, שמתחממת כשמסך הכניסה של האירוע נפתח (ה-WebSocket
+של האירוע) או בסריקה הראשונה; טוקן שלא נמצא במפה נבדק באינדקס ונוסף אליה.
+"""
+import base64
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.guests.models import Guest
+
+MAX_EVENTS = 64
+
+_lock = threading.Lock()
+_tokens: "OrderedDict[int, Dict[str, int]]" = OrderedDict()  # event_id -> {token: guest_id}
+
+
+def _signature(event_id: int, guest_id: int) -> str:
+    digest = hmac.new(
+        settings.SECRET_KEY.encode("utf-8"),
+        f"scan:{event_id}:{guest_id}".encode("utf-8"),
+        hashlib.sha256,
+    ).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode("ascii")
+
+
+def make_token(event_id: int, guest_id: int) -> str:
+    return f"{guest_id}.{_signature(event_id, guest_id)}"
+
+
+def verify_token(event_id: int, token: str) -> Optional[int]:
+    """guest_id מתוך הטוקן אם החתימה תקינה לאירוע הזה, אחרת None"""
+    guest_part, _, signature = token.partition(".")
+    if not guest_part.isdigit() or not signature:
+        return None
+    guest_id = int(guest_part)
+    if not hmac.compare_digest(signature, _signature(event_id, guest_id)):
+        return None
+    return guest_id
+
+
+def ensure_tokens(db: Session, event_id: int) -> int:
+    """
+    יצירת טוקן לכל מוזמן באירוע שעדיין אין לו (UPDATE אחד ב-executemany). מחזיר כמה נוצרו.
+    ה-UPDATE נוגע רק בשורות שה-scan_token שלהן עדיין NULL, וה-trigger של updated_at לא רץ
+    על שינוי של scan_token (מיגרציה skip_scan_token_touch) - כך שהמוזמנים לא "משתנים" בפידים של הבוט.
+    """
+    missing = [
+        guest_id for (guest_id,) in
+        db.query(Guest.id).filter(Guest.event_id == event_id, Guest.scan_token.is_(None))
+    ]
+    if missing:
+        db.execute(
+            update(Guest.__table__)
+            .where(Guest.__table__.c.id == bindparam("guest_id"), Guest.__table__.c.scan_token.is_(None))
+            .values(scan_token=bindparam("token")),
+            [{"guest_id": guest_id, "token": make_token(event_id, guest_id)} for guest_id in missing],
+        )
+    return len(missing)
+
+
+def warm(db: Session, event_id: int) -> int:
+    """טעינת מפת הטוקנים של האירוע לזיכרון (כולל יצירת טוקנים חסרים). מחזיר את גודל המפה"""
+    if ensure_tokens(db, event_id):
+        db.commit()
+    tokens = {
+        token: guest_id for guest_id, token in
+        db.query(Guest.id, Guest.scan_token).filter(Guest.event_id == event_id, Guest.scan_token.isnot(None))
+    }
+    with _lock:
+        _tokens[event_id] = tokens
+        _tokens.move_to_end(event_id)
+        while len(_tokens) > MAX_EVENTS:
+            _tokens.popitem(last=False)
+    return len(tokens)
+
+
+def is_warm(event_id: int) -> bool:
+    with _lock:
+        return event_id in _tokens
+
+
+def resolve(db: Session, event_id: int, token: str) -> Optional[int]:
+    """guest_id לטוקן: בדיקת חתימה, מפת הזיכרון, ואם אין - שאילתה על האינדקס (event_id, scan_token)"""
+    if verify_token(event_id, token) is None:
+        return None
+    with _lock:
+        guest_id = _tokens.get(event_id, {}).get(token)
+    if guest_id is not None:
+        return guest_id
+
+    guest_id = (
+        db.query(Guest.id)
+        .filter(Guest.event_id == event_id, Guest.scan_token == token)
+        .scalar()
+    )
+    if guest_id is not None:
+        with _lock:
+            if event_id in _tokens:
+                _tokens[event_id][token] = guest_id
+    return guest_id
+
+
+def forget(event_id: int, token: str) -> None:
+    """הסרת טוקן מהמפה (למשל כשהמוזמן שלו כבר לא קיים)"""
+    with _lock:
+        _tokens.get(event_id, {}).pop(token, None)
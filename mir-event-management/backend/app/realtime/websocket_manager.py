@@ -1,33 +1,184 @@
+"""
+שליחת עדכונים בזמן אמת לדשבורדים של אירוע (/realtime/ws/{event_id}).
+
+כל הודעה מומרת ל-JSON פעם אחת ונכנסת לתור שליחה חסום (REALTIME_SEND_QUEUE_SIZE) של כל
+חיבור; לכל חיבור יש writer task משלו ששולח מהתור, כך ש-broadcast_to_event לא מחכה לאף לקוח
+וטאבלט איטי בכניסה לא מעכב את שאר הדשבורדים. לקוח שהתור שלו מלא או ששליחה אליו נתקעת
+(REALTIME_SEND_TIMEOUT_SECONDS) מנותק, או - REALTIME_SLOW_CONSUMER_POLICY=drop - מאבד את
+ההודעות הישנות בתור שלו.
+
+ההודעות עוברות דרך ה-pub/sub (app/realtime/pubsub.py): publish שולח לכל תהליכי ה-API, וכל
+תהליך מוסר לחיבורים שלו. publish בטוח לקריאה מכל thread (למשל מה-executor של הסריקות).
+"""
 import asyncio
-from typing import Dict, Set
-from fastapi import WebSocket
 import json
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.realtime import pubsub
+
+
+class _Connection:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+
 
 class WebSocketManager:
     def __init__(self):
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
+        self.active_connections: Dict[int, Dict[WebSocket, _Connection]] = {}
+        self._stats: Dict[int, Dict[str, int]] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._backend = pubsub.MemoryPubSub()
+        self._backend.start(self._deliver_threadsafe)
+        self._seating_lock = threading.Lock()
+        self._seating_pending: Set[int] = set()
+        self._seating_flush_scheduled = False
+
+    def start(self, backend=None) -> None:
+        """חיבור ל-pub/sub של REALTIME_PUBSUB_BACKEND; נקרא ב-startup, מתוך ה-event loop של התהליך"""
+        from app.seatings import snapshot
+
+        self._loop = asyncio.get_running_loop()
+        self._backend.stop()
+        self._backend = backend or pubsub.create_backend()
+        self._backend.start(self._deliver_threadsafe)
+        snapshot.add_listener(self.notify_seating_changed)
+        print(f"[realtime] pub/sub backend: {self._backend.name}")
+
+    def stop(self) -> None:
+        self._backend.stop()
+
+    def _event_stats(self, event_id: int) -> Dict[str, int]:
+        return self._stats.setdefault(event_id, {"sent": 0, "dropped": 0, "slow_disconnects": 0})
 
     async def connect(self, websocket: WebSocket, event_id: int):
         await websocket.accept()
-        if event_id not in self.active_connections:
-            self.active_connections[event_id] = set()
-        self.active_connections[event_id].add(websocket)
+        connection = _Connection(websocket, settings.REALTIME_SEND_QUEUE_SIZE)
+        connection.writer = asyncio.create_task(self._writer(event_id, connection))
+        self.active_connections.setdefault(event_id, {})[websocket] = connection
 
     def disconnect(self, websocket: WebSocket, event_id: int):
-        if event_id in self.active_connections:
-            self.active_connections[event_id].discard(websocket)
-            if not self.active_connections[event_id]:
-                del self.active_connections[event_id]
+        connections = self.active_connections.get(event_id)
+        if not connections:
+            return
+        connection = connections.pop(websocket, None)
+        if not connections:
+            del self.active_connections[event_id]
+        if connection and connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _writer(self, event_id: int, connection: _Connection) -> None:
+        stats = self._event_stats(event_id)
+        try:
+            while True:
+                text = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_text(text), settings.REALTIME_SEND_TIMEOUT_SECONDS)
+                stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            stats["slow_disconnects"] += 1
+            self.disconnect(connection.websocket, event_id)
+            await self._close_quietly(connection.websocket)
+        except Exception:
+            self.disconnect(connection.websocket, event_id)
+            await self._close_quietly(connection.websocket)
+
+    def _enqueue(self, event_id: int, connection: _Connection, text: str) -> None:
+        try:
+            connection.queue.put_nowait(text)
+            return
+        except asyncio.QueueFull:
+            pass
+        stats = self._event_stats(event_id)
+        if settings.REALTIME_SLOW_CONSUMER_POLICY == "drop":
+            # מוותרים על ההודעה הישנה ביותר בתור ושומרים את החדשה
+            connection.queue.get_nowait()
+            connection.queue.put_nowait(text)
+            stats["dropped"] += 1
+        else:
+            stats["slow_disconnects"] += 1
+            self.disconnect(connection.websocket, event_id)
+            task = asyncio.create_task(self._close_quietly(connection.websocket))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket) -> None:
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    def publish(self, event_id: int, message: dict) -> None:
+        """שליחת הודעה לדשבורדים של האירוע בכל תהליכי ה-API (מכל thread)"""
+        self._backend.publish(event_id, json.dumps(message))
 
     async def broadcast_to_event(self, event_id: int, message: dict):
-        if event_id in self.active_connections:
-            dead_connections = set()
-            for connection in self.active_connections[event_id]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except:
-                    dead_connections.add(connection)
-            for dead_connection in dead_connections:
-                self.disconnect(dead_connection, event_id)
-
-websocket_manager = WebSocketManager() 
\ No newline at end of file
+        self.publish(event_id, message)
+
+    def _deliver_threadsafe(self, event_id: int, text: str) -> None:
+        loop = self._loop
+        if loop is not None:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                loop.call_soon_threadsafe(self._deliver, event_id, text)
+                return
+        self._deliver(event_id, text)
+
+    def _deliver(self, event_id: int, text: str) -> None:
+        connections = self.active_connections.get(event_id)
+        if not connections:
+            return
+        for connection in list(connections.values()):
+            self._enqueue(event_id, connection, text)
+
+    def notify_seating_changed(self, event_ids: Iterable[int]) -> None:
+        """
+        מפת הישיבה של האירועים השתנתה (listener של seatings.snapshot, מכל thread). השינויים
+        מצטברים ונשלחת הודעת seating_changed אחת לאירוע כל REALTIME_SEATING_CHANGE_DELAY_SECONDS,
+        כדי שרצף סריקות בכניסה לא יכפיל את ההודעות לדשבורדים.
+        """
+        loop = self._loop
+        if loop is None:
+            return
+        with self._seating_lock:
+            self._seating_pending.update(event_ids)
+            if self._seating_flush_scheduled:
+                return
+            self._seating_flush_scheduled = True
+        loop.call_soon_threadsafe(loop.call_later, settings.REALTIME_SEATING_CHANGE_DELAY_SECONDS, self._flush_seating_changes)
+
+    def _flush_seating_changes(self) -> None:
+        with self._seating_lock:
+            pending, self._seating_pending = self._seating_pending, set()
+            self._seating_flush_scheduled = False
+        timestamp = datetime.utcnow().isoformat()
+        for event_id in sorted(pending):
+            self.publish(event_id, {"type": "seating_changed", "event_id": event_id, "timestamp": timestamp})
+
+    def metrics(self, event_id: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        """לכל אירוע: מספר חיבורים, עומק התורים (סה"כ / מקסימום) ומוני שליחה, השמטה וניתוק"""
+        event_ids = [event_id] if event_id is not None else sorted(set(self.active_connections) | set(self._stats))
+        result = {}
+        for current_id in event_ids:
+            depths = [connection.queue.qsize() for connection in self.active_connections.get(current_id, {}).values()]
+            result[current_id] = {
+                "connections": len(depths),
+                "queued": sum(depths),
+                "max_queue_depth": max(depths, default=0),
+                **self._stats.get(current_id, {"sent": 0, "dropped": 0, "slow_disconnects": 0}),
+            }
+        return result
+
+websocket_manager = WebSocketManager()
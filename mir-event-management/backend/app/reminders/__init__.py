@@ -0,0 +1 @@
+"""Scheduled bot reminders (outbox) package."""
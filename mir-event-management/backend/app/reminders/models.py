@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, UniqueConstraint, text
+
+from app.core.database import Base
+
+# סוגי התזכורות וכמה זמן לפני האירוע הן נשלחות (חייב להתאים ל-trigger במיגרציה add_scheduled_reminders)
+REMINDER_LEAD_TIMES = {
+    "24h_before": timedelta(hours=24),
+    "week_before": timedelta(days=7),
+}
+
+
+class ScheduledReminder(Base):
+    """
+    תזכורת מתוזמנת לבוט - שורה לכל מוזמן מאושר ולכל סוג תזכורת. השורות נוצרות ומתעדכנות
+    ב-triggers: אישור הגעה / ביטול אישור של מוזמן, ושינוי תאריך האירוע (שמזיז את התזכורות
+    ומאפס את sent_at כדי שתישלח תזכורת עם התאריך החדש).
+    """
+    __tablename__ = "scheduled_reminders"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), nullable=False, index=True)
+    guest_id = Column(Integer, ForeignKey("guests.id", ondelete="CASCADE"), nullable=False)
+    reminder_type = Column(String(20), nullable=False)  # 24h_before | week_before
+    scheduled_for = Column(DateTime, nullable=False)  # זמן מקומי, כמו events.date
+    sent_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=text("timezone('utc', now())"))
+
+    __table_args__ = (
+        UniqueConstraint("guest_id", "reminder_type", name="uq_scheduled_reminders_guest_type"),
+        # "הגיע זמנן ועוד לא נשלחו" - רק תזכורות פתוחות באינדקס
+        Index("ix_scheduled_reminders_due", "scheduled_for", postgresql_where=text("sent_at IS NULL")),
+    )
+
+
+class SentNotification(Base):
+    """התראה שהבוט דיווח שנשלחה (POST /bot/notification/sent) - notification_id ייחודי"""
+    __tablename__ = "sent_notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(String, nullable=False, unique=True)
+    event_id = Column(Integer, nullable=True)
+    guest_id = Column(Integer, nullable=True)
+    notification_type = Column(String(50), nullable=True)
+    sent_at = Column(DateTime, nullable=False, default=datetime.now)
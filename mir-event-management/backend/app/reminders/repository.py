@@ -0,0 +1,124 @@
+"""
+תור התזכורות של הבוט (scheduled_reminders): שליפת התזכורות שהגיע זמנן ועוד לא נשלחו,
+ואישורי שליחה אידמפוטנטיים - אישור חוזר לא משנה את sent_at ולא מחזיר את התזכורת לתור.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.events.models import Event
+from app.guests.models import Guest
+from app.reminders.models import REMINDER_LEAD_TIMES, ScheduledReminder, SentNotification
+
+DUE_DEFAULT_LIMIT = 500
+DUE_MAX_LIMIT = 5000
+
+MAX_LEAD_TIME = max(REMINDER_LEAD_TIMES.values())
+
+
+def due_reminders(
+    db: Session,
+    reminder_type: Optional[str] = None,
+    limit: int = DUE_DEFAULT_LIMIT,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    תזכורות שזמנן הגיע, שעוד לא נשלחו ושהאירוע שלהן עוד לא התחיל - שאילתה אחת על האינדקס
+    החלקי ix_scheduled_reminders_due. הטווח נחתך ב-MAX_LEAD_TIME אחורה (תזכורת ישנה יותר
+    שייכת לאירוע שכבר עבר), כך שהעלות תלויה בתזכורות הפתוחות בלבד ולא במספר המוזמנים.
+    """
+    now = now or datetime.now()
+    query = (
+        db.query(
+            ScheduledReminder.id, ScheduledReminder.reminder_type, ScheduledReminder.scheduled_for,
+            Event.id, Event.name, Event.date, Event.location,
+            Guest.id, Guest.first_name, Guest.last_name, Guest.mobile_phone,
+        )
+        .join(Event, Event.id == ScheduledReminder.event_id)
+        .join(Guest, Guest.id == ScheduledReminder.guest_id)
+        .filter(
+            ScheduledReminder.sent_at.is_(None),
+            ScheduledReminder.scheduled_for <= now,
+            ScheduledReminder.scheduled_for > now - MAX_LEAD_TIME,
+            Event.date > now,
+        )
+    )
+    if reminder_type is not None:
+        query = query.filter(ScheduledReminder.reminder_type == reminder_type)
+    rows = query.order_by(ScheduledReminder.scheduled_for, ScheduledReminder.id).limit(limit).all()
+
+    return [
+        {
+            "reminder_id": reminder_id,
+            "event_id": event_id,
+            "event_name": event_name,
+            "event_date": event_date,
+            "event_location": event_location,
+            "guest_id": guest_id,
+            "guest_name": f"{first_name} {last_name}",
+            "guest_phone": mobile_phone or "",
+            "guest_whatsapp": mobile_phone or "",
+            "reminder_type": row_type,
+            "scheduled_for": scheduled_for,
+        }
+        for (
+            reminder_id, row_type, scheduled_for, event_id, event_name, event_date, event_location,
+            guest_id, first_name, last_name, mobile_phone,
+        ) in rows
+    ]
+
+
+def mark_reminders_sent(db: Session, reminder_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    סימון תזכורות כנשלחו. לכל מזהה: status = sent (סומנה עכשיו) / already_sent / not_found,
+    ו-sent_at - זמן השליחה הראשון
+    """
+    ids = sorted({int(reminder_id) for reminder_id in reminder_ids})
+    if not ids:
+        return {}
+    marked = dict(
+        db.execute(
+            update(ScheduledReminder)
+            .where(ScheduledReminder.id.in_(ids), ScheduledReminder.sent_at.is_(None))
+            .values(sent_at=datetime.now())
+            .returning(ScheduledReminder.id, ScheduledReminder.sent_at)
+        ).all()
+    )
+    db.commit()
+
+    results = {reminder_id: {"status": "sent", "sent_at": sent_at} for reminder_id, sent_at in marked.items()}
+    rest = [reminder_id for reminder_id in ids if reminder_id not in marked]
+    if rest:
+        for reminder_id, sent_at in db.query(ScheduledReminder.id, ScheduledReminder.sent_at).filter(ScheduledReminder.id.in_(rest)):
+            results[reminder_id] = {"status": "already_sent", "sent_at": sent_at}
+    for reminder_id in rest:
+        results.setdefault(reminder_id, {"status": "not_found", "sent_at": None})
+    return results
+
+
+def record_notification_sent(
+    db: Session,
+    notification_id: str,
+    event_id: Optional[int] = None,
+    guest_id: Optional[int] = None,
+    notification_type: Optional[str] = None,
+):
+    """שמירת התראה שנשלחה. מחזיר (השורה, already_sent) - דיווח חוזר מחזיר את השורה המקורית"""
+    inserted = db.execute(
+        insert(SentNotification)
+        .values(
+            notification_id=notification_id,
+            event_id=event_id,
+            guest_id=guest_id,
+            notification_type=notification_type,
+            sent_at=datetime.now(),
+        )
+        .on_conflict_do_nothing(index_elements=["notification_id"])
+        .returning(SentNotification.id)
+    ).scalar()
+    db.commit()
+    notification = db.query(SentNotification).filter(SentNotification.notification_id == notification_id).one()
+    return notification, inserted is None
@@ -0,0 +1,204 @@
+"""
+PDF של כל כרטיסי הישיבה של אירוע (GET /seatings/cards/{event_id}/download-all).
+
+התבנית, הפונט ומידות הכרטיס נקבעים פעם אחת לכל ג'וב (CardLayout), ה-QR של כל כרטיס
+מצויר מ-ImageReader בזיכרון (בלי קבצים זמניים), והתבנית והלוגו מצוירים לפי נתיב -
+reportlab מזהה את אותו קובץ ומטמיע אותו פעם אחת בלבד. הכרטיסים נטענים מהמסד בחלקים,
+ה-PDF נכתב לקובץ זמני ונשלח ממנו ב-chunks, כך שגם אלפי כרטיסים לא נאספים בזיכרון.
+"""
+import base64
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from PIL import Image
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from sqlalchemy.orm import Session
+
+from app.seatings.models import SeatingCard
+from app.seatings.seating_map import hebrew_font_name, reverse_hebrew_text
+
+CHUNK_ROWS = 500
+QR_PREFIX = 'data:image/png;base64,'
+
+
+def template_path_for_event(event_id: int) -> Optional[str]:
+    """נתיב תבנית הרקע שנשמרה לאירוע (uploads/templates/template_{event_id}.path), אם קיימת"""
+    template_path_hint = f"uploads/templates/template_{event_id}.path"
+    if not os.path.exists(template_path_hint):
+        return None
+    try:
+        with open(template_path_hint, 'r', encoding='utf-8') as f:
+            template_path = f.read().strip()
+    except Exception as e:
+        print(f"שגיאה בקריאת נתיב תבנית: {e}")
+        return None
+    return template_path if template_path and os.path.exists(template_path) else None
+
+
+@dataclass
+class CardLayout:
+    font_name: str
+    template_path: Optional[str]
+    card_x: float
+    card_y: float
+    card_width: float
+    card_height: float
+
+    @classmethod
+    def for_event(cls, event_id: int) -> "CardLayout":
+        # גודל כרטיס ברירת מחדל (אם אין תבנית) – 80% מרוחב הדף ו-30% מגובהו
+        card_width = A4[0] * 0.8
+        card_height = A4[1] * 0.3
+        template_path = template_path_for_event(event_id)
+
+        # אם יש תבנית – הגודל המקורי של התמונה, ורק אם היא גדולה מדי לעמוד – הקטנה פרופורציונלית
+        if template_path:
+            try:
+                with Image.open(template_path) as img:
+                    img_width, img_height = img.size
+                if img_width and img_height:
+                    card_width = float(img_width)
+                    card_height = float(img_height)
+                    scale = min(1.0, (A4[0] * 0.9) / card_width, (A4[1] * 0.9) / card_height)
+                    card_width *= scale
+                    card_height *= scale
+            except Exception as e:
+                print(f"שגיאה בקריאת גודל תבנית: {e}")
+
+        return cls(
+            font_name=hebrew_font_name(),
+            template_path=template_path,
+            card_x=(A4[0] - card_width) / 2,
+            card_y=(A4[1] - card_height) / 2,
+            card_width=card_width,
+            card_height=card_height,
+        )
+
+
+class CardRenderer:
+    def __init__(self, layout: CardLayout):
+        self.layout = layout
+        self._logo_exists: Dict[str, bool] = {}
+
+    def _draw_default_background(self, pdf: canvas.Canvas) -> None:
+        l = self.layout
+        pdf.setFillColor(colors.white)
+        pdf.rect(l.card_x, l.card_y, l.card_width, l.card_height, fill=True)
+        pdf.setStrokeColor(colors.black)
+        pdf.setLineWidth(2)
+        pdf.rect(l.card_x, l.card_y, l.card_width, l.card_height, fill=False)
+
+    def _has_logo(self, logo_path: Optional[str]) -> bool:
+        if not logo_path:
+            return False
+        if logo_path not in self._logo_exists:
+            self._logo_exists[logo_path] = os.path.exists(logo_path)
+        return self._logo_exists[logo_path]
+
+    def draw(self, pdf: canvas.Canvas, card_id: int, qr_code: str, card_data: Dict[str, Any], logo_path: Optional[str]) -> None:
+        l = self.layout
+
+        if l.template_path:
+            try:
+                # ציור הרקע מתוך התבנית
+                pdf.drawImage(l.template_path, l.card_x, l.card_y, width=l.card_width, height=l.card_height)
+            except Exception as e:
+                print(f"שגיאה בציור תבנית: {e}")
+                self._draw_default_background(pdf)
+        else:
+            self._draw_default_background(pdf)
+
+        # לוגו (אם קיים) - בפינה התחתונה של הכרטיס
+        if self._has_logo(logo_path):
+            try:
+                pdf.drawImage(logo_path, l.card_x + 1*cm, l.card_y + 1*cm, width=2*cm, height=2*cm)
+            except Exception as e:
+                print(f"שגיאה בהוספת לוגו: {e}")
+
+        # שם המוזמן – כותרת גדולה במרכז העליון
+        pdf.setFont(l.font_name, 22)
+        pdf.setFillColor(colors.darkblue)
+        guest_name = card_data.get("guest_name", "")
+        text_center_x = l.card_x + l.card_width / 2
+        guest_name_y = l.card_y + l.card_height - 1.5*cm
+        pdf.drawCentredString(text_center_x, guest_name_y, reverse_hebrew_text(guest_name))
+
+        # שאר פרטי הכרטיס - טקסט גדול מתחת לשם
+        pdf.setFont(l.font_name, 18)
+        pdf.setFillColor(colors.black)
+        text_y = guest_name_y - 1.6*cm
+
+        # קביעת לשון פנייה לפי מגדר
+        gender = (card_data.get("gender") or "").strip()
+        invite_verb = "מוזמנת" if gender in ["נקבה", "female", "f"] else "מוזמן"
+
+        pdf.drawCentredString(text_center_x, text_y, reverse_hebrew_text(f"שלום {guest_name}"))
+        text_y -= 1.2*cm
+        event_name = card_data.get("event_name", "")
+        pdf.drawCentredString(text_center_x, text_y, reverse_hebrew_text(f"הנך {invite_verb} לאירוע {event_name}"))
+        text_y -= 1.2*cm
+        pdf.drawCentredString(text_center_x, text_y, reverse_hebrew_text("נשמח לראותך!"))
+        text_y -= 1.2*cm
+
+        # מספר כסא (המספר הפוך פעמיים כדי שיישאר תקין אחרי הפיכת השורה)
+        if card_data.get('seat_number'):
+            seat_number_fixed = str(card_data['seat_number'])[::-1]
+            pdf.drawCentredString(text_center_x, text_y, reverse_hebrew_text(f"מספר כסא: {seat_number_fixed}"))
+
+        # QR Code - בצד ימין למטה
+        try:
+            if qr_code.startswith(QR_PREFIX):
+                qr_image = ImageReader(BytesIO(base64.b64decode(qr_code[len(QR_PREFIX):])))
+                qr_size = 5*cm
+                pdf.drawImage(qr_image, l.card_x + l.card_width - qr_size - 2*cm, l.card_y + 2*cm, width=qr_size, height=qr_size)
+            elif os.path.exists(qr_code):
+                # אם זה לא base64 - נתיב קובץ
+                pdf.drawImage(qr_code, l.card_x + 2*cm, l.card_y + 2*cm, width=4*cm, height=4*cm)
+        except Exception as e:
+            print(f"שגיאה בהוספת QR Code לכרטיס {card_id}: {e}")
+
+
+def render_cards_pdf(db: Session, event_id: int, out) -> int:
+    """כתיבת PDF של כל הכרטיסים (עמוד לכרטיס) ל-out. מחזיר את מספר הכרטיסים"""
+    renderer = CardRenderer(CardLayout.for_event(event_id))
+    pdf = canvas.Canvas(out, pagesize=A4)
+    statement = (
+        db.query(SeatingCard.id, SeatingCard.qr_code, SeatingCard.card_data, SeatingCard.logo_path)
+        .filter(SeatingCard.event_id == event_id)
+        .order_by(SeatingCard.id)
+        .execution_options(yield_per=CHUNK_ROWS)
+    )
+    count = 0
+    for card_id, qr_code, card_data, logo_path in statement:
+        if count:
+            pdf.showPage()
+        try:
+            data = json.loads(card_data)
+        except Exception as e:
+            print(f"Error parsing card data for {card_id}: {e}")
+            data = {}
+        renderer.draw(pdf, card_id, qr_code, data, logo_path)
+        count += 1
+    pdf.save()
+    return count
+
+
+def render_cards_pdf_file(db: Session, event_id: int):
+    """רינדור ה-PDF לקובץ זמני - נקרא ב-handler לפני יצירת התגובה, כדי ששגיאה תחזיר 500.
+    מחזיר (קובץ, מספר כרטיסים); הקובץ נסגר ע"י מי ששולח אותו"""
+    tmp = tempfile.TemporaryFile()
+    try:
+        count = render_cards_pdf(db, event_id, tmp)
+    except Exception:
+        tmp.close()
+        raise
+    print(f"PDF כרטיסי ישיבה לאירוע {event_id}: {count} כרטיסים, {tmp.tell()} bytes")
+    return tmp, count
@@ -7,9 +7,9 @@ class Seating(Base):
     __tablename__ = "seatings"
 
     id = Column(Integer, primary_key=True, index=True)
-    guest_id = Column(Integer, ForeignKey("guests.id"), nullable=False)
+    guest_id = Column(Integer, ForeignKey("guests.id"), nullable=False, index=True)
     event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
-    table_id = Column(Integer, ForeignKey("tables.id"), nullable=False)
+    table_id = Column(Integer, ForeignKey("tables.id"), nullable=False, index=True)
     seat_number = Column(Integer, nullable=True)
     is_occupied = Column(Boolean, default=False)  # NEW: Is the seat occupied
     occupied_at = Column(DateTime, nullable=True)  # NEW: When was it occupied
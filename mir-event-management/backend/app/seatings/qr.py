@@ -0,0 +1,98 @@
+"""
+רינדור QR Codes לכרטיסי ישיבה.
+
+render_many מרנדר רשימת payloads: באצ' גדול מתפצל ל-process pool (הרינדור הוא CPU בלבד),
+ומטמון לפי hash של ה-payload חוסך רינדור חוזר של אותו תוכן - למשל ב-force_recreate,
+שבו רק מוזמנים שהפרטים שלהם השתנו מקבלים QR חדש.
+"""
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, Optional
+
+import qrcode
+
+from app.core.config import settings
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def payload_hash(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_data_url(payload: str) -> str:
+    """QR Code כ-data URL של PNG (base64)"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    img_str = base64.b64encode(buffer.getvalue()).decode()
+    return f"data:image/png;base64,{img_str}"
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn - לא משכפלים את ה-threads ואת חיבורי המסד של תהליך ה-API
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.CARD_QR_PROCESSES or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _remember(key: str, data_url: str) -> None:
+    with _cache_lock:
+        _cache[key] = data_url
+        _cache.move_to_end(key)
+        while len(_cache) > settings.CARD_QR_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def render_many(payloads: Iterable[str], known: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    payload_hash -> data URL לכל ה-payloads. known הוא מילון hash -> data URL שכבר קיים
+    (למשל מכרטיסים קודמים); רק מה שלא נמצא בו ולא במטמון מרונדר.
+    """
+    result: Dict[str, str] = {}
+    missing: Dict[str, str] = {}
+    with _cache_lock:
+        for payload in payloads:
+            key = payload_hash(payload)
+            if key in result or key in missing:
+                continue
+            if known and key in known:
+                result[key] = known[key]
+            elif key in _cache:
+                _cache.move_to_end(key)
+                result[key] = _cache[key]
+            else:
+                missing[key] = payload
+
+    if not missing:
+        return result
+
+    keys = list(missing)
+    if len(keys) >= settings.CARD_QR_POOL_MIN_ITEMS:
+        chunksize = max(1, len(keys) // ((settings.CARD_QR_PROCESSES or os.cpu_count() or 1) * 4))
+        rendered = list(_get_pool().map(render_data_url, (missing[k] for k in keys), chunksize=chunksize))
+    else:
+        rendered = [render_data_url(missing[k]) for k in keys]
+
+    for key, data_url in zip(keys, rendered):
+        _remember(key, data_url)
+        result[key] = data_url
+    return result
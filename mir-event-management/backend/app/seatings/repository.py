@@ -1,17 +1,18 @@
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session, joinedload
 from app.seatings import schemas, models
 from app.seatings.models import Seating, SeatingCard
 from fastapi import HTTPException
 from sqlalchemy.exc import IntegrityError
-from app.audit_log.repository import log_change
+from app.audit_log.repository import log_change, log_changes
 from app.guests.models import Guest
 from app.tables.models import Table
 from app.events.models import Event
+from app.seatings import qr
+from app.realtime import scan_tokens
 import json
-import qrcode
-import base64
-from io import BytesIO
-import os
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
 
 def assign_seat(db: Session, seating: schemas.SeatingCreate, user_id: int = None):
     new_seating = Seating(**seating.dict())
@@ -46,67 +47,172 @@ def assign_seat(db: Session, seating: schemas.SeatingCreate, user_id: int = None
         db.rollback()
         raise HTTPException(status_code=400, detail="Guest already assigned to a table in this event")
 
-def get_seatings_by_event(db: Session, event_id: int):
+class SeatingRow(NamedTuple):
+    """שורת קריאה של מקום ישיבה: שדות ה-seating + פרטי המוזמן והשולחן הדרושים לתצוגה ולייצוא"""
+    id: int
+    event_id: int
+    table_id: int
+    guest_id: int
+    seat_number: Optional[int]
+    is_occupied: Optional[bool]
+    occupied_at: Optional[datetime]
+    occupied_by: Optional[int]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    guest_gender: Optional[str]
+    table_head_id: Optional[int]
+    mobile_phone: Optional[str]
+    email: Optional[str]
+    table_number: Optional[int]
+    table_size: Optional[int]
+
+    @property
+    def has_guest(self) -> bool:
+        return self.first_name is not None
+
+    @property
+    def has_table(self) -> bool:
+        return self.table_number is not None
+
+    @property
+    def guest_name(self) -> Optional[str]:
+        return f"{self.first_name} {self.last_name}" if self.has_guest else None
+
+
+_SEATING_ROW_COLUMNS = (
+    Seating.id, Seating.event_id, Seating.table_id, Seating.guest_id, Seating.seat_number,
+    Seating.is_occupied, Seating.occupied_at, Seating.occupied_by, Seating.created_at, Seating.updated_at,
+    Guest.first_name, Guest.last_name, Guest.gender, Guest.table_head_id, Guest.mobile_phone, Guest.email,
+    Table.table_number, Table.size,
+)
+
+
+def get_seating_rows(db: Session, event_id: int) -> List[SeatingRow]:
+    """כל מקומות הישיבה של האירוע בשאילתה אחת (בלי לטעון אובייקטי ORM)"""
+    rows = (
+        db.query(*_SEATING_ROW_COLUMNS)
+        .outerjoin(Guest, Guest.id == Seating.guest_id)
+        .outerjoin(Table, Table.id == Seating.table_id)
+        .filter(Seating.event_id == event_id)
+        .all()
+    )
+    return [SeatingRow(*row) for row in rows]
+
+def _plan_table_lookup(tables: List[Dict[str, Any]]) -> Dict[Any, Any]:
+    """tableNumber של מוזמן -> table id. מוזמן משויך לשולחן הראשון שה-table_number או ה-id שלו
+    שווים ל-tableNumber (כמו הסריקה הלינארית שהייתה), אבל בחיפוש במילון"""
+    lookup: Dict[Any, Any] = {}
+    for table in tables:
+        lookup.setdefault(table.get("table_number"), table.get("id"))
+        lookup.setdefault(table.get("id"), table.get("id"))
+    return lookup
+
+
+def save_seating_plan(
+    db: Session,
+    event_id: int,
+    tables: List[Dict[str, Any]],
+    guests: List[Dict[str, Any]],
+    user_id: int = None,
+) -> Dict[str, int]:
+    """
+    שמירת תוכנית ישיבה שלמה לפי הפרש מול המצב הקיים: INSERT אחד למקומות חדשים,
+    UPDATE אחד למקומות שזזו, DELETE אחד למקומות שהוסרו, ורישום הלוג ב-INSERT אחד -
+    הכל בטרנזקציה אחת.
+    """
+    table_lookup = _plan_table_lookup(tables)
+
+    # guest_id -> (table_id, seat_number); מוזמן שמופיע פעמיים - ההופעה האחרונה קובעת
+    planned: Dict[int, tuple] = {}
+    for guest in guests:
+        table_id = table_lookup.get(guest.get("tableNumber"))
+        if table_id:
+            planned[guest["id"]] = (table_id, guest.get("seatNumber"))
+
+    existing = (
+        db.query(Seating.id, Seating.guest_id, Seating.table_id, Seating.seat_number)
+        .filter(Seating.event_id == event_id)
+        .all()
+    )
+    existing_by_guest = {row.guest_id: row for row in existing}
+
+    now = datetime.utcnow()
+    to_insert = []
+    to_update = []
+    for guest_id, (table_id, seat_number) in planned.items():
+        current = existing_by_guest.get(guest_id)
+        if current is None:
+            to_insert.append({
+                "guest_id": guest_id,
+                "event_id": event_id,
+                "table_id": table_id,
+                "seat_number": seat_number,
+                "is_occupied": False,
+                "created_at": now,
+                "updated_at": now,
+            })
+        elif current.table_id != table_id or current.seat_number != seat_number:
+            to_update.append({"id": current.id, "table_id": table_id, "seat_number": seat_number, "updated_at": now})
+
+    # מקומות של מוזמנים שלא מופיעים יותר בתוכנית (מוזמן שמופיע בלי שולחן תקין נשאר כמו שהוא)
+    plan_guest_ids = {guest["id"] for guest in guests}
+    to_delete = [row.id for row in existing if row.guest_id not in plan_guest_ids]
+
     try:
-        print(f"מתחיל לטעון seatings לאירוע {event_id}")
-        
-        # בדיקה כללית של כל ה-seatings
-        total_seatings = db.query(Seating).count()
-        print(f"סהכ seatings בדאטהבייס: {total_seatings}")
-        
-        # בדיקה ישירה של המוזמנים
-        guests = db.query(Guest).filter(Guest.event_id == event_id).all()
-        print(f"נמצאו {len(guests)} מוזמנים לאירוע {event_id}")
-        for guest in guests:
-            print(f"Guest {guest.id}: {guest.first_name} {guest.last_name}, Gender: {guest.gender}")
-        
-        # בדיקה ישירה של seatings
-        all_seatings = db.query(Seating).filter(Seating.event_id == event_id).all()
-        print(f"נמצאו {len(all_seatings)} seatings לאירוע {event_id}")
-        
-        seatings = db.query(Seating).options(
-            joinedload(Seating.guest),
-            joinedload(Seating.table)
-        ).filter(Seating.event_id == event_id).all()
-        
-        print(f"נמצאו {len(seatings)} seatings עם joins")
-        
-        # הוספת מידע על המוזמן לכל seating
-        result = []
-        for seating in seatings:
-            guest_gender = seating.guest.gender if seating.guest else None
-            guest_name = f"{seating.guest.first_name} {seating.guest.last_name}" if seating.guest else None
-            
-            print(f"Seating {seating.id}: Guest {guest_name}, Gender: {guest_gender}")
-            print(f"Guest object: {seating.guest}")
-            if seating.guest:
-                print(f"Guest gender field: {seating.guest.gender}")
-                print(f"Guest first_name: {seating.guest.first_name}")
-                print(f"Guest last_name: {seating.guest.last_name}")
-            
-            seating_dict = {
-                "id": seating.id,
-                "event_id": seating.event_id,
-                "table_id": seating.table_id,
-                "guest_id": seating.guest_id,
-                "seat_number": seating.seat_number,
-                "is_occupied": seating.is_occupied,
-                "occupied_at": seating.occupied_at,
-                "occupied_by": seating.occupied_by,
-                "guest_name": guest_name,
-                "guest_gender": guest_gender,
-                "table_number": seating.table.table_number if seating.table else None,
-                "table_size": seating.table.size if seating.table else None
-            }
-            result.append(seating_dict)
-        
-        print(f"נמצאו {len(result)} seatings")
-        return result
-    except Exception as e:
-        print(f"שגיאה בטעינת seatings: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return []
+        if to_delete:
+            # מחיקת כרטיסי ישיבה קודם (כי הם מתייחסים ל-seatings)
+            db.execute(delete(SeatingCard).where(SeatingCard.seating_id.in_(to_delete)))
+            db.execute(delete(Seating).where(Seating.id.in_(to_delete)))
+        if to_update:
+            db.execute(update(Seating), to_update)
+        created = []
+        if to_insert:
+            created = db.execute(insert(Seating).returning(Seating.id, Seating.guest_id, Seating.table_id), to_insert).all()
+            _log_created_seatings(db, event_id, created, user_id)
+
+        from app.seatings import snapshot as seating_snapshot
+        seating_snapshot.mark_changed(db, event_id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid guest or table in seating plan")
+
+    return {
+        "created_seatings": len(created),
+        "updated_seatings": len(to_update),
+        "deleted_seatings": len(to_delete),
+    }
+
+
+def _log_created_seatings(db: Session, event_id: int, created: list, user_id: int = None) -> None:
+    """רישום בלוג של מקומות ישיבה חדשים (כמו ב-assign_seat), בשתי שאילתות ו-INSERT אחד"""
+    guest_ids = {row.guest_id for row in created}
+    table_ids = {row.table_id for row in created}
+    guest_names = {
+        guest_id: f"{first_name} {last_name}"
+        for guest_id, first_name, last_name in db.query(Guest.id, Guest.first_name, Guest.last_name)
+        .filter(Guest.id.in_(guest_ids))
+    }
+    table_infos = {
+        table_id: f"שולחן {table_number} ({size} מקומות)"
+        for table_id, table_number, size in db.query(Table.id, Table.table_number, Table.size)
+        .filter(Table.id.in_(table_ids))
+    }
+    log_changes(db, user_id, [
+        {
+            "action": "create",
+            "entity_type": "Seating",
+            "entity_id": row.id,
+            "field": "table_id",
+            "old_value": "",
+            "new_value": f"{guest_names.get(row.guest_id, 'מוזמן לא ידוע')} הוקצה ל{table_infos.get(row.table_id, 'שולחן לא ידוע')}",
+            "event_id": event_id,
+        }
+        for row in created
+    ])
+
 
 def delete_seating(db: Session, seating_id: int, user_id: int = None):
     db_seating = db.query(Seating).filter(Seating.id == seating_id).first()
@@ -223,34 +329,37 @@ def update_seating(db: Session, seating_id: int, seating_update: dict, user_id:
 
 def delete_seatings_by_event(db: Session, event_id: int, user_id: int = None):
     """מחיקת כל מקומות הישיבה לאירוע מסוים"""
-    seatings = db.query(Seating).filter(Seating.event_id == event_id).all()
-    
-    # תיעוד בלוג לפני המחיקה
-    for seating in seatings:
-        
-        guest = db.query(Guest).filter(Guest.id == seating.guest_id).first()
-        table = db.query(Table).filter(Table.id == seating.table_id).first()
-        
-        guest_name = f"{guest.first_name} {guest.last_name}" if guest else "מוזמן לא ידוע"
-        table_info = f"שולחן {table.table_number}" if table else "שולחן לא ידוע"
-        
-        log_change(
-            db=db,
-            user_id=user_id,
-            action="delete",
-            entity_type="Seating",
-            entity_id=seating.id,
-            field="event_id",
-            old_value=f"{guest_name} הוסר מ{table_info}",
-            new_value="",
-            event_id=event_id
-        )
-    
+    seatings = (
+        db.query(Seating.id, Guest.first_name, Guest.last_name, Table.table_number)
+        .outerjoin(Guest, Guest.id == Seating.guest_id)
+        .outerjoin(Table, Table.id == Seating.table_id)
+        .filter(Seating.event_id == event_id)
+        .all()
+    )
+
+    # תיעוד בלוג לפני המחיקה - המוזמנים והשולחנות באותה שאילתה, והרשומות נכתבות ב-INSERT אחד
+    entries = []
+    for seating_id, first_name, last_name, table_number in seatings:
+        guest_name = f"{first_name} {last_name}" if first_name is not None else "מוזמן לא ידוע"
+        table_info = f"שולחן {table_number}" if table_number is not None else "שולחן לא ידוע"
+        entries.append({
+            "action": "delete",
+            "entity_type": "Seating",
+            "entity_id": seating_id,
+            "field": "event_id",
+            "old_value": f"{guest_name} הוסר מ{table_info}",
+            "new_value": "",
+            "event_id": event_id,
+        })
+    log_changes(db, user_id, entries)
+
     # מחיקת כרטיסי ישיבה קודם (כי הם מתייחסים ל-seatings)
     db.query(SeatingCard).filter(SeatingCard.event_id == event_id).delete(synchronize_session=False)
     
     # מחיקת כל מקומות הישיבה
     db.query(Seating).filter(Seating.event_id == event_id).delete(synchronize_session=False)
+    from app.seatings import snapshot as seating_snapshot
+    seating_snapshot.mark_changed(db, event_id)
     db.commit()
     
     return len(seatings)
@@ -281,33 +390,32 @@ def update_card_download_status(db: Session, card_id: int, is_downloaded: bool):
 
 def generate_qr_code(data: str) -> str:
     """יצירת QR Code מנתונים"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    # המרה ל-base64
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+    return qr.render_data_url(data)
 
 def delete_seating_cards_by_event(db: Session, event_id: int):
     """מחיקת כל כרטיסי הישיבה לאירוע מסוים"""
-    cards = db.query(SeatingCard).filter(SeatingCard.event_id == event_id).all()
-    for card in cards:
-        db.delete(card)
+    deleted = db.query(SeatingCard).filter(SeatingCard.event_id == event_id).delete(synchronize_session=False)
     db.commit()
-    return len(cards)
+    return deleted
+
+def card_qr_payload(event_id: int, first_name: str, last_name: str, mobile_phone: Optional[str], scan_token: Optional[str] = None) -> str:
+    """תוכן ה-QR בכרטיס - זיהוי מוזמן + אירוע בלבד, בלי פרטי מקום. token משמש לסריקה בכניסה"""
+    payload = {
+        "event_id": event_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "phone": mobile_phone or ""
+    }
+    if scan_token:
+        payload["token"] = scan_token
+    return json.dumps(payload)
 
 def generate_cards_for_event(db: Session, event_id: int, logo_path: str = None, force_recreate: bool = False):
-    """יצירת כרטיסי ישיבה לכל המוזמנים שהגיעו"""
-    
-    print(f"מתחיל יצירת כרטיסים לאירוע {event_id}")
-    print(f"נתיב לוגו: {logo_path}")
-    print(f"לוגו קיים: {os.path.exists(logo_path) if logo_path else False}")
+    """
+    יצירת כרטיסי ישיבה לכל המוזמנים שהגיעו: שאילתה אחת למוזמנים + מקומות + שולחנות,
+    QR Codes בבאץ' (process pool + מטמון לפי hash של התוכן) ו-INSERT אחד לכל הכרטיסים.
+    """
+    print(f"מתחיל יצירת כרטיסים לאירוע {event_id}, לוגו: {logo_path}")
     
     # בדיקה אם כבר קיימים כרטיסים לאירוע זה
     existing_cards = db.query(SeatingCard).filter(SeatingCard.event_id == event_id).all()
@@ -315,78 +423,79 @@ def generate_cards_for_event(db: Session, event_id: int, logo_path: str = None,
         print(f"כבר קיימים {len(existing_cards)} כרטיסים לאירוע זה. לא יוצרים חדשים.")
         return existing_cards
     
-    # אם יש כרטיסים קיימים ורוצים ליצור מחדש, נמחק אותם
-    if existing_cards and force_recreate:
-        print(f"מוחק {len(existing_cards)} כרטיסים קיימים ויוצר חדשים")
-        delete_seating_cards_by_event(db, event_id)
+    # QR של כרטיסים קיימים לפי hash התוכן - מוזמן שהפרטים שלו לא השתנו לא מרונדר מחדש
+    known_qr = {}
+    for card in existing_cards:
+        try:
+            qr_hash = json.loads(card.card_data).get("qr_hash")
+        except (TypeError, ValueError, AttributeError):
+            qr_hash = None
+        if qr_hash:
+            known_qr[qr_hash] = card.qr_code
     
-    # קבלת כל המוזמנים שהגיעו לאירוע
-    confirmed_guests = db.query(Guest).filter(
-        Guest.event_id == event_id,
-        Guest.confirmed_arrival == True
-    ).all()
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        print(f"אירוע {event_id} לא נמצא")
+        return []
     
-    print(f"נמצאו {len(confirmed_guests)} מוזמנים עם אישור הגעה")
+    # טוקני סריקה למוזמנים שעדיין אין להם - נכנסים ל-QR (נשמרים ב-commit של הכרטיסים)
+    scan_tokens.ensure_tokens(db, event_id)
     
-    created_cards = []
+    # כל המוזמנים שהגיעו, עם מקום ישיבה ושולחן (מוזמן בלי מקום או שולחן מדולג)
+    rows = (
+        db.query(
+            Guest.id, Guest.first_name, Guest.last_name, Guest.mobile_phone, Guest.scan_token, Guest.gender,
+            Seating.id, Seating.seat_number, Table.table_number,
+        )
+        .join(Seating, (Seating.guest_id == Guest.id) & (Seating.event_id == event_id))
+        .join(Table, Table.id == Seating.table_id)
+        .filter(Guest.event_id == event_id, Guest.confirmed_arrival == True)
+        .order_by(Guest.id, Seating.id)
+        .all()
+    )
+    seated = {}
+    for row in rows:
+        seated.setdefault(row[0], row)
     
-    for guest in confirmed_guests:
-        # בדיקה אם יש מקום ישיבה למוזמן
-        seating = db.query(Seating).filter(
-            Seating.guest_id == guest.id,
-            Seating.event_id == event_id
-        ).first()
-        
-        if not seating:
-            print(f"אין מקום ישיבה למוזמן {guest.first_name} {guest.last_name}")
-            continue
-            
-        # קבלת פרטי השולחן
-        table = db.query(Table).filter(Table.id == seating.table_id).first()
-        event = db.query(Event).filter(Event.id == event_id).first()
-        
-        if not table or not event:
-            print(f"חסרים פרטי שולחן או אירוע למוזמן {guest.first_name} {guest.last_name}")
-            continue
-            
-        # יצירת QR Code - כעת ללא פרטי מקום; רק זיהוי מוזמן + אירוע
-        qr_data = json.dumps({
-            "event_id": event_id,
-            "first_name": guest.first_name,
-            "last_name": guest.last_name,
-            "phone": guest.mobile_phone or ""
-        })
-        
-        print(f"QR Code data for {guest.first_name} {guest.last_name}: {qr_data}")
-        
-        qr_code = generate_qr_code(qr_data)
-        
-        # יצירת נתוני הכרטיס
+    payloads = {
+        guest_id: card_qr_payload(event_id, first_name, last_name, mobile_phone, scan_token)
+        for guest_id, first_name, last_name, mobile_phone, scan_token, *_ in seated.values()
+    }
+    qr_codes = qr.render_many(payloads.values(), known=known_qr)
+    print(f"{len(seated)} מוזמנים עם מקום ישיבה, {len(known_qr)} QR קיימים לשימוש חוזר")
+    
+    card_rows = []
+    for guest_id, first_name, last_name, mobile_phone, scan_token, gender, seating_id, seat_number, table_number in seated.values():
+        qr_hash = qr.payload_hash(payloads[guest_id])
+        qr_code = qr_codes[qr_hash]
         card_data = {
-            "guest_name": f"{guest.first_name} {guest.last_name}",
+            "guest_name": f"{first_name} {last_name}",
             "event_name": event.name,
-            "table_number": table.table_number,
-            "seat_number": seating.seat_number,
+            "table_number": table_number,
+            "seat_number": seat_number,
             "qr_code": qr_code,
-            "gender": guest.gender  # לשון פנייה בכרטיס
+            "gender": gender,  # לשון פנייה בכרטיס
+            "qr_hash": qr_hash
         }
-        
-        print(f"יוצר כרטיס למוזמן: {guest.first_name} {guest.last_name}")
-        print(f"לוגו שישמר: {logo_path}")
-        
-        # יצירת כרטיס ישיבה
-        card_create = schemas.SeatingCardCreate(
-            event_id=event_id,
-            guest_id=guest.id,
-            seating_id=seating.id,
-            qr_code=qr_code,
-            card_data=json.dumps(card_data),
-            logo_path=logo_path
-        )
-        
-        created_card = create_seating_card(db, card_create)
-        created_cards.append(created_card)
-        print(f"כרטיס נוצר בהצלחה עם ID: {created_card.id}")
+        card_rows.append({
+            "event_id": event_id,
+            "guest_id": guest_id,
+            "seating_id": seating_id,
+            "qr_code": qr_code,
+            "card_data": json.dumps(card_data),
+            "logo_path": logo_path,
+            "is_downloaded": False
+        })
+    
+    # מחיקת הכרטיסים הקיימים (force_recreate) והכנסת החדשים באותה טרנזקציה
+    if existing_cards:
+        print(f"מוחק {len(existing_cards)} כרטיסים קיימים ויוצר חדשים")
+        db.query(SeatingCard).filter(SeatingCard.event_id == event_id).delete(synchronize_session=False)
+    created_cards = db.scalars(insert(SeatingCard).returning(SeatingCard), card_rows).all() if card_rows else []
+    # הכרטיסים חוזרים מלאים מה-RETURNING - מנתקים אותם כדי שה-commit לא יסמן אותם לטעינה מחדש
+    for card in created_cards:
+        db.expunge(card)
+    db.commit()
     
     print(f"סה״כ נוצרו {len(created_cards)} כרטיסים")
     return created_cards
@@ -0,0 +1,315 @@
+"""
+מפת ישיבה מסוננת - שירות הנתונים וה-PDF.
+
+build_filtered_map בונה את מפת הישיבה (לפי פילטרים) מה-snapshot של האירוע, ומשמש גם את
+GET /seatings/export-seating-map-filtered (JSON) וגם את גרסת ה-PDF, שקוראת לו ישירות
+(בלי בקשת HTTP פנימית). ה-PDF נבנה במלואו ב-handler לפני יצירת התגובה (שגיאה ברינדור
+מחזירה 500), ואז נשלח ב-chunks עם iter_file_chunks.
+"""
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from sqlalchemy.orm import Session
+
+from app.seatings import snapshot as seating_snapshot
+
+DEFAULT_TABLE_CAPACITY = 8
+PDF_CHUNK_SIZE = 64 * 1024
+TABLES_PER_PAGE = 3
+
+
+def build_filtered_map(
+    db: Session,
+    event_id: int,
+    include_empty_seats: bool = False,
+    gender_filter: Optional[str] = None,
+    guest_type_filter: Optional[str] = None,
+    category_filter: Optional[str] = None,
+) -> Dict[str, Any]:
+    """מפת ישיבה לפי פילטרים + סטטיסטיקות (המבנה שמחזיר ה-endpoint של ה-JSON)"""
+    snapshot = seating_snapshot.get_snapshot(db, event_id)
+    table_heads_dict = snapshot.table_heads
+
+    # יצירת מילון של שולחנות עם מקומות ישיבה
+    seating_map: Dict[int, Dict[str, Any]] = {}
+    for table in snapshot.tables:
+        seating_map[table.table_number] = {
+            "table_id": table.id,
+            "table_number": table.table_number,
+            "capacity": DEFAULT_TABLE_CAPACITY,
+            "seats": [],
+        }
+
+    # מילוי המקומות התפוסים
+    for seating in snapshot.rows:
+        if not seating.has_table:
+            continue
+
+        if seating.has_guest:
+            # פילטר מגדר
+            if gender_filter and gender_filter.lower() != (seating.guest_gender or "").lower():
+                continue
+            # פילטר סוג מוזמן - למוזמנים אין שדה guest_type, ולכן הפילטר לא מסנן
+            # פילטר קטגוריה
+            if category_filter and seating.table_head_id:
+                if category_filter.lower() != table_heads_dict.get(seating.table_head_id, "").lower():
+                    continue
+        elif not include_empty_seats:
+            # אם אין guest, נכלול רק אם רוצים מקומות ריקים
+            continue
+
+        guest_name = ""
+        category = "ללא קטגוריה"
+        gender = ""
+        if seating.has_guest:
+            guest_name = seating.guest_name.strip()
+            if seating.table_head_id:
+                category = table_heads_dict.get(seating.table_head_id, "ללא קטגוריה")
+            gender = seating.guest_gender or ""
+
+        seating_map[seating.table_number]["seats"].append({
+            "seat_number": seating.seat_number,
+            "guest_name": guest_name,
+            "category": category,
+            "gender": gender,
+            "guest_type": "",
+            "is_occupied": seating.has_guest,
+        })
+
+    # הוספת מקומות ריקים אם נדרש
+    if include_empty_seats:
+        for table_data in seating_map.values():
+            occupied_seats = {seat["seat_number"] for seat in table_data["seats"]}
+            for seat_num in range(1, table_data["capacity"] + 1):
+                if seat_num not in occupied_seats:
+                    table_data["seats"].append({
+                        "seat_number": seat_num,
+                        "guest_name": "",
+                        "category": "",
+                        "gender": "",
+                        "guest_type": "",
+                        "is_occupied": False,
+                    })
+            # מיון לפי מספר כסא
+            table_data["seats"].sort(key=lambda x: x["seat_number"])
+
+    # סטטיסטיקות
+    total_seats = 0
+    occupied_seats = 0
+    gender_stats: Dict[str, int] = {}
+    category_stats: Dict[str, int] = {}
+    for table_data in seating_map.values():
+        total_seats += len(table_data["seats"])
+        for seat in table_data["seats"]:
+            if not seat["is_occupied"]:
+                continue
+            occupied_seats += 1
+            if seat["gender"]:
+                gender = seat["gender"].lower()
+                gender_stats[gender] = gender_stats.get(gender, 0) + 1
+            if seat["category"]:
+                category_stats[seat["category"]] = category_stats.get(seat["category"], 0) + 1
+
+    return {
+        "event_id": event_id,
+        "filters": {
+            "include_empty_seats": include_empty_seats,
+            "gender_filter": gender_filter,
+            "guest_type_filter": guest_type_filter,
+            "category_filter": category_filter,
+        },
+        "seating_map": seating_map,
+        "statistics": {
+            "total_tables": len(seating_map),
+            "total_seats": total_seats,
+            "occupied_seats": occupied_seats,
+            "empty_seats": total_seats - occupied_seats,
+            "gender_distribution": gender_stats,
+            "category_distribution": category_stats,
+        },
+    }
+
+
+@lru_cache(maxsize=1)
+def hebrew_font_name() -> str:
+    """רישום פונט עברי (פעם אחת לתהליך). מחזיר את שם הפונט לשימוש ב-canvas"""
+    for font in ('Arial', 'David', 'Times New Roman'):
+        try:
+            pdfmetrics.registerFont(TTFont('Hebrew', f'{font}.ttf'))
+            return 'Hebrew'
+        except Exception:
+            continue
+    return 'Helvetica'
+
+
+def reverse_hebrew_text(text: str) -> str:
+    return text[::-1]
+
+
+def filtered_map_filename(
+    event_id: int,
+    include_empty_seats: bool = False,
+    gender_filter: Optional[str] = None,
+    guest_type_filter: Optional[str] = None,
+    category_filter: Optional[str] = None,
+) -> str:
+    filename_parts = [f"seating_map_filtered_{event_id}"]
+    if include_empty_seats:
+        filename_parts.append("with_empty")
+    if gender_filter:
+        filename_parts.append(f"gender_{gender_filter}")
+    if guest_type_filter:
+        filename_parts.append(f"type_{guest_type_filter}")
+    if category_filter:
+        filename_parts.append(f"category_{category_filter}")
+    return "_".join(filename_parts) + ".pdf"
+
+
+def _draw_header(pdf: canvas.Canvas, font_name: str, filters: Dict[str, Any], statistics: Dict[str, Any]) -> None:
+    # כותרת ראשית
+    pdf.setFont(font_name, 20)
+    pdf.setFillColor(colors.darkblue)
+    pdf.drawCentredString(A4[0]/2, A4[1]-2*cm, reverse_hebrew_text("מפת ישיבה - דוח מסונן"))
+
+    # פרטי הפילטרים
+    pdf.setFont(font_name, 12)
+    pdf.setFillColor(colors.black)
+    filter_text = "פילטרים: "
+    if filters["include_empty_seats"]:
+        filter_text += "כולל מקומות ריקים, "
+    if filters["gender_filter"]:
+        filter_text += f"מגדר: {filters['gender_filter']}, "
+    if filters["guest_type_filter"]:
+        filter_text += f"סוג מוזמן: {filters['guest_type_filter']}, "
+    if filters["category_filter"]:
+        filter_text += f"קטגוריה: {filters['category_filter']}, "
+    if filter_text == "פילטרים: ":
+        filter_text += "כל המוזמנים"
+    pdf.drawString(2*cm, A4[1]-3*cm, reverse_hebrew_text(filter_text))
+
+    # סטטיסטיקות
+    stats_text = (
+        f"סטטיסטיקות: {statistics['total_tables']} שולחנות, {statistics['total_seats']} מקומות, "
+        f"{statistics['occupied_seats']} תפוסים, {statistics['empty_seats']} ריקים"
+    )
+    pdf.drawString(2*cm, A4[1]-4*cm, reverse_hebrew_text(stats_text))
+
+
+def _draw_distribution(pdf: canvas.Canvas, font_name: str, title: str, distribution: Dict[str, int], current_y: float) -> float:
+    pdf.setFont(font_name, 12)
+    pdf.setFillColor(colors.darkblue)
+    pdf.drawString(2*cm, current_y, reverse_hebrew_text(title))
+    current_y -= 0.8*cm
+
+    pdf.setFont(font_name, 10)
+    pdf.setFillColor(colors.black)
+    for key, count in distribution.items():
+        pdf.drawString(3*cm, current_y, reverse_hebrew_text(f"{key}: {count} מוזמנים"))
+        current_y -= 0.5*cm
+    return current_y
+
+
+def render_filtered_map_pdf(data: Dict[str, Any], out) -> None:
+    """כתיבת PDF של מפת הישיבה המסוננת (התוצאה של build_filtered_map) ל-out"""
+    seating_map = data["seating_map"]
+    statistics = data["statistics"]
+    font_name = hebrew_font_name()
+    pdf = canvas.Canvas(out, pagesize=A4)
+    _draw_header(pdf, font_name, data["filters"], statistics)
+
+    # מיקום התחלתי לטבלאות
+    current_y = A4[1] - 5*cm
+    current_table_count = 0
+    col_width = (A4[0] - 4*cm) / 5  # 5 עמודות
+    headers_fixed = [reverse_hebrew_text(h) for h in ["מקום", "שם", "קטגוריה", "מגדר", "סוג"]]
+    empty_label = "ריק"
+
+    for table_number, table_data in sorted(seating_map.items()):
+        # בדיקה אם צריך דף חדש
+        if current_table_count % TABLES_PER_PAGE == 0 and current_table_count > 0:
+            pdf.showPage()
+            current_y = A4[1] - 2*cm
+            current_table_count = 0
+
+        # כותרת שולחן
+        pdf.setFont(font_name, 16)
+        pdf.setFillColor(colors.darkblue)
+        pdf.drawString(2*cm, current_y, reverse_hebrew_text(f"שולחן {table_number}"))
+        current_y -= 1*cm
+
+        # פרטי שולחן
+        pdf.setFont(font_name, 10)
+        pdf.setFillColor(colors.black)
+        pdf.drawString(2*cm, current_y, reverse_hebrew_text(f"קיבולת: {table_data['capacity']} מקומות"))
+        current_y -= 0.5*cm
+
+        # כותרות עמודות
+        pdf.setFont(font_name, 9)
+        pdf.setFillColor(colors.darkgrey)
+        for i, header in enumerate(headers_fixed):
+            pdf.drawString(2*cm + i * col_width, current_y, header)
+        current_y -= 0.5*cm
+
+        # נתוני מקומות ישיבה
+        pdf.setFont(font_name, 8)
+        pdf.setFillColor(colors.black)
+        for seat in table_data["seats"]:
+            # בדיקה אם יש מקום בדף
+            if current_y < 2*cm:
+                pdf.showPage()
+                current_y = A4[1] - 2*cm
+
+            # צבע רקע למקומות ריקים
+            if not seat["is_occupied"]:
+                pdf.setFillColor(colors.lightgrey)
+                pdf.rect(1.5*cm, current_y-0.2*cm, A4[0]-3*cm, 0.4*cm, fill=True)
+                pdf.setFillColor(colors.black)
+
+            pdf.drawString(2*cm, current_y, str(seat["seat_number"])[::-1])
+            pdf.drawString(2*cm + col_width, current_y, reverse_hebrew_text(seat["guest_name"] or empty_label))
+            pdf.drawString(2*cm + 2*col_width, current_y, reverse_hebrew_text(seat["category"] or ""))
+            pdf.drawString(2*cm + 3*col_width, current_y, reverse_hebrew_text(seat["gender"] or ""))
+            pdf.drawString(2*cm + 4*col_width, current_y, reverse_hebrew_text(seat["guest_type"] or ""))
+            current_y -= 0.4*cm
+
+        current_y -= 1*cm  # רווח בין שולחנות
+        current_table_count += 1
+
+    # הוספת פירוט סטטיסטיקות בסוף
+    if statistics["gender_distribution"] or statistics["category_distribution"]:
+        pdf.showPage()
+        current_y = A4[1] - 2*cm
+        pdf.setFont(font_name, 16)
+        pdf.setFillColor(colors.darkblue)
+        pdf.drawCentredString(A4[0]/2, current_y, reverse_hebrew_text("פירוט סטטיסטיקות"))
+        current_y -= 1.5*cm
+
+        if statistics["gender_distribution"]:
+            current_y = _draw_distribution(pdf, font_name, "פירוט לפי מגדר:", statistics["gender_distribution"], current_y)
+            current_y -= 0.5*cm
+        if statistics["category_distribution"]:
+            _draw_distribution(pdf, font_name, "פירוט לפי קטגוריה:", statistics["category_distribution"], current_y)
+
+    pdf.save()
+
+
+def iter_file_chunks(f, chunk_size: int = PDF_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    איטרטור ל-StreamingResponse על קובץ שכבר נכתב במלואו - ה-PDF נבנה ב-handler לפני יצירת
+    התגובה, כך ששגיאה ברינדור מחזירה 500 ולא PDF קטוע עם 200. הקובץ נסגר בסוף השליחה.
+    """
+    try:
+        f.seek(0)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
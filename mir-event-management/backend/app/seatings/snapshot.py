@@ -0,0 +1,232 @@
+"""
+מטמון snapshot של מפת הישיבה לכל אירוע.
+
+ה-snapshot (מקומות ישיבה + מוזמנים, שולחנות, קטגוריות ראשי שולחן) נבנה פעם אחת ומשרת את
+כל ה-endpoints שקוראים את מפת הישיבה (ייצוא מפה/רשימה, סטטיסטיקות, פילטרים) עד השינוי הבא.
+לכל אירוע יש מספר גרסה; כל כתיבה שנוגעת לאירוע מעלה אותו אחרי commit, ו-snapshot ישן
+לא מוגש ולא נשמר מחדש:
+  - שינויי ORM ב-Seating / Table / TableHead / Guest מזוהים אוטומטית (after_flush) -
+    assign_seat, update_seating, delete_seating, save_seating_plan, סריקת QR וכו'. גם
+    אובייקט שפג תוקפו (עודכן אחרי commit קודם באותו session) - האירוע שלו נשלף לפי המפתח.
+  - מחיקות/עדכונים ב-bulk (query.delete, SQL ישיר) קוראים ל-mark_changed במפורש.
+
+SEATING_CACHE_SHARED=true: הגרסה נשמרת גם ב-events.seating_version (באותה טרנזקציה של
+הכתיבה), וכל קריאה בודקת אותה - כך כמה תהליכי API רואים את השינויים של תהליכים אחרים.
+
+add_listener רושם callback שמקבל את האירועים שהשתנו אחרי כל commit (למשל עדכון הדשבורדים).
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.events.models import Event
+from app.guests.models import Guest
+from app.seatings.models import Seating
+from app.seatings.repository import SeatingRow, get_seating_rows
+from app.tableHead.models import TableHead
+from app.tables.models import Table
+
+_PENDING_KEY = "seating_snapshot_pending"
+_BUMPED_KEY = "seating_snapshot_bumped"
+_CLEAR_ALL_KEY = "seating_snapshot_clear_all"
+_TRACKED = (Seating, Table, TableHead, Guest)
+
+
+class TableRow(NamedTuple):
+    id: int
+    table_number: int
+    size: int
+    hall_type: str
+
+
+@dataclass(frozen=True)
+class SeatingSnapshot:
+    event_id: int
+    version: int
+    rows: Tuple[SeatingRow, ...]
+    tables: Tuple[TableRow, ...]
+    table_heads: Dict[int, Optional[str]]  # table_head_id -> category
+
+    @property
+    def categories(self) -> List[str]:
+        return [category for category in self.table_heads.values() if category]
+
+
+class SnapshotCache:
+    def __init__(self, max_events: int):
+        self._lock = threading.Lock()
+        self._max_events = max_events
+        self._versions: Dict[int, int] = {}
+        self._snapshots: "OrderedDict[int, SeatingSnapshot]" = OrderedDict()
+
+    def version(self, event_id: int) -> int:
+        with self._lock:
+            return self._versions.get(event_id, 0)
+
+    def get(self, event_id: int, version: int) -> Optional[SeatingSnapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(event_id)
+            if snapshot is None or snapshot.version != version:
+                return None
+            self._snapshots.move_to_end(event_id)
+            return snapshot
+
+    def put(self, snapshot: SeatingSnapshot, shared: bool = False) -> None:
+        with self._lock:
+            if shared:
+                # גרסה מהמסד - לא מחליפים snapshot חדש יותר שכבר נשמר
+                current = self._snapshots.get(snapshot.event_id)
+                if current is not None and current.version > snapshot.version:
+                    return
+            elif snapshot.version != self._versions.get(snapshot.event_id, 0):
+                # הייתה כתיבה בזמן הטעינה - ייתכן שה-snapshot כבר לא עדכני
+                return
+            self._snapshots[snapshot.event_id] = snapshot
+            self._snapshots.move_to_end(snapshot.event_id)
+            while len(self._snapshots) > self._max_events:
+                self._snapshots.popitem(last=False)
+
+    def bump(self, event_ids: Iterable[int]) -> None:
+        with self._lock:
+            for event_id in event_ids:
+                self._versions[event_id] = self._versions.get(event_id, 0) + 1
+                self._snapshots.pop(event_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+            self._snapshots.clear()
+
+
+_cache = SnapshotCache(settings.SEATING_CACHE_MAX_EVENTS)
+_listeners: List[Callable[[Set[int]], None]] = []
+
+
+def add_listener(listener: Callable[[Set[int]], None]) -> None:
+    """listener(event_ids) נקרא אחרי כל commit ששינה את מפת הישיבה (מה-thread של ה-commit)"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def mark_changed(db: Session, event_id: Optional[int]) -> None:
+    """מסמן שהטרנזקציה הנוכחית משנה את מפת הישיבה של האירוע (ה-snapshot יתבטל ב-commit)"""
+    if event_id is None:
+        return
+    db.info.setdefault(_PENDING_KEY, set()).add(event_id)
+    if settings.SEATING_CACHE_SHARED:
+        bumped = db.info.setdefault(_BUMPED_KEY, set())
+        if event_id not in bumped:
+            bumped.add(event_id)
+            db.connection().execute(
+                text("UPDATE events SET seating_version = seating_version + 1 WHERE id = :event_id"),
+                {"event_id": event_id},
+            )
+
+
+def _load(db: Session, event_id: int, version: int) -> SeatingSnapshot:
+    rows = get_seating_rows(db, event_id)
+    tables = (
+        db.query(Table.id, Table.table_number, Table.size, Table.hall_type)
+        .filter(Table.event_id == event_id)
+        .all()
+    )
+    table_heads = db.query(TableHead.id, TableHead.category).filter(TableHead.event_id == event_id).all()
+    return SeatingSnapshot(
+        event_id=event_id,
+        version=version,
+        rows=tuple(rows),
+        tables=tuple(TableRow(*table) for table in tables),
+        table_heads={table_head_id: category for table_head_id, category in table_heads},
+    )
+
+
+def get_snapshot(db: Session, event_id: int) -> SeatingSnapshot:
+    """ה-snapshot העדכני של האירוע - מהמטמון, או טעינה (3 שאילתות) ושמירה"""
+    if settings.SEATING_CACHE_SHARED:
+        version = db.query(Event.seating_version).filter(Event.id == event_id).scalar() or 0
+    else:
+        version = _cache.version(event_id)
+
+    if settings.SEATING_CACHE_ENABLED:
+        cached = _cache.get(event_id, version)
+        if cached is not None:
+            return cached
+
+    snapshot = _load(db, event_id, version)
+    if settings.SEATING_CACHE_ENABLED:
+        _cache.put(snapshot, shared=settings.SEATING_CACHE_SHARED)
+    return snapshot
+
+
+def clear() -> None:
+    _cache.clear()
+
+
+def _loaded_event_id(obj) -> Optional[int]:
+    # בלי לטעון attributes שפג תוקפם (אין SQL ב-ORM בתוך ה-flush)
+    return obj.__dict__.get("event_id")
+
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted_event_ids(session: Session, flush_context, instances) -> None:
+    # אחרי ה-flush השורה כבר נמחקה - event_id של אובייקט שפג תוקפו (אחרי commit קודם) נטען לפני
+    for obj in session.deleted:
+        if isinstance(obj, _TRACKED) and "event_id" not in obj.__dict__:
+            try:
+                obj.event_id
+            except Exception:
+                pass
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_events(session: Session, flush_context) -> None:
+    unresolved: Dict[type, Set[int]] = {}
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, _TRACKED):
+            continue
+        if "event_id" in obj.__dict__:
+            mark_changed(session, _loaded_event_id(obj))
+            continue
+        # event_id לא טעון (האובייקט עודכן אחרי commit קודם ב-session) - לפי המפתח
+        identity = inspect(obj).identity
+        if identity is None or obj in session.deleted:
+            session.info[_CLEAR_ALL_KEY] = True
+        else:
+            unresolved.setdefault(type(obj), set()).add(identity[0])
+
+    # שאילתה אחת לכל סוג, ישירות על החיבור (השורות קיימות - נוספו/עודכנו ב-flush הזה)
+    for model, ids in unresolved.items():
+        rows = session.connection().execute(select(model.id, model.event_id).where(model.id.in_(ids))).all()
+        for _, event_id in rows:
+            mark_changed(session, event_id)
+        if len(rows) < len(ids):
+            session.info[_CLEAR_ALL_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    session.info.pop(_BUMPED_KEY, None)
+    if session.info.pop(_CLEAR_ALL_KEY, None):
+        # שינוי שלא ידוע לאיזה אירוע הוא שייך - כל ה-snapshots המקומיים נבנים מחדש
+        _cache.clear()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _cache.bump(pending)
+        for listener in _listeners:
+            try:
+                listener(pending)
+            except Exception as e:
+                print(f"seating snapshot listener failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_BUMPED_KEY, None)
+    session.info.pop(_CLEAR_ALL_KEY, None)
+    session.info.pop(_PENDING_KEY, None)
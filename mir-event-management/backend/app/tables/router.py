@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from app.core.database import get_db
 from app.auth.dependencies import get_current_user
 from app.tables import models, schemas
 from app.tables.repository import (
@@ -15,13 +15,6 @@ import json
 router = APIRouter(prefix="/tables", tags=["Tables"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=schemas.TableOut)
 def create(table: schemas.TableCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     return create_table(db, table, current_user.id)
@@ -78,6 +71,7 @@ def bulk_create_tables(event_id: int, hall_type: str, tables: list[schemas.Table
     print(f"Tables parameter: {tables}")
     
     from app.seatings import models as seatings_models
+    from app.seatings import snapshot as seating_snapshot
     from app.audit_log.repository import log_change
     print(f"=== Processing bulk tables for event {event_id}, hall {hall_type} ===")
     print(f"Received {len(tables) if tables else 0} tables")
@@ -177,6 +171,7 @@ def bulk_create_tables(event_id: int, hall_type: str, tables: list[schemas.Table
                 models.Table.id.in_(table_ids)
             ).delete(synchronize_session=False)
             print(f"Deleted {len(table_ids)} tables")
+            seating_snapshot.mark_changed(db, event_id)
             db.commit()
         else:
             print("No existing tables to delete")
@@ -47,9 +47,11 @@ def get_all_users(db: Session):
     return db.query(models.User).all()
 
 def delete_user(db: Session, user_id: int, current_user_id: int = None):
+    from app.auth import cache as auth_cache
     from app.permissions.models import UserEventPermission
     # מחק קודם את כל ההרשאות של המשתמש
     db.query(UserEventPermission).filter_by(user_id=user_id).delete()
+    auth_cache.mark_changed(db, user_id)
     db.commit()
     user = get_user_by_id(db, user_id)
     if user:
@@ -0,0 +1,52 @@
+"""add email_outbox table (durable outbound email queue)
+
+Revision ID: add_email_outbox
+Revises: add_scheduled_reminders
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_email_outbox'
+down_revision: Union[str, Sequence[str], None] = 'add_scheduled_reminders'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    if 'email_outbox' not in inspector.get_table_names():
+        op.create_table(
+            'email_outbox',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('kind', sa.String(length=50), nullable=False),
+            sa.Column('to_address', sa.String(), nullable=False),
+            sa.Column('subject', sa.String(), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('attachment_path', sa.String(), nullable=True),
+            sa.Column('attachment_name', sa.String(), nullable=True),
+            sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+            sa.Column('lease_owner', sa.String(), nullable=True),
+            sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_email_outbox_id', 'email_outbox', ['id'])
+        op.create_index('ix_email_outbox_status_next_attempt', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_outbox_status_next_attempt', table_name='email_outbox')
+    op.drop_index('ix_email_outbox_id', table_name='email_outbox')
+    op.drop_table('email_outbox')
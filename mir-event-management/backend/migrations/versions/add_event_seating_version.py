@@ -0,0 +1,35 @@
+"""add events.seating_version for the shared seating snapshot cache
+
+Revision ID: add_event_seating_version
+Revises: add_guest_custom_fields_jsonb
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_event_seating_version'
+down_revision: Union[str, Sequence[str], None] = 'add_guest_custom_fields_jsonb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('events')]
+
+    if 'seating_version' not in columns:
+        op.add_column(
+            'events',
+            sa.Column('seating_version', sa.Integer(), nullable=False, server_default='0'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_column('events', 'seating_version')
@@ -0,0 +1,62 @@
+"""add guests.custom_fields JSONB and backfill from guest_field_values
+
+Revision ID: add_guest_custom_fields_jsonb
+Revises: remove_unused_guest_fields
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_guest_custom_fields_jsonb'
+down_revision: Union[str, Sequence[str], None] = 'remove_unused_guest_fields'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('guests')]
+
+    if 'custom_fields' not in columns:
+        op.add_column(
+            'guests',
+            sa.Column('custom_fields', postgresql.JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        )
+
+    indexes = [idx['name'] for idx in inspector.get_indexes('guests')]
+    if 'ix_guests_custom_fields' not in indexes:
+        op.create_index(
+            'ix_guests_custom_fields',
+            'guests',
+            ['custom_fields'],
+            postgresql_using='gin',
+            postgresql_ops={'custom_fields': 'jsonb_path_ops'},
+        )
+
+    # העתקת הערכים מ-guest_field_values - מפתח לכל custom_field_id, הרשומה האחרונה גוברת.
+    # ערכים שכבר נמצאים ב-JSONB (נכתבו במצב jsonb) לא נדרסים, כך שאפשר להריץ שוב בבטחה
+    op.execute(
+        """
+        UPDATE guests g
+        SET custom_fields = v.fields || g.custom_fields
+        FROM (
+            SELECT guest_id, jsonb_object_agg(custom_field_id::text, value ORDER BY id) AS fields
+            FROM guest_field_values
+            GROUP BY guest_id
+        ) v
+        WHERE g.id = v.guest_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_guests_custom_fields', table_name='guests')
+    op.drop_column('guests', 'custom_fields')
@@ -0,0 +1,50 @@
+"""add guests.scan_token and QR check-in lookup indexes (guests, seatings)
+
+Revision ID: add_guest_scan_token
+Revises: add_event_seating_version
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_guest_scan_token'
+down_revision: Union[str, Sequence[str], None] = 'add_event_seating_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('guests')]
+    indexes = [index['name'] for index in inspector.get_indexes('guests')]
+
+    if 'scan_token' not in columns:
+        op.add_column('guests', sa.Column('scan_token', sa.String(), nullable=True))
+    if 'uq_guests_event_scan_token' not in indexes:
+        op.create_index('uq_guests_event_scan_token', 'guests', ['event_id', 'scan_token'], unique=True)
+    if 'ix_guests_event_mobile_phone' not in indexes:
+        op.create_index('ix_guests_event_mobile_phone', 'guests', ['event_id', 'mobile_phone'])
+    if 'ix_guests_event_qr_code' not in indexes:
+        op.create_index('ix_guests_event_qr_code', 'guests', ['event_id', 'qr_code'])
+
+    seating_indexes = [index['name'] for index in inspector.get_indexes('seatings')]
+    if 'ix_seatings_guest_id' not in seating_indexes:
+        op.create_index('ix_seatings_guest_id', 'seatings', ['guest_id'])
+    if 'ix_seatings_table_id' not in seating_indexes:
+        op.create_index('ix_seatings_table_id', 'seatings', ['table_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_seatings_table_id', table_name='seatings')
+    op.drop_index('ix_seatings_guest_id', table_name='seatings')
+    op.drop_index('ix_guests_event_qr_code', table_name='guests')
+    op.drop_index('ix_guests_event_mobile_phone', table_name='guests')
+    op.drop_index('uq_guests_event_scan_token', table_name='guests')
+    op.drop_column('guests', 'scan_token')
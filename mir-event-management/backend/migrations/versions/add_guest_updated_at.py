@@ -0,0 +1,71 @@
+"""add guests.updated_at (trigger-maintained) for the bot delta feeds
+
+Revision ID: add_guest_updated_at
+Revises: add_guest_scan_token
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_guest_updated_at'
+down_revision: Union[str, Sequence[str], None] = 'add_guest_scan_token'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('guests')]
+    indexes = [index['name'] for index in inspector.get_indexes('guests')]
+
+    if 'updated_at' not in columns:
+        op.add_column(
+            'guests',
+            sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+        )
+    if 'ix_guests_event_updated_at_id' not in indexes:
+        op.create_index('ix_guests_event_updated_at_id', 'guests', ['event_id', 'updated_at', 'id'])
+
+    # כל UPDATE של מוזמן, וכל הוספה / שינוי / מחיקה של מקום ישיבה, מעדכנים את guests.updated_at
+    op.execute(
+        "CREATE OR REPLACE FUNCTION guests_touch_updated_at() RETURNS trigger AS $$ "
+        "BEGIN NEW.updated_at := timezone('utc', now()); RETURN NEW; END $$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        "CREATE OR REPLACE FUNCTION seatings_touch_guest() RETURNS trigger AS $$ "
+        "BEGIN "
+        "IF TG_OP <> 'INSERT' THEN "
+        "UPDATE guests SET updated_at = timezone('utc', now()) WHERE id = OLD.guest_id; "
+        "END IF; "
+        "IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.guest_id IS DISTINCT FROM OLD.guest_id) THEN "
+        "UPDATE guests SET updated_at = timezone('utc', now()) WHERE id = NEW.guest_id; "
+        "END IF; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_updated_at ON guests")
+    op.execute(
+        "CREATE TRIGGER trg_guests_updated_at BEFORE UPDATE ON guests "
+        "FOR EACH ROW EXECUTE FUNCTION guests_touch_updated_at()"
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_seatings_touch_guest ON seatings")
+    op.execute(
+        "CREATE TRIGGER trg_seatings_touch_guest AFTER INSERT OR UPDATE OR DELETE ON seatings "
+        "FOR EACH ROW EXECUTE FUNCTION seatings_touch_guest()"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_seatings_touch_guest ON seatings")
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_updated_at ON guests")
+    op.execute("DROP FUNCTION IF EXISTS seatings_touch_guest()")
+    op.execute("DROP FUNCTION IF EXISTS guests_touch_updated_at()")
+    op.drop_index('ix_guests_event_updated_at_id', table_name='guests')
+    op.drop_column('guests', 'updated_at')
@@ -0,0 +1,85 @@
+"""add import job queue (leases on import_jobs, import_job_partitions)
+
+Revision ID: add_import_job_queue
+Revises: add_email_outbox
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_import_job_queue'
+down_revision: Union[str, Sequence[str], None] = 'add_email_outbox'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _job_columns():
+    return (
+        sa.Column('file_path', sa.String(), nullable=True),
+        sa.Column('mode', sa.String(), nullable=False, server_default='orm'),
+        sa.Column('partition_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('lease_owner', sa.String(), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+
+    # בדיקה אם העמודות כבר קיימות (main.py מוסיף אותן בעליית השרת)
+    job_columns = {c['name'] for c in inspector.get_columns('import_jobs')}
+    for column in _job_columns():
+        if column.name not in job_columns:
+            op.add_column('import_jobs', column)
+    job_indexes = {idx['name'] for idx in inspector.get_indexes('import_jobs')}
+    if 'ix_import_jobs_status_lease' not in job_indexes:
+        op.create_index('ix_import_jobs_status_lease', 'import_jobs', ['status', 'lease_expires_at'])
+
+    if 'import_job_partitions' not in inspector.get_table_names():
+        op.create_table(
+            'import_job_partitions',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('job_id', sa.Integer(), sa.ForeignKey('import_jobs.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('start_row', sa.Integer(), nullable=False),
+            sa.Column('end_row', sa.Integer(), nullable=True),
+            sa.Column('start_offset', sa.BigInteger(), nullable=True),
+            sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+            sa.Column('processed_rows', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('success_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('error_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('error_log_path', sa.String(), nullable=True),
+            sa.Column('lease_owner', sa.String(), nullable=True),
+            sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+            sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_import_job_partitions_id', 'import_job_partitions', ['id'])
+        op.create_index('ix_import_job_partitions_job_id', 'import_job_partitions', ['job_id'])
+        op.create_index(
+            'ix_import_job_partitions_status_lease', 'import_job_partitions', ['status', 'lease_expires_at']
+        )
+    else:
+        partition_columns = {c['name'] for c in inspector.get_columns('import_job_partitions')}
+        if 'start_offset' not in partition_columns:
+            op.add_column('import_job_partitions', sa.Column('start_offset', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_import_job_partitions_status_lease', table_name='import_job_partitions')
+    op.drop_index('ix_import_job_partitions_job_id', table_name='import_job_partitions')
+    op.drop_index('ix_import_job_partitions_id', table_name='import_job_partitions')
+    op.drop_table('import_job_partitions')
+    op.drop_index('ix_import_jobs_status_lease', table_name='import_jobs')
+    for column in reversed(_job_columns()):
+        op.drop_column('import_jobs', column.name)
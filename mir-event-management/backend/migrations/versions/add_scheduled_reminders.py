@@ -0,0 +1,120 @@
+"""add scheduled_reminders (bot reminder outbox) and sent_notifications
+
+Revision ID: add_scheduled_reminders
+Revises: add_guest_updated_at
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_scheduled_reminders'
+down_revision: Union[str, Sequence[str], None] = 'add_guest_updated_at'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEAD_TIMES = "(VALUES ('24h_before', interval '24 hours'), ('week_before', interval '7 days')) AS r(reminder_type, lead_time)"
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'scheduled_reminders' not in tables:
+        op.create_table(
+            'scheduled_reminders',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('event_id', sa.Integer(), sa.ForeignKey('events.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('guest_id', sa.Integer(), sa.ForeignKey('guests.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('reminder_type', sa.String(length=20), nullable=False),
+            sa.Column('scheduled_for', sa.DateTime(), nullable=False),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text("timezone('utc', now())")),
+            sa.UniqueConstraint('guest_id', 'reminder_type', name='uq_scheduled_reminders_guest_type'),
+        )
+        op.create_index('ix_scheduled_reminders_id', 'scheduled_reminders', ['id'])
+        op.create_index('ix_scheduled_reminders_event_id', 'scheduled_reminders', ['event_id'])
+        op.create_index(
+            'ix_scheduled_reminders_due', 'scheduled_reminders', ['scheduled_for'],
+            postgresql_where=sa.text('sent_at IS NULL'),
+        )
+
+    if 'sent_notifications' not in tables:
+        op.create_table(
+            'sent_notifications',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('notification_id', sa.String(), nullable=False, unique=True),
+            sa.Column('event_id', sa.Integer(), nullable=True),
+            sa.Column('guest_id', sa.Integer(), nullable=True),
+            sa.Column('notification_type', sa.String(length=50), nullable=True),
+            sa.Column('sent_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_sent_notifications_id', 'sent_notifications', ['id'])
+
+    # אישור הגעה / ביטול אישור יוצר / מוחק את התזכורות של המוזמן; שינוי תאריך האירוע מזיז אותן
+    op.execute(
+        "CREATE OR REPLACE FUNCTION reminders_schedule_guest() RETURNS trigger AS $$ "
+        "BEGIN "
+        "IF TG_OP = 'UPDATE' THEN "
+        "DELETE FROM scheduled_reminders WHERE guest_id = NEW.id AND sent_at IS NULL; "
+        "END IF; "
+        "IF NEW.confirmed_arrival THEN "
+        "INSERT INTO scheduled_reminders (event_id, guest_id, reminder_type, scheduled_for) "
+        "SELECT e.id, NEW.id, r.reminder_type, e.date - r.lead_time "
+        f"FROM events e CROSS JOIN {LEAD_TIMES} WHERE e.id = NEW.event_id "
+        "ON CONFLICT (guest_id, reminder_type) DO UPDATE SET "
+        "event_id = EXCLUDED.event_id, scheduled_for = EXCLUDED.scheduled_for, "
+        "sent_at = CASE WHEN scheduled_reminders.event_id = EXCLUDED.event_id THEN scheduled_reminders.sent_at END; "
+        "END IF; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        "CREATE OR REPLACE FUNCTION reminders_reschedule_event() RETURNS trigger AS $$ "
+        "BEGIN "
+        "UPDATE scheduled_reminders SET scheduled_for = scheduled_for + (NEW.date - OLD.date), sent_at = NULL "
+        "WHERE event_id = NEW.id; "
+        "RETURN NULL; "
+        "END $$ LANGUAGE plpgsql"
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_reminders_insert ON guests")
+    op.execute(
+        "CREATE TRIGGER trg_guests_reminders_insert AFTER INSERT ON guests "
+        "FOR EACH ROW WHEN (NEW.confirmed_arrival) EXECUTE FUNCTION reminders_schedule_guest()"
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_reminders_update ON guests")
+    op.execute(
+        "CREATE TRIGGER trg_guests_reminders_update AFTER UPDATE OF confirmed_arrival, event_id ON guests "
+        "FOR EACH ROW WHEN (OLD.confirmed_arrival IS DISTINCT FROM NEW.confirmed_arrival "
+        "OR OLD.event_id IS DISTINCT FROM NEW.event_id) EXECUTE FUNCTION reminders_schedule_guest()"
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_events_reminders_reschedule ON events")
+    op.execute(
+        "CREATE TRIGGER trg_events_reminders_reschedule AFTER UPDATE OF date ON events "
+        "FOR EACH ROW WHEN (OLD.date IS DISTINCT FROM NEW.date) EXECUTE FUNCTION reminders_reschedule_event()"
+    )
+
+    # מוזמנים מאושרים של אירועים עתידיים
+    op.execute(
+        "INSERT INTO scheduled_reminders (event_id, guest_id, reminder_type, scheduled_for) "
+        "SELECT e.id, g.id, r.reminder_type, e.date - r.lead_time "
+        f"FROM guests g JOIN events e ON e.id = g.event_id CROSS JOIN {LEAD_TIMES} "
+        "WHERE g.confirmed_arrival AND e.date > LOCALTIMESTAMP "
+        "ON CONFLICT (guest_id, reminder_type) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_events_reminders_reschedule ON events")
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_reminders_update ON guests")
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_reminders_insert ON guests")
+    op.execute("DROP FUNCTION IF EXISTS reminders_reschedule_event()")
+    op.execute("DROP FUNCTION IF EXISTS reminders_schedule_guest()")
+    op.drop_table('sent_notifications')
+    op.drop_table('scheduled_reminders')
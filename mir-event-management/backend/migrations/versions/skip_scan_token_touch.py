@@ -0,0 +1,36 @@
+"""don't bump guests.updated_at when only the scan token is written
+
+Revision ID: skip_scan_token_touch
+Revises: add_import_job_queue
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'skip_scan_token_touch'
+down_revision: Union[str, Sequence[str], None] = 'add_import_job_queue'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # יצירת טוקני סריקה (ensure_tokens) היא UPDATE שכותב רק את scan_token - לא שינוי במוזמן,
+    # ולכן לא מזיזה את updated_at (אחרת חימום האירוע הראשון מציף את הפידים של הבוט)
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_updated_at ON guests")
+    op.execute(
+        "CREATE TRIGGER trg_guests_updated_at BEFORE UPDATE ON guests "
+        "FOR EACH ROW WHEN (OLD.scan_token IS NOT DISTINCT FROM NEW.scan_token) "
+        "EXECUTE FUNCTION guests_touch_updated_at()"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_guests_updated_at ON guests")
+    op.execute(
+        "CREATE TRIGGER trg_guests_updated_at BEFORE UPDATE ON guests "
+        "FOR EACH ROW EXECUTE FUNCTION guests_touch_updated_at()"
+    )
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+מיקרו-בנצ'מרק למיפוי עמודות בייבוא: מיפוי לכל שורה (כמו שהיה ב-_process_batch)
+מול ColumnPlan שנבנה פעם אחת לקובץ. רץ בזיכרון בלבד, בלי מסד נתונים.
+
+הרצה מתיקיית backend:
+    python scripts/bench_import_column_plan.py --rows 50000 --columns 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+from app.guests import models as guest_models  # noqa: E402
+from app.imports import service  # noqa: E402
+
+# כותרות מוכרות (נכנסות לשדות בטבלת guests) - השאר יהיו שדות דינמיים
+KNOWN_HEADERS = [
+    "שם פרטי", "שם משפחה", "ת.ז", "מספר נייד", "אימייל", "עיר", "רחוב", "מגדר",
+    "טלפון בית", "טלפון נוסף", "מיקוד", "גיל", "שם אמצעי", "תואר לפני", "מקור הפניה",
+]
+
+
+def make_sheet(rows: int, columns: int, seed: int = 1):
+    rnd = random.Random(seed)
+    header = [f' {h} ' if i % 4 == 0 else h for i, h in enumerate(KNOWN_HEADERS[:columns])]
+    header += [f'שדה "נוסף" {i}' for i in range(columns - len(header))]
+    data = []
+    for r in range(rows):
+        values = []
+        for c in range(columns):
+            if c == 2:
+                values.append(str(100000000 + r))
+            elif c == 11:
+                values.append(str(rnd.randint(18, 90)))
+            elif rnd.random() < 0.15:
+                values.append("")
+            else:
+                values.append(f"v{r}-{c}")
+        data.append(tuple(values))
+    return header, data
+
+
+def _legacy_get_field_value(row, possible_keys):
+    for key in possible_keys:
+        if key in row:
+            val = str(row[key] or "").strip()
+            if val:
+                return val
+        for row_key in row.keys():
+            if row_key.strip() == key.strip():
+                val = str(row[row_key] or "").strip()
+                if val:
+                    return val
+    return ""
+
+
+def run_legacy(header, data, batch_size):
+    """המסלול הקודם: מיפויים נבנים לכל באץ', כותרות מנורמלות וממופות לכל שורה"""
+    checksum = 0
+    for start in range(0, len(data), batch_size):
+        batch = [dict(zip(header, values)) for values in data[start:start + batch_size]]
+        rows = [{service._clean_key(k): v for k, v in row.items() if k} for row in batch]
+        field_mappings = service._get_all_field_mappings()
+        guest_model_fields = {col.name: col for col in guest_models.Guest.__table__.columns}
+        fallback_base_map = service._get_fallback_base_map(guest_model_fields)
+        for row in rows:
+            first = _legacy_get_field_value(row, service.FIRST_NAME_KEYS)
+            last = _legacy_get_field_value(row, service.LAST_NAME_KEYS)
+            phone = _legacy_get_field_value(row, service.PHONE_KEYS)
+            email = _legacy_get_field_value(row, service.EMAIL_KEYS)
+            checksum += len(first) + len(last) + len(phone) + len(email)
+            for col_key, val in row.items():
+                db_field_name = fallback_base_map.get(col_key) or field_mappings.get(col_key)
+                if db_field_name and db_field_name in guest_model_fields:
+                    col_def = guest_model_fields[db_field_name]
+                    field_type = col_def.type.python_type if hasattr(col_def.type, "python_type") else str
+                    if service._convert_value(val, field_type) is not None:
+                        checksum += 1
+                elif not db_field_name and str(val or "").strip():
+                    checksum += 1
+    return checksum
+
+
+def run_plan(header, data, batch_size):
+    """המסלול החדש: ColumnPlan פעם אחת לקובץ, גישה לפי אינדקס לכל שורה"""
+    checksum = 0
+    plan = service.ColumnPlan(header)
+    for start in range(0, len(data), batch_size):
+        for row in data[start:start + batch_size]:
+            first = plan.first_value(row, plan.first_name_idx)
+            last = plan.first_value(row, plan.last_name_idx)
+            phone = plan.first_value(row, plan.phone_idx)
+            email = plan.first_value(row, plan.email_idx)
+            checksum += len(first) + len(last) + len(phone) + len(email)
+            for col_idx, _, convert in plan.base_columns:
+                if convert(row[col_idx]) is not None:
+                    checksum += 1
+            for col_idx, _ in plan.dynamic_columns:
+                if str(row[col_idx] or "").strip():
+                    checksum += 1
+    return checksum
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import column-mapping micro-benchmark")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    header, data = make_sheet(args.rows, args.columns)
+    print(f"sheet: {args.rows} rows x {args.columns} columns, batch size {args.batch_size}")
+
+    results = {}
+    for name, fn in (("legacy", run_legacy), ("plan", run_plan)):
+        best = None
+        checksum = None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            checksum = fn(header, data, args.batch_size)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, checksum)
+        print(f"{name:>7}: {best:.3f}s  ({args.rows / best:,.0f} rows/s)  checksum={checksum}")
+
+    if results["legacy"][1] != results["plan"][1]:
+        print("WARNING: checksums differ - the two paths mapped the sheet differently")
+    print(f"speedup: x{results['legacy'][0] / results['plan'][0]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
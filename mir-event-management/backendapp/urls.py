@@ -28,6 +28,7 @@ from app.guests.router import (
     get_field_values,
     add_field_value,
     get_guests_with_fields,
+    get_guests_grid,
     get_guests_count,
     update_guests_with_default_gender_endpoint,
     create_form_field,
@@ -84,9 +85,10 @@ from app.greetings.router import (
 from app.bot.router import (
     get_event_info_for_bot, get_confirmed_guests_for_bot, register_guest_via_bot,
     get_guest_info_for_bot, create_greeting_via_bot, get_guest_greeting,
-    get_event_greetings_for_bot, get_upcoming_reminders, get_week_before_reminders,
+    get_event_greetings_for_bot, get_due_reminders, ack_due_reminders, get_upcoming_reminders, get_week_before_reminders,
     mark_notification_sent, mark_reminder_sent, get_event_notification_data,
     get_guest_ticket, get_event_tickets, confirm_guest_arrival,
+    get_event_tickets_feed, get_upcoming_reminders_feed, get_week_before_reminders_feed,
     get_event_custom_fields, get_guest_custom_fields, set_guest_custom_field
 )
 
@@ -100,7 +102,7 @@ from app.payments.router import (
 # Import from realtime router
 from app.realtime.router import (
     websocket_endpoint, scan_qr_code, get_realtime_notifications,
-    mark_notification_read, fix_seating_status
+    mark_notification_read, fix_seating_status, warm_scan_tokens, get_realtime_metrics
 )
 
 # Import public router
@@ -149,6 +151,7 @@ router.add_api_route("/guests/field-value/", create_field_value, methods=["POST"
 router.add_api_route("/guests/field-value/{guest_id}", get_field_values, methods=["GET"])
 router.add_api_route("/events/{event_id}/guests/{guest_id}/field-values", add_field_value, methods=["POST"])
 router.add_api_route("/guests/event/{event_id}/with-fields", get_guests_with_fields, methods=["GET"])
+router.add_api_route("/guests/event/{event_id}/grid", get_guests_grid, methods=["GET"])
 router.add_api_route("/guests/event/{event_id}/count", get_guests_count, methods=["GET"])
 router.add_api_route("/guests/update-gender-defaults/{event_id}", update_guests_with_default_gender_endpoint, methods=["POST"])
 router.add_api_route("/guests/events/{event_id}/form-fields", create_form_field, methods=["POST"])
@@ -225,8 +228,10 @@ router.add_api_route("/greetings/{greeting_id}/toggle-handled", toggle_greeting_
 router.add_api_route("/greetings/event/{event_id}/approved", get_approved_greetings_by_event, methods=["GET"])
 
 # Real-time
-router.add_api_route("/realtime/ws/{event_id}", websocket_endpoint, methods=["GET"])  # WebSocket
+router.add_api_websocket_route("/realtime/ws/{event_id}", websocket_endpoint)  # WebSocket
 router.add_api_route("/realtime/scan-qr", scan_qr_code, methods=["POST"])
+router.add_api_route("/realtime/scan-tokens/{event_id}/warm", warm_scan_tokens, methods=["POST"])
+router.add_api_route("/realtime/metrics", get_realtime_metrics, methods=["GET"])
 router.add_api_route("/realtime/notifications/{event_id}", get_realtime_notifications, methods=["GET"])
 router.add_api_route("/realtime/notifications/{notification_id}/mark-read", mark_notification_read, methods=["POST"])
 router.add_api_route("/realtime/fix-seating-status/{event_id}", fix_seating_status, methods=["POST"])
@@ -250,6 +255,8 @@ router.add_api_route("/bot/guest/{guest_id}/info", get_guest_info_for_bot, metho
 router.add_api_route("/bot/greeting", create_greeting_via_bot, methods=["POST"])
 router.add_api_route("/bot/greeting/{guest_id}", get_guest_greeting, methods=["GET"])
 router.add_api_route("/bot/event/{event_id}/greetings", get_event_greetings_for_bot, methods=["GET"])
+router.add_api_route("/bot/reminders/due", get_due_reminders, methods=["GET"])
+router.add_api_route("/bot/reminders/due/ack", ack_due_reminders, methods=["POST"])
 router.add_api_route("/bot/reminders/upcoming", get_upcoming_reminders, methods=["GET"])
 router.add_api_route("/bot/reminders/week-before", get_week_before_reminders, methods=["GET"])
 router.add_api_route("/bot/notification/sent", mark_notification_sent, methods=["POST"])
@@ -257,6 +264,9 @@ router.add_api_route("/bot/reminder/sent", mark_reminder_sent, methods=["POST"])
 router.add_api_route("/bot/event/{event_id}/notification-data", get_event_notification_data, methods=["GET"])
 router.add_api_route("/bot/guest/{guest_id}/ticket", get_guest_ticket, methods=["GET"])
 router.add_api_route("/bot/event/{event_id}/tickets", get_event_tickets, methods=["GET"])
+router.add_api_route("/bot/feed/event/{event_id}/tickets", get_event_tickets_feed, methods=["GET"])
+router.add_api_route("/bot/feed/reminders/upcoming", get_upcoming_reminders_feed, methods=["GET"])
+router.add_api_route("/bot/feed/reminders/week-before", get_week_before_reminders_feed, methods=["GET"])
 router.add_api_route("/bot/guest/{guest_id}/confirm-arrival", confirm_guest_arrival, methods=["POST"])
 router.add_api_route("/bot/event/{event_id}/custom-fields", get_event_custom_fields, methods=["GET"])
 router.add_api_route("/bot/guest/{guest_id}/custom-fields", get_guest_custom_fields, methods=["GET"])
@@ -587,7 +587,7 @@ export default function GuestsContent() {
     };
   }, [eventId]); // הסרנו את fieldsEnsured מה-dependencies כדי למנוע לולאה אינסופית
 
-  // פולינג לסטטוס ייבוא (job-based)
+  // מעקב אחרי סטטוס ייבוא (job-based): זרם SSE מהשרת, ופולינג כגיבוי אם הזרם לא זמין
   useEffect(() => {
     if (!importJobId) return;
     
@@ -601,6 +601,55 @@ export default function GuestsContent() {
     let timeoutId = null;
     let pollCount = 0;
     const MAX_POLLS = 1200; // מקסימום 50 דקות (1200 * 2.5 שניות)
+    const streamController = new AbortController();
+
+    const handleJobUpdate = (data) => {
+      setImportJobStatus(prev => ({ ...(prev || {}), ...data }));
+      const status = (data.status || "").toLowerCase();
+      if (["success", "failed", "partial"].includes(status)) {
+        console.log(`[Import Job] Job ${importJobId} finished with status: ${status}`);
+        if (status === "success" || status === "partial") {
+          // רענון אוטומטי של הנתונים אחרי ייבוא מוצלח
+          setTimeout(() => {
+            window.location.reload();
+          }, 1000);
+        }
+        return true;
+      }
+      return false;
+    };
+
+    // זרם התקדמות (Server-Sent Events) - fetch ולא EventSource כדי לשלוח את ה-token
+    const stream = async () => {
+      try {
+        const res = await fetch(`http://localhost:8001/imports/${importJobId}/stream`, {
+          headers: { "Authorization": `Bearer ${localStorage.getItem('access_token')}` },
+          signal: streamController.signal,
+        });
+        if (!res.ok || !res.body) throw new Error(`stream status ${res.status}`);
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (active) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const messages = buffer.split("\n\n");
+          buffer = messages.pop();
+          for (const message of messages) {
+            const dataLine = message.split("\n").find(line => line.startsWith("data: "));
+            if (!dataLine) continue;
+            if (handleJobUpdate(JSON.parse(dataLine.slice(6)))) return;
+          }
+        }
+        // הזרם נסגר לפני סטטוס סופי - ממשיכים בפולינג
+        if (active) poll();
+      } catch (e) {
+        if (!active) return;
+        console.warn("[Import Job] progress stream unavailable, falling back to polling", e);
+        poll();
+      }
+    };
 
     const poll = async () => {
       if (!active) return;
@@ -652,9 +701,10 @@ export default function GuestsContent() {
       }
     };
 
-    poll();
+    stream();
     return () => { 
       active = false; 
+      streamController.abort();
       if (timeoutId) {
         clearTimeout(timeoutId);
         timeoutId = null;